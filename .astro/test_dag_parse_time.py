@@ -0,0 +1,57 @@
+"""Test that DAG files stay cheap to parse, since the scheduler re-imports them constantly."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds allowed to import one DAG file in a process where Airflow itself is already loaded
+PARSE_TIME_BUDGET_SECONDS = float(os.environ.get("DAG_PARSE_TIME_BUDGET_SECONDS", "2.0"))
+
+DAG_FILES = ["dags/etl_music_youtube_datawarehouse.py", "dags/replay_music_landing_zone.py"]
+
+# Modules that must only be imported when a task runs, never while the DAG file is parsed
+DEFERRED_MODULES = ["pandas", "spotipy", "googleapiclient", "requests", "pyarrow"]
+
+MEASURE_SCRIPT = """
+import importlib.util, json, sys, time
+import airflow.models  # the DAG processor already has Airflow loaded
+before = set(sys.modules)
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("dag_under_test", sys.argv[1])
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+elapsed = time.perf_counter() - start
+loaded = sorted({name.split(".")[0] for name in set(sys.modules) - before})
+print(json.dumps({"elapsed": elapsed, "loaded": loaded}))
+"""
+
+
+def measure_parse(dag_file):
+    """Import ``dag_file`` in a fresh interpreter and return the import time and newly loaded packages."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [PROJECT_ROOT, os.environ.get("PYTHONPATH")])))
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_SCRIPT, os.path.join(PROJECT_ROOT, dag_file)],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("dag_file", DAG_FILES)
+def test_dag_parse_time(dag_file):
+    """Importing the DAG file must fit the parse-time budget and must not load API clients or pandas"""
+    result = measure_parse(dag_file)
+    print(f"{dag_file} parsed in {result['elapsed']:.3f}s")
+
+    eager = sorted(set(DEFERRED_MODULES) & set(result["loaded"]))
+    assert not eager, f"{dag_file} imports {eager} at parse time"
+    assert result["elapsed"] <= PARSE_TIME_BUDGET_SECONDS, (
+        f"{dag_file} took {result['elapsed']:.3f}s to parse, budget is {PARSE_TIME_BUDGET_SECONDS:.1f}s"
+    )
@@ -3,9 +3,12 @@ from datetime import datetime, timedelta
 import json
 import os
 from plugins.custom_operator.google_sheet_to_postgresql import GoogleSheetToPostgresOperator
+from plugins.custom_operator.code_shard_planner import CodeShardPlannerOperator
 from plugins.custom_operator.spotify_crawler import SpotifyMetadataExtractorOperator
 from plugins.custom_operator.youtube_crawler import YouTubeMetadataExtractorOperator
 from plugins.custom_operator.mysql_to_postgres import MySqlToPostgresOperator
+from plugins.custom_operator.media_warehouse_matcher import MediaWarehouseMatcherOperator
+from plugins.custom_operator.song_media_summary import SongMediaSummaryOperator
 
 
 # Default arguments
@@ -29,6 +32,18 @@ dag = DAG(
     catchup=False,
     tags=['active', 'music-and-media']
 )
+# Metrik per run setiap task (baris, panggilan API, kuota, durasi fetch/transform/write) disimpan di sini,
+# selain dikirim ke StatsD sesuai konfigurasi [metrics] Airflow
+RUN_STATS_TABLE = 'demo_music.pipeline_run_stats'
+
+# Response mentah Spotify/YouTube juga disimpan sebagai Parquet (zstd) per source dan run date,
+# sehingga tabel library bisa dibangun ulang oleh DAG replay tanpa memakai kuota API lagi
+RAW_LANDING_ZONE_PATH = os.getenv('RAW_LANDING_ZONE_PATH', '/usr/local/airflow/include/landing_zone')
+
+# Cache SQLite hasil search Spotify/YouTube (7 dan 30 hari), lagu dengan judul/artis yang sama setelah
+# dinormalisasi dan lagu yang di-crawl ulang tidak memanggil API lagi
+API_RESPONSE_CACHE_PATH = os.getenv('API_RESPONSE_CACHE_PATH', '/usr/local/airflow/include/api_response_cache.sqlite')
+
 mapping_master_songs = GoogleSheetToPostgresOperator(
         task_id="mapping_master_songs",
         google_sheet_id="1OkDM1miCXh48M23n_C4AOGPl_DW1QtIXFSdHW6Grzxg",
@@ -41,62 +56,181 @@ mapping_master_songs = GoogleSheetToPostgresOperator(
                 "SONG TITLE": "song_title"
         },
         identifier = ['code'],
+        updated_at_column="updated_at",
+        # Sheet yang tidak berubah dilewati, selain itu hanya lagu baru/berubah yang di-upsert
+        content_hash_column="content_hash",
+        sync_state_table="demo_music.sheet_sync_state",
+        match_key_columns={
+                "match_artist": "original_artist",
+                "match_title": "song_title"
+        },
+        run_stats_table=RUN_STATS_TABLE,
         dag=dag  # Attach to the DAG
     )
-# Diberi limit 2
-get_music_from_spotify_api_raw = SpotifyMetadataExtractorOperator(
+# Jumlah shard crawler, setiap shard menjadi satu mapped task yang bisa jalan di worker berbeda
+CRAWLER_SHARD_COUNT = 4
+
+# Crawler berhenti dengan rapi sebelum execution_timeout, lagu yang belum diproses diambil oleh retry/run berikutnya
+CRAWLER_EXECUTION_TIMEOUT = timedelta(hours=2)
+CRAWLER_TIME_BUDGET = timedelta(hours=1, minutes=45)
+# Crawl incremental: hanya lagu baru, lagu yang judul/artisnya berubah, dan lagu yang crawl terakhirnya
+# lebih tua dari ini. Status per lagu ada di demo_music.crawl_state
+CRAWLER_RECRAWL_AFTER = timedelta(days=30)
+
+# m_songs dibagi menjadi range code dengan jumlah lagu yang kurang lebih sama
+plan_song_shards = CodeShardPlannerOperator(
+        task_id='plan_song_shards',
+        postgres_conn_id='postgresql_tcm',
+        table='demo_music.m_songs',
+        shard_count=CRAWLER_SHARD_COUNT,
+        dag=dag
+    )
+
+get_music_from_spotify_api_raw = SpotifyMetadataExtractorOperator.partial(
         task_id='get_music_from_spotify_api_raw',
         postgres_conn_id='postgresql_tcm',
-        source_query='''SELECT song_title, original_artist FROM demo_music.m_songs where original_artist != 'unknown' limit 2; ''',
+        source_query='''SELECT song_title, original_artist, code FROM demo_music.m_songs where original_artist != 'unknown'; ''',
         target_table='demo_music.library_music_spotify',
         client_id="",
         client_secret="",
+        max_workers=8,
+        # Maksimal 5 halaman per lagu, berhenti di halaman tanpa track dari artis lagu tersebut
+        page_workers=4,
+        max_pages=5,
+        relevance_cutoff=True,
+        checkpoint_table='demo_music.crawl_checkpoint',
+        incremental=True,
+        recrawl_after=CRAWLER_RECRAWL_AFTER,
+        response_cache_path=API_RESPONSE_CACHE_PATH,
+        time_budget=CRAWLER_TIME_BUDGET,
+        execution_timeout=CRAWLER_EXECUTION_TIMEOUT,
+        run_stats_table=RUN_STATS_TABLE,
+        landing_zone_path=RAW_LANDING_ZONE_PATH,
+        dag=dag
+    ).expand(shard=plan_song_shards.output)
+
+# Memperbarui metadata track yang sudah ada (judul, album, ISRC) lewat endpoint tracks, 50 track per request
+refresh_spotify_tracks = SpotifyMetadataExtractorOperator(
+        task_id='refresh_spotify_tracks',
+        postgres_conn_id='postgresql_tcm',
+        source_query=None,
+        target_table='demo_music.library_music_spotify',
+        client_id="",
+        client_secret="",
+        mode='refresh',
+        refresh_limit=5000,
+        run_stats_table=RUN_STATS_TABLE,
+        landing_zone_path=RAW_LANDING_ZONE_PATH,
         dag=dag
     )
 
-# Diberi limit = 1, karena quotaExceed
-get_youtube_metadata_from_api_raw = YouTubeMetadataExtractorOperator(
+# Tanpa limit: kuota harian YouTube (10.000 unit, 100 unit per search) dibagi ke beberapa run,
+# lagu yang belum pernah di-crawl diambil dulu, lalu yang paling lama tidak di-crawl
+# Setiap shard memesan kuota dari budget harian yang sama
+get_youtube_metadata_from_api_raw = YouTubeMetadataExtractorOperator.partial(
     task_id='get_youtube_metadata_from_api',
     postgres_conn_id='postgresql_tcm',
-    source_query='''SELECT song_title, original_artist FROM demo_music.m_songs where original_artist != 'unknown' limit 1; ''',
+    source_query='''SELECT song_title, original_artist, code FROM demo_music.m_songs where original_artist != 'unknown'; ''',
     target_table='demo_music.library_music_youtube',
     api_key="",
+    daily_quota_units=10000,
+    checkpoint_table='demo_music.crawl_checkpoint',
+    incremental=True,
+    recrawl_after=CRAWLER_RECRAWL_AFTER,
+    response_cache_path=API_RESPONSE_CACHE_PATH,
+    time_budget=CRAWLER_TIME_BUDGET,
+    execution_timeout=CRAWLER_EXECUTION_TIMEOUT,
+    run_stats_table=RUN_STATS_TABLE,
+    landing_zone_path=RAW_LANDING_ZONE_PATH,
+    dag=dag
+).expand(shard=plan_song_shards.output)
+
+# Memperbarui judul/channel video yang sudah ada lewat videos().list (1 unit per 50 video),
+# dijalankan sebelum crawl search supaya mendapat kuota dari budget harian yang sama
+refresh_youtube_videos = YouTubeMetadataExtractorOperator(
+    task_id='refresh_youtube_videos',
+    postgres_conn_id='postgresql_tcm',
+    source_query=None,
+    target_table='demo_music.library_music_youtube',
+    api_key="",
+    mode='refresh',
+    refresh_limit=5000,
+    daily_quota_units=10000,
+    run_stats_table=RUN_STATS_TABLE,
+    landing_zone_path=RAW_LANDING_ZONE_PATH,
     dag=dag
 )
 
-load_to_media_warehouse = MySqlToPostgresOperator(
-            task_id=f'load_to_media_warehouse',
-            query='''SELECT 
-                    ms.code, 
-                    lmy.video_id,
-                    lmy.channel_id,
-                    lmy.video_title,
-                    lmy.channel_title,
-                    sp.isrc,
-                    sp.spotify_track_id,
-                    sp.track_name AS spotify_track_name,
-                    sp.album_name AS spotify_album,
-                    sp.release_date AS spotify_release_date,
-                    ms.original_artist,
-                    ms.song_title
-                FROM demo_music.m_songs ms
-                JOIN demo_music.library_music_spotify sp
-                    ON ms.original_artist LIKE '%' || sp.artist_name || '%'
-                    AND ms.song_title LIKE '%' || sp.track_name || '%'
-                JOIN demo_music.library_music_youtube lmy
-                    ON lmy.video_title LIKE '%' || sp.track_name || '%';
-                ''',
-            postgres_conn_target="postgresql_tcm",
-            postgres_conn="postgresql_tcm",
-            db_query_from='postgres',
-            target_table="demo_music.media_warehouse_raw",
-            identifier=["code", "video_id", "spotify_track_id"],
-            email_on_failure=True,
-            email_on_retry=False,
-            dag=dag
-        )
+# Engine untuk join warehouse: 'sql' (default) atau 'aho_corasick' (matcher substring di Python)
+MEDIA_WAREHOUSE_ENGINE = os.getenv('MEDIA_WAREHOUSE_ENGINE', 'sql')
+
+if MEDIA_WAREHOUSE_ENGINE == 'aho_corasick':
+    # Ketiga tabel dibaca sekali dan dicocokkan dengan automaton Aho-Corasick. Hasilnya selalu join penuh,
+    # jadi dimuat ke partisi baru lalu di-swap: baris lama yang sudah tidak cocok ikut hilang, added_at tetap,
+    # dan updated_at diisi jam database (song_media_summary melakukan rebuild setelah swap)
+    load_to_media_warehouse = MediaWarehouseMatcherOperator(
+                task_id='load_to_media_warehouse',
+                postgres_conn_id="postgresql_tcm",
+                target_table="demo_music.media_warehouse_raw",
+                identifier=["code", "video_id", "spotify_track_id"],
+                partition_swap=True,
+                added_at_column="added_at",
+                email_on_failure=True,
+                email_on_retry=False,
+                run_stats_table=RUN_STATS_TABLE,
+                dag=dag
+            )
+else:
+    # Source dan target sama-sama postgresql_tcm, jadi join dijalankan langsung di server (INSERT ... SELECT).
+    # Query join ada di dags/sql/load_media_warehouse_raw.sql dan memakai kolom match key + index trigram.
+    # Run berikutnya hanya menghitung ulang lagu/track/video yang updated_at-nya melewati watermark,
+    # join penuh tetap dijalankan seminggu sekali. Join penuh dimuat ke partisi baru lalu di-swap.
+    load_to_media_warehouse = MySqlToPostgresOperator(
+                task_id=f'load_to_media_warehouse',
+                query='sql/load_media_warehouse_raw.sql',
+                incremental_query='sql/load_media_warehouse_raw_incremental.sql',
+                watermark_tables=[
+                    "demo_music.m_songs",
+                    "demo_music.library_music_spotify",
+                    "demo_music.library_music_youtube",
+                ],
+                full_refresh_interval=timedelta(days=7),
+                partition_swap=True,
+                postgres_conn_target="postgresql_tcm",
+                postgres_conn="postgresql_tcm",
+                db_query_from='postgres',
+                target_table="demo_music.media_warehouse_raw",
+                identifier=["code", "video_id", "spotify_track_id"],
+                # Baris yang dihitung ulang menimpa baris lama, updated_at hanya bergerak jika isinya berubah
+                replace=True,
+                updated_at_column="updated_at",
+                # Full refresh lewat partition swap tetap mempertahankan added_at baris yang sudah ada
+                added_at_column="added_at",
+                batch_size=10000,
+                email_on_failure=True,
+                email_on_retry=False,
+                run_stats_table=RUN_STATS_TABLE,
+                dag=dag
+            )
+
+# Mart song_media_summary (jumlah video dan ISRC unik per lagu) untuk dashboard, hanya code yang disentuh
+# load warehouse terakhir yang digabung; rebuild penuh seminggu sekali dan setelah warehouse di-swap
+load_song_media_summary = SongMediaSummaryOperator(
+                task_id='load_song_media_summary',
+                postgres_conn_id="postgresql_tcm",
+                warehouse_table="demo_music.media_warehouse_raw",
+                summary_table="demo_music.song_media_summary",
+                full_refresh_interval=timedelta(days=7),
+                email_on_failure=True,
+                email_on_retry=False,
+                run_stats_table=RUN_STATS_TABLE,
+                dag=dag
+            )
 
 # Dijalankan berurutan, transfer_google_sheet_to_postgres jika sudah selesai maka akan
-# Mengambil spotify dan youtube, lalu akan dimasukkan ke warehouse raw
-mapping_master_songs >> [ get_music_from_spotify_api_raw, get_youtube_metadata_from_api_raw]>> load_to_media_warehouse
+# Mengambil spotify dan youtube (per shard), lalu akan dimasukkan ke warehouse raw
+mapping_master_songs >> plan_song_shards >> [ get_music_from_spotify_api_raw, get_youtube_metadata_from_api_raw]>> load_to_media_warehouse
+get_music_from_spotify_api_raw >> refresh_spotify_tracks >> load_to_media_warehouse
+mapping_master_songs >> refresh_youtube_videos >> get_youtube_metadata_from_api_raw
+load_to_media_warehouse >> load_song_media_summary
 
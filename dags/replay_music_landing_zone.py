@@ -0,0 +1,68 @@
+from airflow import DAG
+from airflow.models.param import Param
+from datetime import datetime, timedelta
+import os
+from plugins.custom_operator.spotify_crawler import SpotifyMetadataExtractorOperator
+from plugins.custom_operator.youtube_crawler import YouTubeMetadataExtractorOperator
+
+
+# Default arguments
+default_args = {
+    'owner': 'Gema',
+    'depends_on_past': False,
+    'start_date': datetime(2024, 5, 28, 0, 0, 0),
+    'email_on_failure': False,
+    'email_on_retry': False,
+    'retries': 2,
+    'retry_delay': timedelta(minutes=1)
+}
+
+# Landing zone yang sama dengan yang ditulis crawler di ETL_mapping_music_warehouse
+RAW_LANDING_ZONE_PATH = os.getenv('RAW_LANDING_ZONE_PATH', '/usr/local/airflow/include/landing_zone')
+RUN_STATS_TABLE = 'demo_music.pipeline_run_stats'
+
+# Dijalankan manual setelah logika cleaning/matching berubah atau untuk backfill:
+# tabel library dibangun ulang dari response mentah, tanpa panggilan API dan tanpa memakai kuota
+dag = DAG(
+    'replay_music_landing_zone',
+    default_args=default_args,
+    description='Rebuild the Spotify and YouTube library tables from the raw response landing zone',
+    schedule_interval=None,
+    max_active_runs=1,
+    catchup=False,
+    params={
+        # Kosong berarti semua run date di landing zone
+        'replay_from': Param(None, type=['null', 'string'], format='date'),
+        'replay_to': Param(None, type=['null', 'string'], format='date'),
+    },
+    tags=['active', 'music-and-media']
+)
+
+replay_spotify_tracks = SpotifyMetadataExtractorOperator(
+        task_id='replay_spotify_tracks',
+        postgres_conn_id='postgresql_tcm',
+        source_query=None,
+        target_table='demo_music.library_music_spotify',
+        client_id="",
+        client_secret="",
+        mode='replay',
+        landing_zone_path=RAW_LANDING_ZONE_PATH,
+        replay_from='{{ params.replay_from or "" }}',
+        replay_to='{{ params.replay_to or "" }}',
+        run_stats_table=RUN_STATS_TABLE,
+        dag=dag
+    )
+
+replay_youtube_videos = YouTubeMetadataExtractorOperator(
+    task_id='replay_youtube_videos',
+    postgres_conn_id='postgresql_tcm',
+    source_query=None,
+    target_table='demo_music.library_music_youtube',
+    api_key="",
+    mode='replay',
+    landing_zone_path=RAW_LANDING_ZONE_PATH,
+    replay_from='{{ params.replay_from or "" }}',
+    replay_to='{{ params.replay_to or "" }}',
+    run_stats_table=RUN_STATS_TABLE,
+    dag=dag
+)
@@ -0,0 +1,25 @@
+-- Join katalog m_songs dengan library Spotify dan YouTube memakai match key yang sudah dinormalisasi.
+-- Setiap LIKE '%' || key || '%' dilayani index trigram di m_songs dan library_music_youtube,
+-- sehingga tidak terjadi nested loop atas seluruh cross product.
+SELECT
+    ms.code,
+    lmy.video_id,
+    lmy.channel_id,
+    lmy.video_title,
+    lmy.channel_title,
+    sp.isrc,
+    sp.spotify_track_id,
+    sp.track_name AS spotify_track_name,
+    sp.album_name AS spotify_album,
+    sp.release_date AS spotify_release_date,
+    ms.original_artist,
+    ms.song_title
+FROM demo_music.library_music_spotify sp
+JOIN demo_music.m_songs ms
+    ON ms.match_artist LIKE '%' || sp.match_artist || '%'
+    AND ms.match_title LIKE '%' || sp.match_title || '%'
+JOIN demo_music.library_music_youtube lmy
+    ON lmy.match_title LIKE '%' || sp.match_title || '%'
+-- Match key kosong akan cocok dengan semua baris
+WHERE sp.match_artist <> ''
+    AND sp.match_title <> '';
@@ -0,0 +1,99 @@
+-- Versi incremental dari load_media_warehouse_raw.sql: hanya baris join yang lagu, track Spotify
+-- atau video YouTube-nya berubah sejak watermark terakhir tabel tersebut yang dihitung ulang.
+-- Query dijalankan dengan parameter watermark per tabel, jadi wildcard LIKE ditulis ganda.
+-- Ketiga cabang boleh menghasilkan baris yang sama, duplikat dibuang oleh DISTINCT ON saat merge.
+WITH changed_songs AS (
+    SELECT code
+    FROM demo_music.m_songs
+    WHERE updated_at > %(m_songs)s
+),
+changed_tracks AS (
+    SELECT isrc, spotify_track_id
+    FROM demo_music.library_music_spotify
+    WHERE updated_at > %(library_music_spotify)s
+),
+changed_videos AS (
+    SELECT video_id, channel_id
+    FROM demo_music.library_music_youtube
+    WHERE updated_at > %(library_music_youtube)s
+)
+-- Lagu yang berubah
+SELECT
+    ms.code,
+    lmy.video_id,
+    lmy.channel_id,
+    lmy.video_title,
+    lmy.channel_title,
+    sp.isrc,
+    sp.spotify_track_id,
+    sp.track_name AS spotify_track_name,
+    sp.album_name AS spotify_album,
+    sp.release_date AS spotify_release_date,
+    ms.original_artist,
+    ms.song_title
+FROM changed_songs cs
+JOIN demo_music.m_songs ms
+    ON ms.code = cs.code
+JOIN demo_music.library_music_spotify sp
+    ON ms.match_artist LIKE '%%' || sp.match_artist || '%%'
+    AND ms.match_title LIKE '%%' || sp.match_title || '%%'
+JOIN demo_music.library_music_youtube lmy
+    ON lmy.match_title LIKE '%%' || sp.match_title || '%%'
+WHERE sp.match_artist <> ''
+    AND sp.match_title <> ''
+
+UNION ALL
+
+-- Track Spotify yang berubah
+SELECT
+    ms.code,
+    lmy.video_id,
+    lmy.channel_id,
+    lmy.video_title,
+    lmy.channel_title,
+    sp.isrc,
+    sp.spotify_track_id,
+    sp.track_name AS spotify_track_name,
+    sp.album_name AS spotify_album,
+    sp.release_date AS spotify_release_date,
+    ms.original_artist,
+    ms.song_title
+FROM changed_tracks ct
+JOIN demo_music.library_music_spotify sp
+    ON sp.isrc = ct.isrc
+    AND sp.spotify_track_id = ct.spotify_track_id
+JOIN demo_music.m_songs ms
+    ON ms.match_artist LIKE '%%' || sp.match_artist || '%%'
+    AND ms.match_title LIKE '%%' || sp.match_title || '%%'
+JOIN demo_music.library_music_youtube lmy
+    ON lmy.match_title LIKE '%%' || sp.match_title || '%%'
+WHERE sp.match_artist <> ''
+    AND sp.match_title <> ''
+
+UNION ALL
+
+-- Video YouTube yang berubah
+SELECT
+    ms.code,
+    lmy.video_id,
+    lmy.channel_id,
+    lmy.video_title,
+    lmy.channel_title,
+    sp.isrc,
+    sp.spotify_track_id,
+    sp.track_name AS spotify_track_name,
+    sp.album_name AS spotify_album,
+    sp.release_date AS spotify_release_date,
+    ms.original_artist,
+    ms.song_title
+FROM changed_videos cv
+JOIN demo_music.library_music_youtube lmy
+    ON lmy.video_id = cv.video_id
+    AND lmy.channel_id = cv.channel_id
+JOIN demo_music.library_music_spotify sp
+    ON lmy.match_title LIKE '%%' || sp.match_title || '%%'
+JOIN demo_music.m_songs ms
+    ON ms.match_artist LIKE '%%' || sp.match_artist || '%%'
+    AND ms.match_title LIKE '%%' || sp.match_title || '%%'
+WHERE sp.match_artist <> ''
+    AND sp.match_title <> '';
@@ -0,0 +1,72 @@
+from airflow.models import BaseOperator
+from airflow.providers.postgres.hooks.postgres import PostgresHook
+
+
+def apply_code_shard(source_query: str, shard: dict = None, key_column: str = 'code') -> str:
+    """
+    Batasi ``source_query`` (harus memuat kolom ``key_column``) ke range milik ``shard``:
+    ``code_from <= code < code_to``, batas yang None berarti tidak dibatasi.
+    """
+    if not shard:
+        return source_query
+
+    conditions = []
+    if shard.get('code_from') is not None:
+        conditions.append(f"src.{key_column} >= {int(shard['code_from'])}")
+    if shard.get('code_to') is not None:
+        conditions.append(f"src.{key_column} < {int(shard['code_to'])}")
+    if not conditions:
+        return source_query
+
+    source_query = source_query.strip().rstrip(';')
+    return f"SELECT src.* FROM ({source_query}\n) AS src WHERE {' AND '.join(conditions)}"
+
+
+class CodeShardPlannerOperator(BaseOperator):
+    """
+    Membagi ``table`` menjadi ``shard_count`` range ``key_column`` dengan jumlah baris yang kurang lebih sama.
+
+    Hasilnya (list of dict, lewat XCom) dipakai untuk ``.expand(shard=...)`` pada operator crawler.
+    Range saling menyambung dan shard pertama/terakhir tidak punya batas bawah/atas,
+    sehingga code yang ditambahkan setelah planning tetap masuk ke salah satu shard.
+    """
+
+    def __init__(
+            self,
+            *,
+            postgres_conn_id: str,
+            table: str = 'demo_music.m_songs',
+            key_column: str = 'code',
+            shard_count: int = 4,
+            **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.postgres_conn_id = postgres_conn_id
+        self.table = table
+        self.key_column = key_column
+        self.shard_count = shard_count
+
+    def execute(self, context) -> list:
+        postgres_hook = PostgresHook(self.postgres_conn_id)
+
+        # Batas bawah tiap bucket ntile; bucket pertama dimulai dari -inf
+        records = postgres_hook.get_records(
+            f"""
+            SELECT min({self.key_column})
+            FROM (
+                SELECT {self.key_column}, ntile(%s) OVER (ORDER BY {self.key_column}) AS bucket
+                FROM {self.table}
+            ) AS buckets
+            GROUP BY bucket
+            ORDER BY bucket
+            """,
+            parameters=(max(1, self.shard_count),),
+        )
+        bounds = [None] + [record[0] for record in records[1:]] + [None]
+
+        shards = [
+            {'index': index, 'code_from': code_from, 'code_to': code_to}
+            for index, (code_from, code_to) in enumerate(zip(bounds, bounds[1:]))
+        ]
+        self.log.info(f"Planned {len(shards)} shards over {self.table}.{self.key_column}: {shards}")
+        return shards
@@ -0,0 +1,86 @@
+from datetime import timedelta
+import time
+
+from plugins.custom_operator.postgres_bulk_writer import bulk_upsert
+
+
+def crawl_run_id(task, context, shard: dict = None) -> str:
+    """Id yang sama untuk semua percobaan (retry) satu task instance, termasuk index shard jika di-shard."""
+    run_id = f"{task.dag_id}.{task.task_id}.{context['run_id']}"
+    if shard:
+        run_id += f".shard{shard['index']}"
+    return run_id
+
+
+def crawl_checkpoint_key(task, shard: dict = None) -> str:
+    """
+    Kunci checkpoint yang sama untuk semua DAG run satu task (dan shard), sehingga crawl yang berhenti
+    karena time budget atau kuota dilanjutkan oleh run berikutnya, bukan hanya oleh retry.
+    """
+    key = f"{task.dag_id}.{task.task_id}"
+    if shard:
+        key += f".shard{shard['index']}"
+    return key
+
+
+class CrawlCheckpoint:
+    """
+    Progress crawl per lagu untuk satu task (dan shard), disimpan di ``checkpoint_table``.
+
+    Lagu yang hasilnya sudah di-upsert dicatat di sini, sehingga retry atau run berikutnya melanjutkan dari
+    lagu pertama yang belum diproses, bukan mengulang pencarian dari awal. Checkpoint dihapus setelah semua
+    lagu selesai; baris yang lebih tua dari ``max_age`` (misalnya dari jumlah shard lama) dihapus saat dibaca.
+    """
+
+    def __init__(self, postgres_hook, source: str, run_id: str,
+                 checkpoint_table: str = 'demo_music.crawl_checkpoint', max_age: timedelta = timedelta(days=7),
+                 log=None):
+        self.postgres_hook = postgres_hook
+        self.source = source
+        self.run_id = run_id
+        self.checkpoint_table = checkpoint_table
+        self.max_age = max_age
+        self.log = log
+
+    def processed_codes(self) -> set:
+        if self.max_age is not None:
+            self.postgres_hook.run(
+                f"DELETE FROM {self.checkpoint_table} WHERE source = %s AND processed_at < LOCALTIMESTAMP - %s",
+                parameters=(self.source, self.max_age),
+            )
+        records = self.postgres_hook.get_records(
+            f"SELECT code FROM {self.checkpoint_table} WHERE source = %s AND run_id = %s",
+            parameters=(self.source, self.run_id),
+        )
+        return {record[0] for record in records}
+
+    def mark_processed(self, result_counts: dict) -> None:
+        """Record every ``code`` whose results are already written, with its number of results."""
+        if not result_counts:
+            return
+        bulk_upsert(
+            self.postgres_hook,
+            self.checkpoint_table,
+            ['source', 'run_id', 'code', 'result_count'],
+            [(self.source, self.run_id, code, count) for code, count in result_counts.items()],
+            identifier=['source', 'run_id', 'code'],
+            updated_at_column='processed_at',
+            log=self.log,
+        )
+
+    def clear(self) -> None:
+        """Hapus checkpoint setelah semua lagu selesai diproses."""
+        self.postgres_hook.run(
+            f"DELETE FROM {self.checkpoint_table} WHERE source = %s AND run_id = %s",
+            parameters=(self.source, self.run_id),
+        )
+
+
+class TimeBudget:
+    """Batas waktu crawl, supaya task berhenti dengan rapi (progress tersimpan) sebelum execution_timeout."""
+
+    def __init__(self, budget=None):
+        self.deadline = time.monotonic() + budget.total_seconds() if budget is not None else None
+
+    def exhausted(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
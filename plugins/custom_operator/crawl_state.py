@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+from plugins.custom_operator.postgres_bulk_writer import bulk_upsert
+
+# Hash 64-bit dari judul dan artis saat lagu di-crawl, dihitung di Postgres.
+# Kolom source_query dipakai berdasarkan posisi: judul, artis, code (sama seperti record[0..2] di operator).
+_CONTENT_HASH_SQL = "('x' || left(md5(concat_ws(chr(31), src.crawl_title, src.crawl_artist)), 16))::bit(64)::int8"
+
+
+def batch_result_counts(batch) -> dict:
+    """
+    ``code -> jumlah hasil`` untuk satu micro-batch ``(record, results)``. Lagu yang dilewati tanpa pencarian
+    (judul atau artis kosong) tetap dicatat dengan None, supaya crawl incremental tidak memilihnya lagi
+    sampai judul/artisnya diisi. Record tanpa kolom code tidak bisa dicatat.
+    """
+    return {
+        record[2]: None if results is None else len(results) for record, results in batch if len(record) > 2
+    }
+
+
+class CrawlState:
+    """
+    Status crawl per lagu untuk satu source di ``state_table``: waktu crawl terakhir, jumlah hasil
+    dan hash judul + artis yang dipakai saat crawl.
+
+    Dipakai untuk urutan lagu saat kuota terbatas (belum pernah di-crawl dulu, lalu yang paling lama)
+    dan untuk crawl incremental yang hanya mengambil lagu baru, lagu yang judul/artisnya berubah,
+    atau lagu yang crawl terakhirnya lebih tua dari ``recrawl_after``.
+    """
+
+    def __init__(self, postgres_hook, source: str, state_table: str = 'demo_music.crawl_state', log=None):
+        self.postgres_hook = postgres_hook
+        self.source = source
+        self.state_table = state_table
+        self.log = log
+        # code -> content hash dari lagu yang dipilih select_songs, disimpan lagi oleh mark_crawled
+        self._content_hashes = {}
+
+    def select_songs(self, source_query: str, limit: int = None, incremental: bool = False,
+                     recrawl_after: timedelta = None) -> list:
+        """
+        Rows of ``source_query`` (title, artist, code, ...), never crawled first and then the stalest.
+
+        With ``incremental`` only the songs that are due are returned: new codes, codes whose title or artist
+        changed since their last crawl, and, when ``recrawl_after`` is set, codes last crawled longer ago.
+        """
+        if limit is not None and limit <= 0:
+            return []
+        # Query ini dijalankan dengan parameter, jadi % literal di source_query (LIKE 'a%') di-escape
+        source_query = source_query.strip().rstrip(';').replace('%', '%%')
+        conditions = []
+        if incremental:
+            # State lama tanpa hash dianggap tidak berubah, hanya di-crawl ulang setelah recrawl_after
+            due = [
+                "cs.code IS NULL",
+                f"(cs.content_hash IS NOT NULL AND cs.content_hash <> {_CONTENT_HASH_SQL})",
+            ]
+            if recrawl_after is not None:
+                due.append("cs.last_crawled_at < %(stale_before)s")
+            conditions.append(f"({' OR '.join(due)})")
+        records = self.postgres_hook.get_records(
+            f"""
+            SELECT src.*, {_CONTENT_HASH_SQL} AS crawl_content_hash
+            FROM ({source_query}
+            ) AS src (crawl_title, crawl_artist, code)
+            LEFT JOIN {self.state_table} cs ON cs.source = %(source)s AND cs.code = src.code
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY cs.last_crawled_at ASC NULLS FIRST, src.code
+            {'LIMIT %(limit)s' if limit is not None else ''}
+            """,
+            parameters={
+                'source': self.source,
+                'stale_before': datetime.now() - recrawl_after if recrawl_after is not None else None,
+                'limit': limit,
+            },
+        )
+        self._content_hashes.update((record[2], record[-1]) for record in records)
+        if incremental and self.log:
+            self.log.info(f"{len(records)} {self.source} songs are new, changed or due for a recrawl.")
+        return [tuple(record[:-1]) for record in records]
+
+    def mark_crawled(self, result_counts: dict) -> None:
+        """
+        Record crawl time, result count and content hash for each crawled ``code``. A count of None marks a
+        song that was skipped without a search.
+        """
+        if not result_counts:
+            return
+        crawled_at = datetime.now()
+        bulk_upsert(
+            self.postgres_hook,
+            self.state_table,
+            ['source', 'code', 'last_crawled_at', 'result_count', 'content_hash'],
+            [
+                (self.source, code, crawled_at, count, self._content_hashes.get(code))
+                for code, count in result_counts.items()
+            ],
+            identifier=['source', 'code'],
+            log=self.log,
+        )
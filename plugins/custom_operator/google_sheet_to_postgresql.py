@@ -1,10 +1,25 @@
-import pandas as pd
-import requests
-from io import StringIO
+from io import BytesIO
+from datetime import datetime
+import hashlib
 from airflow.models import BaseOperator
 from airflow.providers.postgres.hooks.postgres import PostgresHook
 import time
 
+from plugins.custom_operator.postgres_bulk_writer import bulk_upsert
+from plugins.custom_operator.run_stats import record_run_stats
+from plugins.custom_operator.text_normalization import clean_sheet_column, map_unique, match_key_column
+
+from typing import TYPE_CHECKING, Iterator
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def _hash_text(value) -> str:
+    """Teks sel untuk content hash: 1998 dan 1998.0 menghasilkan teks yang sama."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
 
 class GoogleSheetToPostgresOperator(BaseOperator):
     def __init__(
@@ -15,6 +30,12 @@ class GoogleSheetToPostgresOperator(BaseOperator):
             target_table: str,
             column_mapping: dict,  # Mapping nama kolom Google Sheet ke database
             identifier: list,  # Kolom yang digunakan untuk upsert (unique constraint)
+            match_key_columns: dict = None,  # Kolom match key di database -> kolom sumber yang dinormalisasi
+            updated_at_column: str = None,  # Kolom timestamp yang hanya diperbarui jika isi baris berubah
+            content_hash_column: str = None,  # Kolom hash isi baris, hanya baris baru/berubah yang di-upsert
+            sync_state_table: str = None,  # Tabel hash payload CSV, run dilewati jika sheet tidak berubah
+            chunk_size: int = 50000,  # Jumlah baris CSV yang dibaca dan dibersihkan sekaligus
+            run_stats_table: str = None,  # Tabel metrik per run (pipeline_run_stats), metrik StatsD selalu dikirim
             *args,
             **kwargs,
     ):
@@ -25,97 +46,178 @@ class GoogleSheetToPostgresOperator(BaseOperator):
         self.target_table = target_table
         self.column_mapping = column_mapping
         self.identifier = identifier
-
-    def read_google_sheet(self) -> pd.DataFrame:
-        """
-        Membaca data dari Google Sheet dan melakukan transformasi kolom.
-        """
-        try:
-            # Construct the CSV export URL for the specific sheet
-            csv_url = f'https://docs.google.com/spreadsheets/d/{self.google_sheet_id}/gviz/tq?tqx=out:csv&sheet={self.sheet_name}'
-            self.log.info(f"Fetching Google Sheet from URL: {csv_url}")
-
-            # Send the request to get the CSV data
-            response = requests.get(csv_url)
-            response.raise_for_status()
-
-            # Load the CSV data into a pandas DataFrame
-            df = pd.read_csv(StringIO(response.text))
-
-            # Transformasi nama kolom sesuai dengan mapping
-            df.rename(columns=self.column_mapping, inplace=True)
-            self.log.info(f"Transformed columns: {df.columns.tolist()}")
-
-            # Replace empty strings or NaN values with None
-            df = df.applymap(lambda x: 'unknown' if pd.isna(x) or x == "" else x)
-
-
-            # Convert all string data to lowercase
-            df = df.applymap(lambda x: str(x).lower() if isinstance(x, str) else x)
-
-            return df
-
-        except Exception as e:
-            self.log.error(f"Error while reading Google Sheet: {str(e)}")
-            return pd.DataFrame()  # Return an empty DataFrame to avoid further errors
-
-    def generate_upsert_query(self, target_fields, identifier):
-        """
-        Membuat query SQL untuk operasi upsert.
+        self.match_key_columns = match_key_columns or {}
+        self.updated_at_column = updated_at_column
+        self.content_hash_column = content_hash_column
+        self.sync_state_table = sync_state_table
+        self.chunk_size = chunk_size
+        self.run_stats_table = run_stats_table
+
+    @property
+    def sheet_key(self) -> str:
+        return f"{self.google_sheet_id}/{self.sheet_name}"
+
+    def download_google_sheet(self) -> bytes:
+        """Download the sheet as CSV and return the raw payload."""
+        from plugins.custom_operator.http_transport import build_http_session
+
+        # Construct the CSV export URL for the specific sheet
+        csv_url = f'https://docs.google.com/spreadsheets/d/{self.google_sheet_id}/gviz/tq?tqx=out:csv&sheet={self.sheet_name}'
+        self.log.info(f"Fetching Google Sheet from URL: {csv_url}")
+
+        # Send the request to get the CSV data, 429/5xx dicoba ulang dengan backoff (mengikuti Retry-After).
+        # Export sheet besar bisa lambat, jadi read timeout lebih longgar
+        with build_http_session(timeout=(5, 120)) as session:
+            response = session.get(csv_url)
+            session.call_stats.log_summary(self.log)
+            self.run_stats.add_http(session.call_stats)
+        response.raise_for_status()
+        return response.content
+
+    def clean_chunk(self, df: 'pd.DataFrame') -> 'pd.DataFrame':
         """
-        columns = ', '.join(target_fields)
-        placeholders = ', '.join(['%s'] * len(target_fields))
-        conflict_target = ', '.join(identifier)
-        update_set = ', '.join([f"{col} = EXCLUDED.{col}" for col in target_fields if col not in identifier])
-
-        query = f"""
-            INSERT INTO {self.target_table} ({columns})
-            VALUES ({placeholders})
-            ON CONFLICT ({conflict_target})
-            DO UPDATE SET {update_set};
+        Transformasi satu chunk CSV per kolom (bukan per sel): rename kolom, nilai kosong menjadi 'unknown',
+        string menjadi lowercase, lalu isi kolom match key.
         """
-        self.log.info(f"Generated UPSERT query: {query}")
-        return query
-
+        # Transformasi nama kolom sesuai dengan mapping
+        df = df.rename(columns=self.column_mapping)
+
+        for column in df.columns:
+            df[column] = clean_sheet_column(df[column])
+
+        # Isi kolom match key yang dipakai join media_warehouse_raw
+        for match_column, source_column in self.match_key_columns.items():
+            df[match_column] = match_key_column(df[source_column])
+
+        return df
+
+    def read_chunks(self, payload: bytes) -> Iterator['pd.DataFrame']:
+        """Read the CSV payload ``chunk_size`` rows at a time and yield every cleaned chunk."""
+        import pandas as pd
+
+        for chunk in pd.read_csv(BytesIO(payload), chunksize=self.chunk_size):
+            yield self.clean_chunk(chunk)
+
+    def add_content_hash(self, df: 'pd.DataFrame') -> 'pd.DataFrame':
+        """Isi ``content_hash_column`` dengan hash 64-bit dari semua kolom selain identifier."""
+        import pandas as pd
+
+        content_columns = [col for col in df.columns if col not in self.identifier]
+        # Dtype ditebak per chunk (1998 bisa terbaca int, float, atau object), jadi hash dihitung dari teksnya
+        content = df[content_columns].apply(lambda column: map_unique(column, _hash_text))
+        hashes = pd.util.hash_pandas_object(content, index=False)
+        # uint64 disimpan di kolom bigint
+        df[self.content_hash_column] = hashes.to_numpy().view('int64')
+        return df
+
+    def stored_content_hashes(self, postgres_hook) -> 'pd.DataFrame':
+        import pandas as pd
+
+        columns = self.identifier + [self.content_hash_column]
+        records = postgres_hook.get_records(f"SELECT {', '.join(columns)} FROM {self.target_table}")
+        stored = pd.DataFrame(records, columns=self.identifier + ['stored_hash'])
+        # Nullable integer supaya hash 64-bit tidak berubah menjadi float saat merge
+        return stored.astype({'stored_hash': 'Int64'})
+
+    def changed_rows(self, df: 'pd.DataFrame', stored: 'pd.DataFrame') -> 'pd.DataFrame':
+        """Baris yang identifier-nya belum ada di database atau content hash-nya berbeda."""
+        merged = df.merge(stored, on=self.identifier, how='left')
+        is_changed = merged['stored_hash'] != merged[self.content_hash_column]
+        changed = merged[merged['stored_hash'].isna() | is_changed.fillna(True)]
+        return changed.drop(columns=['stored_hash'])
+
+    def stored_payload_hash(self, postgres_hook):
+        record = postgres_hook.get_first(
+            f"SELECT payload_hash FROM {self.sync_state_table} WHERE sheet_key = %s",
+            parameters=(self.sheet_key,),
+        )
+        return record[0] if record else None
+
+    def save_payload_hash(self, postgres_hook, payload_hash: str, row_count: int) -> None:
+        bulk_upsert(
+            postgres_hook,
+            self.sync_state_table,
+            ['sheet_key', 'payload_hash', 'row_count', 'synced_at'],
+            [(self.sheet_key, payload_hash, row_count, datetime.now())],
+            identifier=['sheet_key'],
+            log=self.log,
+        )
+
+    @record_run_stats('postgres_conn_id')
     def execute(self, context):
         """
         Eksekusi operator untuk membaca Google Sheet dan melakukan upsert ke PostgreSQL.
         """
+        import pandas as pd
+
         start_time = time.time()
+        postgres_hook = PostgresHook(self.postgres_conn_id)
 
         # Membaca data dari Google Sheet
-        df = self.read_google_sheet()
-        if df.empty:
-            self.log.info("No data found in Google Sheet. Exiting.")
+        try:
+            with self.run_stats.phase('fetch'):
+                payload = self.download_google_sheet()
+        except Exception as e:
+            self.log.error(f"Error while reading Google Sheet: {str(e)}")
             return
 
-        # Membuat koneksi ke PostgreSQL
-        postgres_hook = PostgresHook(self.postgres_conn_id)
-        conn = postgres_hook.get_conn()
-        cursor = conn.cursor()
-
-        try:
-            # Menyisipkan atau memperbarui data ke PostgreSQL
-            rows = df.to_records(index=False).tolist()
-            target_fields = df.columns.tolist()
-            query = self.generate_upsert_query(target_fields, self.identifier)
-
-            if rows:
-                self.log.info(f"Executing upsert query: {query}")
-                cursor.executemany(query, rows)
-                conn.commit()
-                self.log.info(f"Upserted {len(rows)} rows into {self.target_table}.")
-            else:
-                self.log.info("No data to upsert.")
+        # Sheet yang sama persis dengan run sebelumnya tidak perlu diproses lagi
+        payload_hash = hashlib.sha256(payload).hexdigest()
+        if self.sync_state_table and payload_hash == self.stored_payload_hash(postgres_hook):
+            self.log.info(f"Google Sheet unchanged since the last sync ({payload_hash}). Exiting.")
+            return
 
-        except Exception as e:
-            self.log.error(f"Error during database operation: {e}")
-            conn.rollback()
-            raise
+        with self.run_stats.phase('fetch'):
+            stored = self.stored_content_hashes(postgres_hook) if self.content_hash_column else None
+        row_count = 0
+        changed_chunks = []
+        with self.run_stats.phase('transform'):
+            for chunk in self.read_chunks(payload):
+                row_count += len(chunk)
+                if self.content_hash_column:
+                    chunk = self.changed_rows(self.add_content_hash(chunk), stored)
+                changed_chunks.append(chunk)
+        self.run_stats.add(rows_read=row_count)
+
+        if not row_count:
+            self.log.info("No data found in Google Sheet. Exiting.")
+            return
 
-        finally:
-            cursor.close()
-            conn.close()
+        df = pd.concat(changed_chunks, ignore_index=True)
+        self.log.info(f"{len(df)} of {row_count} rows are new or changed.")
+
+        if not df.empty:
+            # Baris yang isinya sama dengan di database tidak di-update, sehingga updated_at tetap.
+            # updated_at diisi jam database, sama dengan watermark load warehouse
+            compare_fields = None
+            if self.updated_at_column:
+                compare_fields = [col for col in df.columns if col not in self.identifier]
+
+            # Upsert ke PostgreSQL: COPY ke staging table lalu satu kali merge dalam satu transaksi
+            try:
+                with self.run_stats.phase('write'):
+                    upserted = bulk_upsert(
+                        postgres_hook,
+                        self.target_table,
+                        df.columns.tolist(),
+                        df.itertuples(index=False, name=None),
+                        identifier=self.identifier,
+                        compare_fields=compare_fields,
+                        updated_at_column=self.updated_at_column,
+                        log=self.log,
+                        run_stats=self.run_stats,
+                    )
+                self.log.info(f"Upserted {upserted} rows into {self.target_table}.")
+            except Exception as e:
+                self.log.error(f"Error during database operation: {e}")
+                raise
+
+        # Baris yang content hash-nya sama tidak dikirim ke database, dihitung sebagai skipped
+        self.run_stats.add(rows_skipped=row_count - len(df))
+
+        if self.sync_state_table:
+            with self.run_stats.phase('write'):
+                self.save_payload_hash(postgres_hook, payload_hash, row_count)
 
         execution_time = time.time() - start_time
         self.log.info(f"Execution completed in {execution_time:.2f} seconds.")
@@ -0,0 +1,143 @@
+from collections import defaultdict
+from urllib.parse import urlsplit
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+# Status yang dicoba ulang: rate limit dan error sementara di sisi server
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HttpCallStats:
+    """Per-endpoint counters (``host/path``) of requests, retries, throttled responses and seconds spent waiting."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = defaultdict(lambda: {'requests': 0, 'retries': 0, 'throttled': 0, 'wait_seconds': 0.0})
+
+    @staticmethod
+    def endpoint(host, url) -> str:
+        parts = urlsplit(url)
+        return f"{parts.hostname or host}{parts.path}"
+
+    def record(self, endpoint: str, **counts) -> None:
+        with self._lock:
+            counters = self.endpoints[endpoint]
+            for name, value in counts.items():
+                counters[name] += value
+
+    def on_response(self, response, *args, **kwargs):
+        """requests response hook, called once per request after all transport-level retries."""
+        self.record(self.endpoint(None, response.url), requests=1)
+
+    def log_summary(self, log) -> None:
+        for endpoint, counters in sorted(self.endpoints.items()):
+            log.info(
+                f"HTTP {endpoint}: {counters['requests']} requests, {counters['retries']} retries, "
+                f"{counters['throttled']} throttled, {counters['wait_seconds']:.1f}s waiting"
+            )
+
+
+class BackoffRetry(Retry):
+    """
+    urllib3 Retry dengan full jitter pada exponential backoff, dan pencatatan retry serta waktu tunggu per endpoint.
+
+    ``Retry-After`` dari server (429/503) tetap diikuti oleh urllib3 dan diutamakan di atas backoff.
+    """
+
+    def __init__(self, *args, stats: HttpCallStats = None, endpoint: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+        self.endpoint = endpoint
+
+    def new(self, **kw):
+        kw.setdefault('stats', self.stats)
+        kw.setdefault('endpoint', self.endpoint)
+        return super().new(**kw)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        retry.endpoint = HttpCallStats.endpoint(getattr(_pool, 'host', None), url or '')
+        if self.stats:
+            self.stats.record(retry.endpoint, retries=1, throttled=int(response is not None and response.status == 429))
+        return retry
+
+    def get_backoff_time(self) -> float:
+        # Full jitter: worker yang kena rate limit bersamaan tidak mencoba ulang di detik yang sama
+        return random.uniform(0, super().get_backoff_time())
+
+    def sleep(self, response=None) -> None:
+        started = time.monotonic()
+        super().sleep(response)
+        if self.stats:
+            self.stats.record(self.endpoint, wait_seconds=time.monotonic() - started)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with a default (connect, read) timeout for requests that do not pass one."""
+
+    def __init__(self, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout if timeout is not None else self.timeout, **kwargs)
+
+
+def build_http_session(
+        timeout=(5, 30),  # (connect, read) dalam detik
+        retries: int = 5,
+        backoff_factor: float = 0.5,
+        backoff_max: float = 60,
+        pool_maxsize: int = 10,  # Sesuaikan dengan jumlah thread yang memakai session bersamaan
+        stats: HttpCallStats = None,
+) -> requests.Session:
+    """
+    Session ``requests`` dengan keep-alive connection pool, timeout default dan retry dengan backoff.
+
+    Counter per endpoint tersedia di ``session.call_stats``.
+    """
+    stats = stats or HttpCallStats()
+    retry = BackoffRetry(
+        total=retries,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,  # Semua method, termasuk POST token Spotify
+        backoff_factor=backoff_factor,
+        backoff_max=backoff_max,
+        raise_on_status=False,  # Response terakhir dikembalikan, error dibuat oleh client API masing-masing
+        stats=stats,
+    )
+    adapter = TimeoutHTTPAdapter(timeout=timeout, max_retries=retry, pool_connections=4, pool_maxsize=pool_maxsize)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.hooks['response'].append(stats.on_response)
+    session.call_stats = stats
+    return session
+
+
+class RequestsHttp:
+    """Minimal ``httplib2.Http`` replacement so googleapiclient sends its requests through a pooled session."""
+
+    def __init__(self, session: requests.Session):
+        self.session = session
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        import httplib2
+
+        response = self.session.request(method, uri, data=body, headers=headers)
+        info = {name.lower(): value for name, value in response.headers.items()}
+        info['status'] = str(response.status_code)
+        info['reason'] = response.reason
+        # requests sudah men-decode gzip, jadi header ini tidak berlaku lagi untuk content
+        info.pop('content-encoding', None)
+        info.pop('content-length', None)
+        return httplib2.Response(info), response.content
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,127 @@
+from airflow.models import BaseOperator
+from airflow.providers.postgres.hooks.postgres import PostgresHook
+import time
+
+from plugins.custom_operator.partition_swap import PartitionSwap
+from plugins.custom_operator.postgres_bulk_writer import bulk_upsert
+from plugins.custom_operator.run_stats import record_run_stats
+from plugins.custom_operator.substring_matcher import MEDIA_WAREHOUSE_COLUMNS, match_media_warehouse
+
+
+class MediaWarehouseMatcherOperator(BaseOperator):
+    """
+    Engine kedua untuk load media_warehouse_raw: ketiga tabel dibaca sekali, lalu join substring
+    dikerjakan di Python dengan automaton Aho-Corasick (linear terhadap total panjang teks),
+    bukan dengan join LIKE '%x%' di database.
+    """
+
+    def __init__(
+            self,
+            *,
+            postgres_conn_id: str,
+            target_table: str = 'demo_music.media_warehouse_raw',
+            identifier: list = ('code', 'video_id', 'spotify_track_id'),
+            replace: bool = False,
+            updated_at_column: str = None,
+            added_at_column: str = None,
+            partition_swap: bool = False,
+            songs_table: str = 'demo_music.m_songs',
+            spotify_table: str = 'demo_music.library_music_spotify',
+            youtube_table: str = 'demo_music.library_music_youtube',
+            run_stats_table: str = None,  # Tabel metrik per run (pipeline_run_stats)
+            **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.postgres_conn_id = postgres_conn_id
+        self.target_table = target_table
+        self.identifier = list(identifier)
+        self.replace = replace
+        # Sama seperti MySqlToPostgresOperator: dengan replace, updated_at diisi jam database dan hanya
+        # bergerak jika isi baris berubah
+        self.updated_at_column = updated_at_column
+        # Setiap run menghitung ulang seluruh warehouse. Dengan partition_swap hasilnya dimuat ke partisi baru
+        # yang menggantikan partisi lama, sehingga baris dari lagu/track/video yang sudah dihapus ikut hilang;
+        # added_at dibawa dari baris lama
+        self.added_at_column = added_at_column
+        self.partition_swap = partition_swap
+        self.songs_table = songs_table
+        self.spotify_table = spotify_table
+        self.youtube_table = youtube_table
+        self.run_stats_table = run_stats_table
+
+    @record_run_stats('postgres_conn_id')
+    def execute(self, context):
+        start_time = time.time()
+        postgres_hook = PostgresHook(self.postgres_conn_id)
+        stats = self.run_stats
+
+        with stats.phase('fetch'):
+            songs, tracks, videos = self.read_tables(postgres_hook)
+        stats.add(rows_read=len(songs) + len(tracks) + len(videos))
+        self.log.info(f"Loaded {len(songs)} songs, {len(tracks)} Spotify tracks and {len(videos)} YouTube videos.")
+
+        # Matching berjalan sambil baris hasilnya di-COPY: waktu menghasilkan baris dicatat sebagai transform
+        # dan dikeluarkan dari fase write
+        transform_seconds = stats.phase_seconds['transform']
+        rows = stats.timed(match_media_warehouse(songs, tracks, videos), 'transform')
+        with stats.phase('write'):
+            if self.partition_swap:
+                row_count = self.swap_partitions(postgres_hook, rows)
+            else:
+                compare_fields = None
+                if self.updated_at_column:
+                    compare_fields = [col for col in MEDIA_WAREHOUSE_COLUMNS if col not in self.identifier]
+                row_count = bulk_upsert(
+                    postgres_hook,
+                    self.target_table,
+                    MEDIA_WAREHOUSE_COLUMNS,
+                    rows,
+                    identifier=self.identifier,
+                    replace=self.replace,
+                    compare_fields=compare_fields,
+                    updated_at_column=self.updated_at_column,
+                    log=self.log,
+                    run_stats=stats,
+                )
+        stats.add_seconds('write', transform_seconds - stats.phase_seconds['transform'])
+        self.log.info(f"Matched {row_count} rows in {time.time() - start_time:.2f} seconds.")
+
+    def swap_partitions(self, postgres_hook, rows) -> int:
+        """Load the matched rows into new partitions of the target and swap them in, in one transaction."""
+        conn = postgres_hook.get_conn()
+        try:
+            swap = PartitionSwap(
+                conn,
+                self.target_table,
+                MEDIA_WAREHOUSE_COLUMNS,
+                self.identifier,
+                keep_columns=[self.added_at_column] if self.added_at_column else None,
+                log=self.log,
+            )
+            swap.prepare()
+            swap.copy(rows)
+            row_count = swap.load()
+            swap.swap()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        self.run_stats.add(rows_written=row_count)
+        return row_count
+
+    def read_tables(self, postgres_hook):
+        songs = postgres_hook.get_records(
+            f"SELECT code, original_artist, song_title, match_artist, match_title FROM {self.songs_table}"
+        )
+        tracks = postgres_hook.get_records(
+            f"""
+            SELECT isrc, spotify_track_id, track_name, album_name, release_date, match_artist, match_title
+            FROM {self.spotify_table}
+            """
+        )
+        videos = postgres_hook.get_records(
+            f"SELECT video_id, channel_id, video_title, channel_title, match_title FROM {self.youtube_table}"
+        )
+        return songs, tracks, videos
@@ -1,10 +1,14 @@
-from airflow.providers.mysql.hooks.mysql import MySqlHook
 from airflow.providers.postgres.hooks.postgres import PostgresHook
 from airflow.models import BaseOperator
-from datetime import datetime
+from datetime import datetime, timedelta
 from pytz import timezone
 import time
 
+from plugins.custom_operator.partition_swap import PartitionSwap
+from plugins.custom_operator.postgres_bulk_writer import PostgresBulkWriter, build_merge_sql
+from plugins.custom_operator.run_stats import record_run_stats
+from plugins.custom_operator.watermark_store import WatermarkStore
+
 from typing import TYPE_CHECKING, Optional, Sequence
 if TYPE_CHECKING:
     from airflow.utils.context import Context
@@ -15,10 +19,12 @@ class MySqlToPostgresOperator(BaseOperator):
 
     template_fields: Sequence[str] = (
         'query',
+        'incremental_query',
     )
     template_ext: Sequence[str] = ('.sql', '.json')
     template_fields_renderers = {
         "query": "sql",
+        "incremental_query": "sql",
     }
 
     def __init__(
@@ -32,6 +38,17 @@ class MySqlToPostgresOperator(BaseOperator):
             postgres_conn_target: str = None,
             replace: Optional[bool] = False,
             db_query_from: str = 'mysql',
+            batch_size: Optional[int] = None,
+            pushdown: bool = True,
+            incremental_query: str = None,
+            watermark_tables: Optional[list] = None,
+            watermark_column: str = 'updated_at',
+            watermark_table: str = 'demo_music.etl_watermarks',
+            full_refresh_interval: Optional[timedelta] = None,
+            partition_swap: bool = False,
+            updated_at_column: str = None,
+            added_at_column: str = None,
+            run_stats_table: str = None,
             **kwargs
     ) -> None:
         super().__init__(**kwargs)
@@ -40,83 +57,232 @@ class MySqlToPostgresOperator(BaseOperator):
         self.identifier = identifier
         self.mysql_conn = mysql_conn
         self.postgres_conn = postgres_conn
-        self.replace = replace,
+        self.replace = replace
         self.db_query_from = db_query_from
         self.postgres_conn_target = postgres_conn_target
+        self.batch_size = batch_size  # Jika diisi, baca dan tulis per chunk berukuran batch_size
+        self.pushdown = pushdown  # Jalankan INSERT ... SELECT di server jika source dan target database yang sama
+        # Mode incremental: incremental_query dijalankan dengan parameter %(nama_tabel)s berisi watermark
+        # terakhir tiap tabel di watermark_tables; query penuh tetap dijalankan di run pertama
+        # dan setiap full_refresh_interval
+        self.incremental_query = incremental_query
+        self.watermark_tables = watermark_tables or []
+        self.watermark_column = watermark_column
+        self.watermark_table = watermark_table
+        self.full_refresh_interval = full_refresh_interval
+        # Full refresh ke target_table yang dipartisi: data dimuat ke partisi baru tanpa index,
+        # index dibangun, lalu partisi lama ditukar dengan yang baru (bukan upsert per baris).
+        # Run incremental tetap upsert ke parent.
+        self.partition_swap = partition_swap
+        # Dengan replace, kolom ini diisi waktu load dan hanya diperbarui jika isi baris berubah,
+        # sehingga load berikutnya (misalnya mart song_media_summary) bisa memakainya sebagai watermark
+        self.updated_at_column = updated_at_column
+        # Waktu baris pertama kali dimuat: upsert tidak menimpanya, partition swap membawanya dari baris lama
+        self.added_at_column = added_at_column
+        self.run_stats_table = run_stats_table  # Tabel metrik per run (pipeline_run_stats)
 
         # params that will be passed
         self.row_count = 0
         self.current_time = datetime.now(timezone('Asia/Jakarta'))
         self.duration = 0
 
-    @staticmethod
-    def _serialize_cell(cell) -> str:
-
-        if cell is None:
-            return "NULL"
-        if isinstance(cell, datetime):
-            return "'" + cell.isoformat() + "'"
-        if isinstance(cell, str):
-            return "'" + str(cell).replace("'", "''") + "'"
-        return "'" + str(cell) + "'"
-
-    @staticmethod
-    def get_column(target_fields) -> str:
-        if target_fields:
-            target_fields_fragment = ", ".join(target_fields)
-            target_fields_fragment = f"({target_fields_fragment})"
-        else:
-            target_fields_fragment = ""
-
-        return target_fields_fragment
-
-    def get_value(self, rows) -> str:
-        values = ""
-        for i, row in enumerate(rows, 1):
-            lst = []
-            for cell in row:
-                cell = cell.replace('\0', '') if isinstance(cell, str) else cell
-                lst.append(self._serialize_cell(cell))
-            lsj = '(' + ','.join(lst).replace("None", "") + ')'
-            values += "" + lsj + ","
-        values = values[:-1]
-        return values
-
-    def generate_query(self, rows, target_fields) -> str:
-
-        sql = f"""
-            INSERT INTO {self.target_table}
-            {self.get_column(target_fields)}
-            VALUES {self.get_value(rows)}
+    def get_source_cursor(self, conn):
         """
+        Cursor biasa, atau cursor server-side jika batch_size diisi supaya hasil query
+        tidak dimuat sekaligus ke memori worker.
+        """
+        if not self.batch_size:
+            return conn.cursor()
 
-        if str(self.replace) == "(True,)":
-            if target_fields is None:
-                raise ValueError("PostgreSQL ON CONFLICT upsert syntax requires column names")
-            if self.identifier is None:
-                raise ValueError("PostgreSQL ON CONFLICT upsert syntax requires an unique index")
-            if isinstance(self.identifier, list):
-                replace_index = ",".join(self.identifier)
-            else:
-                replace_index = self.identifier
+        if self.db_query_from == 'postgres':
+            # Named cursor = server-side cursor di PostgreSQL
+            cursor = conn.cursor(name='mysql_to_postgres_source')
+            cursor.itersize = self.batch_size
+            return cursor
 
-            replace_target = [
-                "{0} = excluded.{0}".format(col) for col in target_fields if col not in self.identifier
-            ]
+        if type(conn).__module__.startswith('MySQLdb'):
+            from MySQLdb.cursors import SSCursor
 
-            sql += f"ON CONFLICT ({replace_index}) DO UPDATE SET {', '.join(replace_target)}"
-        else:
-            if isinstance(self.identifier, list):
-                replace_index = ",".join(self.identifier)
-                sql += f"ON CONFLICT ({replace_index}) DO NOTHING"
-            elif isinstance(self.identifier, str):
-                replace_index = self.identifier
-                sql += f"ON CONFLICT ({replace_index}) DO NOTHING"
-            else:
-                pass
+            return conn.cursor(SSCursor)
+        # mysql-connector-python: cursor unbuffered membaca baris dari server sesuai kebutuhan
+        return conn.cursor(buffered=False)
+
+    def compare_fields(self, target_fields: list) -> Optional[list]:
+        """
+        With ``updated_at_column`` an existing row is only updated (and its ``updated_at`` stamped by the
+        database) when one of the query columns changed.
+        """
+        if not self.updated_at_column:
+            return None
+        return [col for col in target_fields if col not in (self.identifier or [])]
+
+    def partition_swapper(self, conn, target_fields: list) -> PartitionSwap:
+        """PartitionSwap for a full refresh; ``added_at_column`` is carried over from the live rows."""
+        keep_columns = [self.added_at_column] if self.added_at_column else None
+        return PartitionSwap(
+            conn, self.target_table, target_fields, self.identifier, keep_columns=keep_columns, log=self.log
+        )
+
+    def write_rows(self, cursor, target) -> int:
+        """Fetch rows from ``cursor`` chunk by chunk and upsert each chunk into the target in one transaction."""
+        if self.replace and self.identifier is None:
+            raise ValueError("PostgreSQL ON CONFLICT upsert syntax requires an unique index")
+
+        with self.run_stats.phase('fetch'):
+            rows = cursor.fetchmany(self.batch_size) if self.batch_size else cursor.fetchall()
+
+        if not rows:
+            return 0
+
+        # Find column name based on query result (named cursor hanya punya description setelah fetch pertama)
+        target_fields = [x[0] for x in cursor.description]
+
+        target_conn = target.get_conn()
+        try:
+            # Perform inserting data: COPY ke staging table lalu merge ON CONFLICT berdasarkan identifier
+            writer = PostgresBulkWriter(
+                target_conn,
+                self.target_table,
+                target_fields,
+                identifier=self.identifier,
+                replace=bool(self.replace),
+                compare_fields=self.compare_fields(target_fields),
+                updated_at_column=self.updated_at_column,
+                log=self.log,
+            )
+            row_count = 0
+            while rows:
+                self.run_stats.add(rows_read=len(rows))
+                with self.run_stats.phase('write'):
+                    row_count += writer.write(rows)
+                with self.run_stats.phase('fetch'):
+                    rows = cursor.fetchmany(self.batch_size) if self.batch_size else None
+            with self.run_stats.phase('write'):
+                target_conn.commit()
+            self.run_stats.add(
+                rows_written=writer.merged_count, rows_skipped=writer.copied_count - writer.merged_count
+            )
+            return row_count
+        except Exception:
+            target_conn.rollback()
+            raise
+        finally:
+            target_conn.close()
+
+    def write_partition_swap(self, cursor, target) -> int:
+        """Copy every row from ``cursor`` into new partitions of the target and swap them in, in one transaction."""
+        with self.run_stats.phase('fetch'):
+            rows = cursor.fetchmany(self.batch_size) if self.batch_size else cursor.fetchall()
+        target_fields = [x[0] for x in cursor.description]
+
+        target_conn = target.get_conn()
+        try:
+            swap = self.partition_swapper(target_conn, target_fields)
+            with self.run_stats.phase('write'):
+                swap.prepare()
+            while rows:
+                self.run_stats.add(rows_read=len(rows))
+                with self.run_stats.phase('write'):
+                    swap.copy(rows)
+                with self.run_stats.phase('fetch'):
+                    rows = cursor.fetchmany(self.batch_size) if self.batch_size else None
+            with self.run_stats.phase('write'):
+                row_count = swap.load()
+                swap.swap()
+                target_conn.commit()
+            self.run_stats.add(rows_written=row_count)
+            return row_count
+        except Exception:
+            target_conn.rollback()
+            raise
+        finally:
+            target_conn.close()
+
+    def is_same_database(self) -> bool:
+        """True jika query source berjalan di database PostgreSQL yang sama dengan target."""
+        if self.db_query_from != 'postgres':
+            return False
+        target_conn_id = self.postgres_conn_target or self.postgres_conn
+        if target_conn_id == self.postgres_conn:
+            return True
+
+        source_conn = PostgresHook.get_connection(self.postgres_conn)
+        target_conn = PostgresHook.get_connection(target_conn_id)
+        return all(
+            getattr(source_conn, attr) == getattr(target_conn, attr)
+            for attr in ('host', 'port', 'schema', 'login')
+        )
 
-        return sql
+    def read_watermarks(self, source) -> dict:
+        """Current ``max(watermark_column)`` of every table in ``watermark_tables``, read in one query."""
+        columns = ', '.join(
+            f"(SELECT max({self.watermark_column}) FROM {table})" for table in self.watermark_tables
+        )
+        return dict(zip(self.watermark_tables, source.get_first(f"SELECT {columns}")))
 
+    def plan_incremental(self, stored: dict) -> Optional[dict]:
+        """
+        Query parameters for ``incremental_query`` built from the stored watermarks,
+        or None when a full refresh is due (first run, new table, or ``full_refresh_interval`` elapsed).
+        """
+        if any(table not in stored for table in self.watermark_tables):
+            return None
+
+        if self.full_refresh_interval:
+            last_full_refresh = [stored[table][1] for table in self.watermark_tables]
+            if None in last_full_refresh or datetime.now() - min(last_full_refresh) >= self.full_refresh_interval:
+                return None
+
+        # Tabel yang masih kosong saat run sebelumnya belum punya watermark
+        return {
+            table.split('.')[-1]: stored[table][0] or datetime.min
+            for table in self.watermark_tables
+        }
+
+    def execute_pushdown(self, target, query: str, parameters: Optional[dict] = None, swap: bool = False) -> int:
+        """
+        Merge the query result into the target with one INSERT ... SELECT, without moving rows through Python.
+
+        With ``swap`` the result is loaded into new partitions that replace the live ones (see PartitionSwap).
+        """
+        query = query.strip().rstrip(';')
+        conn = target.get_conn()
+        cursor = conn.cursor()
+        try:
+            # Ambil nama kolom hasil query tanpa menjalankan query secara penuh
+            cursor.execute(f"SELECT * FROM ({query}\n) AS src LIMIT 0", parameters)
+            target_fields = [x[0] for x in cursor.description]
+
+            if swap:
+                partition_swap = self.partition_swapper(conn, target_fields)
+                partition_swap.prepare()
+                row_count = partition_swap.load(f"({query}\n) AS src", parameters)
+                partition_swap.swap()
+                conn.commit()
+                return row_count
+
+            sql = build_merge_sql(
+                self.target_table,
+                target_fields,
+                f"({query}\n) AS src",
+                identifier=self.identifier,
+                replace=bool(self.replace),
+                compare_fields=self.compare_fields(target_fields),
+                updated_at_column=self.updated_at_column,
+            )
+            self.log.info(sql)
+            cursor.execute(sql, parameters)
+            row_count = cursor.rowcount
+            conn.commit()
+            return row_count
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    @record_run_stats('postgres_conn_target', 'postgres_conn')
     def execute(self, context: 'Context') -> None:
         self.current_time = datetime.now(timezone('Asia/Jakarta'))
         dateStart = (time.time() * 1000)
@@ -129,36 +295,70 @@ class MySqlToPostgresOperator(BaseOperator):
         # Check if mysql-to-postgres(raw) or postgres-to-postgres(mart)
         if self.db_query_from == 'postgres':
             source = PostgresHook(self.postgres_conn, log_sql=False)
-            conn = source.get_conn()
-            cursor = conn.cursor()
         else:
+            from airflow.providers.mysql.hooks.mysql import MySqlHook
+
             source = MySqlHook(self.mysql_conn)
-            conn = source.get_conn()
-            cursor = conn.cursor()
-            # cursor.execute('')
 
-        self.log.info(self.query)
-        # Execute query
-        cursor.execute(self.query)
+        query, parameters = self.query, None
+        watermark_store = None
+        if self.incremental_query and self.watermark_tables:
+            watermark_store = WatermarkStore(
+                target, f"{self.dag_id}.{self.task_id}", self.watermark_table, log=self.log
+            )
+            stored = watermark_store.load()
+            # Watermark baru dibaca sebelum load, perubahan selama load diproses di run berikutnya
+            watermarks = self.read_watermarks(source)
+            parameters = self.plan_incremental(stored)
+            if parameters is None:
+                self.log.info("Running a full refresh.")
+            else:
+                query = self.incremental_query
+                self.log.info(f"Running incrementally from watermarks {parameters}.")
+            # Tabel kosong tetap memakai watermark sebelumnya
+            watermarks = {
+                table: watermark if watermark is not None else stored.get(table, (None,))[0]
+                for table, watermark in watermarks.items()
+            }
 
-        # Estimate row count
-        self.row_count = cursor.rowcount
+        # Full refresh tabel partisi: partisi baru dimuat lalu ditukar, tanpa upsert per baris
+        swap = self.partition_swap and parameters is None
 
-        # Find column name based on query result
-        target_fields = [x[0] for x in cursor.description]
+        # Source dan target di database yang sama: query dijalankan langsung di server
+        if self.pushdown and self.is_same_database():
+            if self.replace and self.identifier is None and not swap:
+                raise ValueError("PostgreSQL ON CONFLICT upsert syntax requires an unique index")
+            # Baca dan tulis terjadi dalam satu statement di server, dicatat sebagai fase write
+            with self.run_stats.phase('write'):
+                self.row_count = self.execute_pushdown(target, query, parameters, swap=swap)
+            mode = 'pushdown partition swap' if swap else 'pushdown'
+        else:
+            conn = source.get_conn()
+            cursor = self.get_source_cursor(conn)
 
-        # Store query result to rows
-        rows = cursor.fetchall()
+            try:
+                self.log.info(query)
+                # Execute query
+                with self.run_stats.phase('fetch'):
+                    cursor.execute(query, parameters)
 
-        # Perform inserting data
-        if (rows):
-            target.run(
-                sql=self.generate_query(rows, target_fields)
-            )
-        else:
-            self.log.info("There is no data to insert/update.")
+                # Row count dihitung dari baris yang benar-benar ditulis, bukan cursor.rowcount
+                if swap:
+                    self.row_count = self.write_partition_swap(cursor, target)
+                else:
+                    self.row_count = self.write_rows(cursor, target)
+                if not self.row_count:
+                    self.log.info("There is no data to insert/update.")
+            finally:
+                cursor.close()
+                conn.close()
+            mode = 'streaming partition swap' if swap else 'streaming'
+
+        if watermark_store:
+            watermark_store.save(watermarks, full_refresh=parameters is None)
 
-        cursor.close()
-        conn.close()
+        if mode.startswith('pushdown'):
+            self.run_stats.add(rows_written=self.row_count)
 
-        self.duration = (time.time() * 1000) - dateStart
\ No newline at end of file
+        self.duration = (time.time() * 1000) - dateStart
+        self.log.info(f"Transferred {self.row_count} rows into {self.target_table} in {self.duration:.0f} ms ({mode}).")
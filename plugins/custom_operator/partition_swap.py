@@ -0,0 +1,213 @@
+import re
+
+from plugins.custom_operator.postgres_bulk_writer import _CopyStream
+
+# Definisi index partitioned di parent, misalnya
+# "CREATE UNIQUE INDEX x_pkey ON ONLY demo_music.x USING btree (code, video_id)"
+_PARENT_INDEX_RE = re.compile(r'^CREATE (UNIQUE )?INDEX \S+ ON ONLY \S+ (USING .*)$')
+_CONSTRAINT_SQL = {'p': 'PRIMARY KEY', 'u': 'UNIQUE'}
+
+
+class PartitionSwap:
+    """
+    Full refresh of a partitioned table without row-level upserts.
+
+    Rows are bulk-loaded into fresh, unindexed copies of every partition (same bounds as the live ones).
+    Each copy then gets the parent's indexes and is analyzed. Finally every live partition is detached,
+    dropped and replaced by its copy. The copy gets the old partition and index names, so the table
+    looks exactly as before.
+
+    Until ``swap`` only the copies are touched, so readers of the live table are never blocked by the load.
+    A CHECK constraint equal to the partition constraint lets ATTACH skip its validation scan, which keeps
+    the swap itself a metadata-only change. Like ``PostgresBulkWriter`` it never commits: the load and the
+    swap become visible together when the caller commits, and a rollback leaves the live table untouched.
+
+    ``keep_columns`` (such as ``added_at``) are not loaded but carried over from the live row with the same
+    identifier, new identifiers get the column default.
+
+    An empty load never replaces a non-empty table (an upstream failure that returns no rows would wipe it),
+    unless ``allow_empty`` is set.
+    """
+
+    def __init__(self, conn, target_table, target_fields, identifier=None, keep_columns=None, allow_empty=False,
+                 log=None):
+        self.conn = conn
+        self.target_table = target_table
+        self.target_fields = list(target_fields)
+        self.identifier = list(identifier or [])
+        self.keep_columns = list(keep_columns or [])
+        if self.keep_columns and not self.identifier:
+            raise ValueError("keep_columns requires an identifier to find the live row")
+        self.allow_empty = allow_empty
+        self.log = log
+        self.schema, self.table = target_table.split('.') if '.' in target_table else ('public', target_table)
+        self.shadow_table = f"{self.schema}.{self.table}_swap"
+        self.staging_table = f"_stg_{self.table}_swap"
+        self.partitions = []
+        self.column_defaults = {}
+        self.loaded_count = 0
+        self._staging = False
+
+    def prepare(self) -> None:
+        """Create the shadow parent with an empty copy of every live partition."""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT pg_get_partkeydef(%s::regclass)", (self.target_table,))
+            partition_key = cursor.fetchone()[0]
+            if partition_key is None:
+                raise ValueError(f"{self.target_table} is not a partitioned table")
+            cursor.execute(
+                """
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), pg_get_partition_constraintdef(c.oid)
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+                ORDER BY c.relname
+                """,
+                (self.target_table,),
+            )
+            self.partitions = cursor.fetchall()
+            if not self.partitions:
+                raise ValueError(f"{self.target_table} has no partitions")
+
+            if self.keep_columns:
+                # Default kolom untuk identifier yang belum ada di tabel live
+                cursor.execute(
+                    """
+                    SELECT a.attname, pg_get_expr(d.adbin, d.adrelid)
+                    FROM pg_attribute a
+                    LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+                    WHERE a.attrelid = %s::regclass AND a.attname = ANY(%s)
+                    """,
+                    (self.target_table, self.keep_columns),
+                )
+                self.column_defaults = dict(cursor.fetchall())
+
+            cursor.execute(f"DROP TABLE IF EXISTS {self.shadow_table}")
+            cursor.execute(
+                f"CREATE TABLE {self.shadow_table} (LIKE {self.target_table} INCLUDING DEFAULTS)"
+                f" PARTITION BY {partition_key}"
+            )
+            for name, bound, partition_constraint in self.partitions:
+                cursor.execute(f"DROP TABLE IF EXISTS {self.schema}.{name}_swap")
+                cursor.execute(f"CREATE TABLE {self.schema}.{name}_swap PARTITION OF {self.shadow_table} {bound}")
+        finally:
+            cursor.close()
+
+    def copy(self, rows) -> int:
+        """COPY one batch of rows into the temporary staging table. Returns the number of rows copied."""
+        columns = ', '.join(self.target_fields)
+        stream = _CopyStream(rows)
+        cursor = self.conn.cursor()
+        try:
+            if not self._staging:
+                cursor.execute(
+                    f"CREATE TEMP TABLE {self.staging_table} ON COMMIT DROP AS "
+                    f"SELECT {columns} FROM {self.target_table} WITH NO DATA"
+                )
+                self._staging = True
+            cursor.copy_expert(f"COPY {self.staging_table} ({columns}) FROM STDIN", stream)
+        finally:
+            cursor.close()
+        return stream.row_count
+
+    def load(self, source: str = None, parameters=None) -> int:
+        """
+        Insert ``source`` (a FROM item aliased ``src``, by default the rows passed to ``copy``) into the shadow
+        partitions.
+
+        Duplicate identifiers are collapsed with ``DISTINCT ON``, as the upsert would, so the unique indexes
+        built afterwards cannot fail. Returns the number of rows loaded.
+        """
+        source = source or f"{self.staging_table} AS src"
+        columns = [f"src.{col}" for col in self.target_fields]
+        if self.keep_columns:
+            for col in self.keep_columns:
+                default = self.column_defaults.get(col)
+                columns.append(f"coalesce(live.{col}, {default})" if default else f"live.{col}")
+            join = ' AND '.join(f"live.{col} = src.{col}" for col in self.identifier)
+            source += f"\nLEFT JOIN {self.target_table} AS live ON {join}"
+
+        sql = f"INSERT INTO {self.shadow_table} ({', '.join(self.target_fields + self.keep_columns)})\n"
+        if self.identifier:
+            key = ', '.join(f"src.{col}" for col in self.identifier)
+            sql += f"SELECT DISTINCT ON ({key}) {', '.join(columns)} FROM {source}\nORDER BY {key}"
+        else:
+            sql += f"SELECT {', '.join(columns)} FROM {source}"
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(sql, parameters)
+            row_count = cursor.rowcount
+            self.loaded_count += row_count
+            if self._staging:
+                cursor.execute(f"DROP TABLE {self.staging_table}")
+                self._staging = False
+        finally:
+            cursor.close()
+        if self.log:
+            self.log.info(f"Loaded {row_count} rows into {len(self.partitions)} new {self.target_table} partitions.")
+        return row_count
+
+    def swap(self) -> None:
+        """Index the new partitions, then replace the live partitions with them."""
+        cursor = self.conn.cursor()
+        try:
+            if not self.loaded_count and not self.allow_empty:
+                cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {self.target_table})")
+                if cursor.fetchone()[0]:
+                    raise ValueError(
+                        f"Refusing to replace the rows of {self.target_table} with an empty load"
+                        " (pass allow_empty to clear it)"
+                    )
+
+            # Index partitioned milik parent, beserta nama index-nya di setiap partisi lama
+            cursor.execute(
+                """
+                SELECT child.relname, pg_get_indexdef(parent_index.indexrelid), con.contype, child_index.relname
+                FROM pg_index parent_index
+                LEFT JOIN pg_constraint con ON con.conindid = parent_index.indexrelid
+                    AND con.conrelid = parent_index.indrelid
+                JOIN pg_inherits inh ON inh.inhparent = parent_index.indexrelid
+                JOIN pg_class child_index ON child_index.oid = inh.inhrelid
+                JOIN pg_index child_index_info ON child_index_info.indexrelid = child_index.oid
+                JOIN pg_class child ON child.oid = child_index_info.indrelid
+                WHERE parent_index.indrelid = %s::regclass
+                """,
+                (self.target_table,),
+            )
+            indexes = cursor.fetchall()
+
+            # Setelah load, partisi baru dilepas dari shadow parent dan diberi index. Tabel live belum disentuh
+            for name, bound, partition_constraint in self.partitions:
+                cursor.execute(f"ALTER TABLE {self.shadow_table} DETACH PARTITION {self.schema}.{name}_swap")
+            cursor.execute(f"DROP TABLE {self.shadow_table}")
+            for partition, index_def, constraint_type, index_name in indexes:
+                unique, using = _PARENT_INDEX_RE.match(index_def).groups()
+                cursor.execute(
+                    f"CREATE {unique or ''}INDEX {index_name}_swap ON {self.schema}.{partition}_swap {using}"
+                )
+                if constraint_type in _CONSTRAINT_SQL:
+                    cursor.execute(
+                        f"ALTER TABLE {self.schema}.{partition}_swap"
+                        f" ADD {_CONSTRAINT_SQL[constraint_type]} USING INDEX {index_name}_swap"
+                    )
+            for name, bound, partition_constraint in self.partitions:
+                cursor.execute(
+                    f"ALTER TABLE {self.schema}.{name}_swap"
+                    f" ADD CONSTRAINT {name}_swap_bound CHECK ({partition_constraint})"
+                )
+                cursor.execute(f"ANALYZE {self.schema}.{name}_swap")
+
+            # Swap: hanya perubahan metadata, lock parent dipegang sampai commit
+            for name, bound, partition_constraint in self.partitions:
+                cursor.execute(f"ALTER TABLE {self.target_table} DETACH PARTITION {self.schema}.{name}")
+                cursor.execute(f"DROP TABLE {self.schema}.{name}")
+                cursor.execute(f"ALTER TABLE {self.schema}.{name}_swap RENAME TO {name}")
+                cursor.execute(f"ALTER TABLE {self.target_table} ATTACH PARTITION {self.schema}.{name} {bound}")
+                cursor.execute(f"ALTER TABLE {self.schema}.{name} DROP CONSTRAINT {name}_swap_bound")
+            for partition, index_def, constraint_type, index_name in indexes:
+                cursor.execute(f"ALTER INDEX {self.schema}.{index_name}_swap RENAME TO {index_name}")
+        finally:
+            cursor.close()
+        if self.log:
+            self.log.info(f"Swapped {len(self.partitions)} partitions of {self.target_table}.")
@@ -0,0 +1,201 @@
+from datetime import date, datetime, time as dt_time
+import sys
+
+
+def _is_pandas_na(cell) -> bool:
+    # pd.NA (kolom nullable Int64/string/boolean) hanya ada jika pandas sudah di-import, modul ini sendiri
+    # tidak meng-import pandas supaya DAG tetap cepat di-parse
+    pandas = sys.modules.get('pandas')
+    return pandas is not None and cell is pandas.NA
+
+
+def _copy_text(cell) -> str:
+    """Serialize one cell into PostgreSQL COPY text format."""
+    if cell is None or (cell != cell) is True or _is_pandas_na(cell):  # None, NaN, NaT dan pd.NA menjadi NULL
+        return "\\N"
+    if isinstance(cell, (bytes, bytearray, memoryview)):
+        return "\\\\x" + bytes(cell).hex()
+    if isinstance(cell, (datetime, date, dt_time)):
+        return cell.isoformat()
+    text = str(cell).replace('\0', '')  # PostgreSQL tidak menerima NUL di kolom text
+    return (
+        text.replace('\\', '\\\\')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+        .replace('\t', '\\t')
+    )
+
+
+class _CopyStream:
+    """File-like object that feeds rows to ``copy_expert`` without building the whole payload."""
+
+    def __init__(self, rows):
+        self.row_count = 0
+        self._lines = self._iter_lines(rows)
+        self._buffer = ''
+
+    def _iter_lines(self, rows):
+        for row in rows:
+            self.row_count += 1
+            yield '\t'.join(_copy_text(cell) for cell in row) + '\n'
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def _as_list(columns):
+    if columns is None:
+        return []
+    if isinstance(columns, str):
+        return [columns]
+    return list(columns)
+
+
+def build_merge_sql(target_table, target_fields, source, identifier=None, replace=True, update_fields=None,
+                    tiebreaker=None, compare_fields=None, updated_at_column=None) -> str:
+    """
+    Build a single ``INSERT ... SELECT ... ON CONFLICT`` statement that merges ``source`` into the target.
+
+    ``source`` is any FROM item, e.g. a table name or ``(SELECT ...) AS src``. When ``identifier`` is given,
+    duplicate keys in the source are collapsed with ``DISTINCT ON`` (first row by ``tiebreaker`` wins)
+    so the statement never touches the same target row twice.
+
+    With ``compare_fields``, an existing row is only updated when one of those columns actually changed,
+    so columns such as ``updated_at`` keep pointing at the last real change.
+
+    ``updated_at_column`` is not read from ``source`` but set to the database's ``LOCALTIMESTAMP`` on insert
+    and on every update, so it never depends on the clock of the worker that produced the rows.
+    """
+    identifier = _as_list(identifier)
+    columns = ', '.join(target_fields)
+    select_columns = columns
+    if updated_at_column:
+        columns += f", {updated_at_column}"
+        select_columns += ", LOCALTIMESTAMP"
+
+    if identifier:
+        conflict_target = ', '.join(identifier)
+        select_sql = f"SELECT DISTINCT ON ({conflict_target}) {select_columns} FROM {source}"
+        select_sql += f" ORDER BY {', '.join(identifier + _as_list(tiebreaker))}"
+    else:
+        select_sql = f"SELECT {select_columns} FROM {source}"
+
+    compare_fields = _as_list(compare_fields)
+    target_alias = f"{target_table} AS tgt" if compare_fields else target_table
+    sql = f"INSERT INTO {target_alias} ({columns})\n{select_sql}"
+    if not identifier:
+        return sql
+
+    if update_fields is None:
+        update_fields = [col for col in target_fields if col not in identifier]
+    update_fields = [col for col in update_fields if col not in identifier]
+    if updated_at_column and update_fields and updated_at_column not in update_fields:
+        update_fields.append(updated_at_column)
+
+    if replace and update_fields:
+        update_set = ', '.join(f"{col} = EXCLUDED.{col}" for col in update_fields)
+        sql += f"\nON CONFLICT ({conflict_target}) DO UPDATE SET {update_set}"
+        if compare_fields:
+            current = ', '.join(f"tgt.{col}" for col in compare_fields)
+            incoming = ', '.join(f"EXCLUDED.{col}" for col in compare_fields)
+            sql += f"\nWHERE ({current}) IS DISTINCT FROM ({incoming})"
+    else:
+        sql += f"\nON CONFLICT ({conflict_target}) DO NOTHING"
+    return sql
+
+
+class PostgresBulkWriter:
+    """
+    Upsert rows into a PostgreSQL table by streaming them with COPY into a temporary staging
+    table and merging the staging table with one ``INSERT ... ON CONFLICT`` statement.
+
+    The writer never commits; every ``write`` runs inside the caller's transaction.
+    """
+
+    def __init__(self, conn, target_table, target_fields, identifier=None, replace=True, update_fields=None,
+                 compare_fields=None, updated_at_column=None, log=None):
+        if replace and identifier and not target_fields:
+            raise ValueError("PostgreSQL ON CONFLICT upsert syntax requires column names")
+        self.conn = conn
+        self.target_table = target_table
+        self.target_fields = list(target_fields)
+        self.identifier = _as_list(identifier)
+        self.replace = replace
+        self.update_fields = update_fields
+        self.compare_fields = compare_fields
+        self.updated_at_column = updated_at_column
+        self.log = log
+        self.staging_table = "_stg_" + target_table.split('.')[-1]
+        # Total baris yang di-COPY dan yang benar-benar di-insert/update oleh merge, untuk metrik run
+        self.copied_count = 0
+        self.merged_count = 0
+
+    def write(self, rows) -> int:
+        """COPY ``rows`` into staging and merge them into the target. Returns the number of rows copied."""
+        columns = ', '.join(self.target_fields)
+        stream = _CopyStream(rows)
+
+        # Urutan ctid mengikuti urutan COPY, jadi DISTINCT ON mempertahankan baris pertama per identifier
+        merge_sql = build_merge_sql(
+            self.target_table, self.target_fields, self.staging_table,
+            identifier=self.identifier, replace=self.replace, update_fields=self.update_fields,
+            tiebreaker='ctid', compare_fields=self.compare_fields, updated_at_column=self.updated_at_column,
+        )
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                f"CREATE TEMP TABLE {self.staging_table} ON COMMIT DROP AS "
+                f"SELECT {columns} FROM {self.target_table} WITH NO DATA"
+            )
+            cursor.copy_expert(f"COPY {self.staging_table} ({columns}) FROM STDIN", stream)
+            cursor.execute(merge_sql)
+            merged = cursor.rowcount
+            cursor.execute(f"DROP TABLE {self.staging_table}")
+        finally:
+            cursor.close()
+
+        self.copied_count += stream.row_count
+        self.merged_count += merged
+
+        if self.log:
+            self.log.info(f"Copied {stream.row_count} rows, merged {merged} rows into {self.target_table}.")
+        return stream.row_count
+
+
+def bulk_upsert(postgres_hook, target_table, target_fields, rows, identifier=None, replace=True,
+                update_fields=None, compare_fields=None, updated_at_column=None, log=None, run_stats=None) -> int:
+    """
+    Run one ``PostgresBulkWriter.write`` in its own transaction on a fresh connection.
+
+    With ``run_stats``, merged rows are counted as written and copied rows the merge left alone
+    (duplicates, unchanged content) as skipped.
+    """
+    conn = postgres_hook.get_conn()
+    try:
+        writer = PostgresBulkWriter(
+            conn, target_table, target_fields,
+            identifier=identifier, replace=replace, update_fields=update_fields,
+            compare_fields=compare_fields, updated_at_column=updated_at_column, log=log,
+        )
+        row_count = writer.write(rows)
+        conn.commit()
+        if run_stats is not None:
+            run_stats.add(rows_written=writer.merged_count, rows_skipped=writer.copied_count - writer.merged_count)
+        return row_count
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
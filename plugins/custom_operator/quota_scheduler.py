@@ -0,0 +1,95 @@
+from datetime import datetime
+from pytz import timezone
+
+
+class QuotaBudgetScheduler:
+    """
+    Membagi kuota harian API ke beberapa run.
+
+    Pemakaian unit per run dicatat di ``usage_table``. Urutan lagu yang di-crawl (belum pernah di-crawl dulu,
+    lalu yang paling lama) diatur oleh ``CrawlState``.
+    """
+
+    def __init__(
+            self,
+            postgres_hook,
+            source: str,
+            daily_budget_units: int,
+            usage_table: str = 'demo_music.api_quota_usage',
+            quota_timezone: str = 'America/Los_Angeles',  # Kuota YouTube reset tengah malam waktu Pasifik
+            log=None,
+    ):
+        self.postgres_hook = postgres_hook
+        self.source = source
+        self.daily_budget_units = daily_budget_units
+        self.usage_table = usage_table
+        self.quota_timezone = quota_timezone
+        self.log = log
+
+    def usage_date(self):
+        return datetime.now(timezone(self.quota_timezone)).date()
+
+    def units_spent_today(self) -> int:
+        record = self.postgres_hook.get_first(
+            f"SELECT coalesce(sum(units_spent), 0) FROM {self.usage_table} WHERE source = %s AND usage_date = %s",
+            parameters=(self.source, self.usage_date()),
+        )
+        return int(record[0])
+
+    def remaining_units(self) -> int:
+        return max(0, self.daily_budget_units - self.units_spent_today())
+
+    def reserve(self, run_id: str, units: int) -> int:
+        """
+        Atomically reserve up to ``units`` from today's budget for ``run_id`` and return the units granted.
+
+        An advisory lock serializes concurrent runs, so two tasks can never grant the same units twice.
+        """
+        usage_date = self.usage_date()
+        conn = self.postgres_hook.get_conn()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{self.usage_table}:{self.source}",))
+            cursor.execute(
+                f"SELECT coalesce(sum(units_spent), 0) FROM {self.usage_table} WHERE source = %s AND usage_date = %s",
+                (self.source, usage_date),
+            )
+            spent = int(cursor.fetchone()[0])
+            granted = max(0, min(units, self.daily_budget_units - spent))
+            cursor.execute(
+                f"""
+                INSERT INTO {self.usage_table} AS usage (source, usage_date, run_id, units_spent, updated_at)
+                VALUES (%s, %s, %s, %s, now())
+                ON CONFLICT (source, usage_date, run_id)
+                DO UPDATE SET units_spent = usage.units_spent + EXCLUDED.units_spent,
+                              updated_at = EXCLUDED.updated_at
+                """,
+                (self.source, usage_date, run_id, granted),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+        self._reserved_date = usage_date
+        if self.log:
+            self.log.info(f"Reserved {granted}/{units} {self.source} quota units ({spent} already spent today).")
+        return granted
+
+    def settle(self, run_id: str, reserved: int, spent: int) -> None:
+        """Return the unused part of a reservation to the daily budget."""
+        unused = reserved - spent
+        if unused > 0:
+            self.postgres_hook.run(
+                f"""
+                UPDATE {self.usage_table}
+                SET units_spent = units_spent - %s, updated_at = now()
+                WHERE source = %s AND usage_date = %s AND run_id = %s
+                """,
+                parameters=(unused, self.source, self._reserved_date, run_id),
+            )
+        if self.log:
+            self.log.info(f"Spent {spent} of {reserved} reserved {self.source} quota units.")
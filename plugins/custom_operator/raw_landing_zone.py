@@ -0,0 +1,119 @@
+from datetime import date, datetime, timezone
+import glob
+import json
+import os
+import re
+import threading
+import uuid
+
+# Kolom file landing zone: satu baris per response API, request dan response disimpan sebagai JSON mentah
+COLUMNS = ('fetched_at', 'endpoint', 'request', 'response')
+
+
+def partition_path(base_path: str, source: str, run_date) -> str:
+    """Directory of one partition, hive style: ``<base_path>/source=<source>/run_date=<YYYY-MM-DD>``."""
+    return os.path.join(base_path, f"source={source}", f"run_date={run_date}")
+
+
+def landing_file_prefix(task, context, shard: dict = None) -> str:
+    """Prefix nama file untuk satu try task instance, aman dipakai sebagai nama file."""
+    ti = context.get('ti')
+    prefix = f"{task.task_id}.{context.get('run_id') or 'adhoc'}"
+    if shard:
+        prefix += f".shard{shard['index']}"
+    prefix += f".try{getattr(ti, 'try_number', 1)}"
+    return re.sub(r'[^\w.-]+', '_', prefix)
+
+
+class RawResponseWriter:
+    """
+    Menyimpan response API mentah ke landing zone Parquet (terkompresi), dipartisi per source dan run date.
+
+    Response ditampung di memori dan ditulis sebagai satu file per ``flush``; file ditulis ke nama sementara
+    lalu di-rename, sehingga pembaca tidak pernah melihat file setengah jadi. Aman dipakai dari banyak thread.
+    """
+
+    def __init__(self, base_path: str, source: str, run_date, file_prefix: str,
+                 compression: str = 'zstd', flush_rows: int = 2000, log=None):
+        self.directory = partition_path(base_path, source, run_date)
+        self.file_prefix = file_prefix
+        self.compression = compression
+        self.flush_rows = flush_rows  # Flush otomatis setelah sekian response, membatasi memori
+        self.log = log
+        self.files = []
+        self._rows = []
+        self._part = 0
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, request: dict, response) -> None:
+        row = (datetime.now(timezone.utc), endpoint, json.dumps(request), json.dumps(response))
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.flush_rows
+        if full:
+            self.flush()
+
+    def flush(self) -> str:
+        """Write the buffered responses as one Parquet file. Returns its path, or None if nothing was buffered."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        with self._lock:
+            rows, self._rows = self._rows, []
+            if not rows:
+                return None
+            self._part += 1
+            path = os.path.join(self.directory, f"{self.file_prefix}-{self._part:05d}.parquet")
+
+        table = pa.Table.from_arrays(
+            [pa.array(column) for column in zip(*rows)],
+            schema=pa.schema([
+                ('fetched_at', pa.timestamp('us', tz='UTC')),
+                ('endpoint', pa.string()),
+                ('request', pa.string()),
+                ('response', pa.string()),
+            ]),
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        pq.write_table(table, temp_path, compression=self.compression)
+        os.replace(temp_path, path)
+        self.files.append(path)
+        if self.log:
+            self.log.info(f"Landed {len(rows)} raw responses in {path}.")
+        return path
+
+
+def landed_files(base_path: str, source: str, date_from=None, date_to=None) -> list:
+    """Parquet files of ``source`` with a run date between ``date_from`` and ``date_to`` (inclusive), oldest first."""
+    date_from = str(date_from) if date_from else str(date.min)
+    date_to = str(date_to) if date_to else str(date.max)
+    files = []
+    for directory in glob.glob(partition_path(base_path, source, '*')):
+        run_date = os.path.basename(directory).split('=', 1)[1]
+        if date_from <= run_date <= date_to:
+            files.extend(glob.glob(os.path.join(directory, '*.parquet')))
+    # Urut run date lalu waktu response pertama, sehingga response terbaru di-replay paling akhir
+    return sorted(files, key=lambda path: (os.path.basename(os.path.dirname(path)), first_fetched_at(path), path))
+
+
+def first_fetched_at(path: str):
+    """Earliest ``fetched_at`` of a file, from the Parquet footer statistics only."""
+    import pyarrow.parquet as pq
+
+    metadata = pq.ParquetFile(path, memory_map=True).metadata
+    column = COLUMNS.index('fetched_at')
+    return min(metadata.row_group(index).column(column).statistics.min for index in range(metadata.num_row_groups))
+
+
+def read_landed_responses(path: str, batch_size: int = 1000):
+    """Yield ``(endpoint, request, response)`` per record batch of one file, read through a memory map."""
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=['endpoint', 'request', 'response']):
+        columns = batch.to_pydict()
+        yield [
+            (endpoint, json.loads(request), json.loads(response))
+            for endpoint, request, response in zip(columns['endpoint'], columns['request'], columns['response'])
+        ]
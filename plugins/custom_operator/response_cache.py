@@ -0,0 +1,159 @@
+from datetime import timedelta
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Eviksi dijalankan setiap sekian response baru disimpan, dan sekali lagi saat cache ditutup
+EVICT_EVERY = 500
+
+
+class _Flight:
+    """Satu pemanggilan API yang sedang berjalan, ditunggu oleh thread lain dengan key yang sama."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    Cache response API di file SQLite lokal, dengan key ``(source, endpoint, key)``.
+
+    - TTL per source: response yang lebih tua dari ``ttl`` dianggap miss dan diambil ulang.
+    - LRU: setiap hit memperbarui ``last_used_at``; jika jumlah entry (semua source) melebihi ``max_entries``,
+      entry yang paling lama tidak dipakai dihapus.
+    - Single-flight: query yang sama dari beberapa thread sekaligus hanya memanggil API sekali,
+      thread lain menunggu dan memakai hasilnya.
+
+    Response disimpan sebagai JSON terkompresi. File bisa dipakai bersama oleh beberapa task di worker yang sama.
+    """
+
+    def __init__(self, path: str, source: str, ttl: timedelta, max_entries: int = 200_000, log=None):
+        self.path = path
+        self.source = source
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.log = log
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # Query yang menunggu pemanggilan API yang sama dari thread lain
+        self.evicted = 0
+
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._stored = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        # WAL supaya task lain di worker yang sama tetap bisa membaca saat ada yang menulis
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS api_response_cache (
+                source TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                cache_key TEXT NOT NULL,
+                response BLOB NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY (source, endpoint, cache_key)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS api_response_cache_last_used_idx ON api_response_cache (last_used_at)"
+        )
+
+    def get_or_fetch(self, endpoint: str, key: str, fetch):
+        """Return the cached response for ``key``, or call ``fetch()`` once and cache its result."""
+        with self._lock:
+            cached = self._lookup(endpoint, key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            flight = self._in_flight.get((endpoint, key))
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[(endpoint, key)] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fetch()
+            with self._lock:
+                self.misses += 1
+                self._store(endpoint, key, flight.result)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[(endpoint, key)]
+            flight.done.set()
+
+    def _lookup(self, endpoint, key):
+        row = self._conn.execute(
+            """
+            SELECT response FROM api_response_cache
+            WHERE source = ? AND endpoint = ? AND cache_key = ? AND fetched_at >= ?
+            """,
+            (self.source, endpoint, key, time.time() - self.ttl.total_seconds()),
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute(
+            "UPDATE api_response_cache SET last_used_at = ? WHERE source = ? AND endpoint = ? AND cache_key = ?",
+            (time.time(), self.source, endpoint, key),
+        )
+        return json.loads(zlib.decompress(row[0]))
+
+    def _store(self, endpoint, key, response):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO api_response_cache VALUES (?, ?, ?, ?, ?, ?)",
+            (self.source, endpoint, key, zlib.compress(json.dumps(response).encode('utf-8')), now, now),
+        )
+        self._stored += 1
+        if self._stored % EVICT_EVERY == 0:
+            self._evict()
+
+    def _evict(self):
+        """Delete the expired entries of this source, then the least recently used ones above max_entries."""
+        expired = self._conn.execute(
+            "DELETE FROM api_response_cache WHERE source = ? AND fetched_at < ?",
+            (self.source, time.time() - self.ttl.total_seconds()),
+        ).rowcount
+        over_limit = self._conn.execute(
+            """
+            DELETE FROM api_response_cache WHERE rowid IN (
+                SELECT rowid FROM api_response_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        ).rowcount
+        self.evicted += expired + over_limit
+
+    def log_summary(self, log) -> None:
+        lookups = self.hits + self.coalesced + self.misses
+        log.info(
+            f"Response cache ({self.source}): {self.hits} hits, {self.coalesced} coalesced, {self.misses} misses"
+            f" ({(self.hits + self.coalesced) / lookups if lookups else 0:.0%} served without an API call),"
+            f" {self.evicted} evicted."
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._evict()
+            self._conn.close()
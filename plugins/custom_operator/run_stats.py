@@ -0,0 +1,169 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import functools
+import json
+import threading
+import time
+
+from plugins.custom_operator.postgres_bulk_writer import bulk_upsert
+
+PHASES = ('fetch', 'transform', 'write')
+COUNTERS = ('rows_read', 'rows_written', 'rows_skipped', 'quota_units', 'cache_hits', 'cache_misses')
+
+
+class RunStats:
+    """
+    Metrik satu run operator: jumlah baris, panggilan API per endpoint, kuota, retry/throttle
+    dan durasi per fase (fetch, transform, write).
+
+    Dikirim ke StatsD lewat ``airflow.stats.Stats`` (sesuai konfigurasi [metrics] Airflow) dan, jika
+    ``run_stats_table`` diisi, disimpan satu baris per try di tabel tersebut. Aman dipakai dari banyak thread;
+    durasi fase yang berjalan bersamaan (StreamingPipeline) dijumlahkan per thread.
+    """
+
+    def __init__(self, operator_name: str = None):
+        self.operator_name = operator_name
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.phase_seconds = dict.fromkeys(PHASES, 0.0)
+        self.api_calls = {}  # endpoint -> request
+        self.api_retries = 0
+        self.api_throttled = 0
+        self.throttle_seconds = 0.0
+        self.started_at = datetime.now()
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                self.counters[name] += value or 0
+
+    def add_seconds(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phase_seconds[name] += seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        """Add the wall time of the ``with`` block to phase ``name``."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_seconds(name, time.monotonic() - started)
+
+    def timed(self, iterable, name: str):
+        """Yield from ``iterable``, adding the time spent producing each item to phase ``name``."""
+        iterator = iter(iterable)
+        while True:
+            started = time.monotonic()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add_seconds(name, time.monotonic() - started)
+            yield item
+
+    def add_http(self, call_stats) -> None:
+        """Add the counters of an ``http_transport.HttpCallStats``."""
+        if call_stats is None:
+            return
+        for endpoint, counters in call_stats.endpoints.items():
+            self.api_calls[endpoint] = self.api_calls.get(endpoint, 0) + counters['requests']
+            self.api_retries += counters['retries']
+            self.api_throttled += counters['throttled']
+            self.throttle_seconds += counters['wait_seconds']
+
+    def as_row(self, context, status: str) -> dict:
+        task_instance = context.get('ti') or context.get('task_instance')
+        task = context.get('task')
+        total_seconds = time.monotonic() - self._started
+        return {
+            'dag_id': getattr(task, 'dag_id', None) or 'adhoc',
+            'task_id': getattr(task, 'task_id', None) or self.operator_name,
+            'run_id': context.get('run_id') or 'adhoc',
+            'map_index': getattr(task_instance, 'map_index', -1),
+            'try_number': getattr(task_instance, 'try_number', 1),
+            'operator': self.operator_name,
+            'status': status,
+            'started_at': self.started_at,
+            'finished_at': self.started_at + timedelta(seconds=total_seconds),
+            **self.counters,
+            'api_calls': sum(self.api_calls.values()),
+            'api_calls_by_endpoint': json.dumps(self.api_calls, sort_keys=True),
+            'api_retries': self.api_retries,
+            'api_throttled': self.api_throttled,
+            'throttle_seconds': round(self.throttle_seconds, 3),
+            **{f'{phase}_seconds': round(seconds, 3) for phase, seconds in self.phase_seconds.items()},
+            'total_seconds': round(total_seconds, 3),
+        }
+
+    def send_statsd(self, row: dict) -> None:
+        from airflow.stats import Stats
+
+        prefix = f"custom_operator.{row['dag_id']}.{row['task_id']}"
+        tags = {'dag_id': row['dag_id'], 'task_id': row['task_id'], 'operator': row['operator']}
+        for name in COUNTERS + ('api_calls', 'api_retries', 'api_throttled'):
+            if row[name]:
+                Stats.incr(f"{prefix}.{name}", row[name], tags=tags)
+        for name in [f'{phase}_seconds' for phase in PHASES] + ['throttle_seconds', 'total_seconds']:
+            Stats.timing(f"{prefix}.{name.replace('_seconds', '_duration')}", timedelta(seconds=row[name]), tags=tags)
+
+    def emit(self, context, status: str, postgres_hook=None, table: str = None, log=None) -> dict:
+        """Send the metrics to StatsD and store them in ``table``. Never fails the task."""
+        row = self.as_row(context, status)
+        if log:
+            log.info(
+                f"Run stats: {row['rows_read']} read, {row['rows_written']} written, {row['rows_skipped']} skipped, "
+                f"{row['api_calls']} API calls ({row['api_retries']} retries, {row['throttle_seconds']}s throttled), "
+                f"{row['quota_units']} quota units, {row['cache_hits']} cache hits, fetch {row['fetch_seconds']}s, "
+                f"transform {row['transform_seconds']}s, write {row['write_seconds']}s, total {row['total_seconds']}s."
+            )
+        try:
+            self.send_statsd(row)
+            if postgres_hook and table:
+                bulk_upsert(
+                    postgres_hook,
+                    table,
+                    list(row),
+                    [tuple(row.values())],
+                    identifier=['dag_id', 'task_id', 'run_id', 'map_index', 'try_number'],
+                )
+        except Exception as e:
+            if log:
+                log.warning(f"Could not record run stats: {e}")
+        return row
+
+
+def record_run_stats(*conn_id_attrs: str):
+    """
+    Decorator untuk ``execute``: ``self.run_stats`` dibuat baru setiap run lalu dikirim saat run selesai,
+    termasuk saat gagal. Counter HTTP diambil dari ``self._http_session`` jika operator memilikinya.
+    Tabel diambil dari ``self.run_stats_table``, koneksinya dari atribut pertama di ``conn_id_attrs`` yang terisi.
+    """
+    def decorator(execute):
+        @functools.wraps(execute)
+        def wrapper(self, context):
+            from airflow.providers.postgres.hooks.postgres import PostgresHook
+
+            self.run_stats = RunStats(type(self).__name__)
+            status = 'failed'
+            try:
+                result = execute(self, context)
+                status = 'success'
+                return result
+            finally:
+                session = getattr(self, '_http_session', None)
+                if session is not None:
+                    self.run_stats.add_http(session.call_stats)
+                table = getattr(self, 'run_stats_table', None)
+                conn_id = next((getattr(self, attr) for attr in conn_id_attrs if getattr(self, attr, None)), None)
+                self.run_stats.emit(
+                    context,
+                    status,
+                    postgres_hook=PostgresHook(conn_id) if table and conn_id else None,
+                    table=table,
+                    log=self.log,
+                )
+        return wrapper
+    return decorator
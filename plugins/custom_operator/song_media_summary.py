@@ -0,0 +1,149 @@
+from airflow.models import BaseOperator
+from airflow.providers.postgres.hooks.postgres import PostgresHook
+from datetime import datetime, timedelta
+import time
+
+from plugins.custom_operator.run_stats import record_run_stats
+from plugins.custom_operator.watermark_store import WatermarkStore
+
+from typing import Optional
+
+
+def build_summary_sql(warehouse_table: str, summary_table: str, incremental: bool) -> str:
+    """
+    Upsert the per-code video and ISRC sets of ``warehouse_table`` into ``summary_table``.
+
+    The full version aggregates every code and replaces the stored sets. The incremental version only reads
+    warehouse rows newer than ``%(watermark)s`` and merges their sets into the stored ones (set union), so
+    a code touched by one new row never regroups its whole cross product. Rows whose sets and names did not
+    change are left alone.
+    """
+    def merged(column):
+        if not incremental:
+            return f"EXCLUDED.{column}"
+        return f"ARRAY(SELECT DISTINCT value FROM unnest(summary.{column} || EXCLUDED.{column}) AS value ORDER BY 1)"
+
+    return f"""
+        INSERT INTO {summary_table} AS summary (code, original_artist, song_title, video_ids, isrcs, updated_at)
+        SELECT
+            code,
+            min(original_artist),
+            min(song_title),
+            coalesce(array_agg(DISTINCT video_id ORDER BY video_id) FILTER (WHERE video_id <> ''), '{{}}'),
+            coalesce(array_agg(DISTINCT isrc ORDER BY isrc) FILTER (WHERE isrc <> ''), '{{}}'),
+            now()
+        FROM {warehouse_table}
+        {'WHERE updated_at > %(watermark)s' if incremental else ''}
+        GROUP BY code
+        ON CONFLICT (code) DO UPDATE SET
+            original_artist = EXCLUDED.original_artist,
+            song_title = EXCLUDED.song_title,
+            video_ids = {merged('video_ids')},
+            isrcs = {merged('isrcs')},
+            updated_at = EXCLUDED.updated_at
+        WHERE (summary.original_artist, summary.song_title, summary.video_ids, summary.isrcs)
+            IS DISTINCT FROM (EXCLUDED.original_artist, EXCLUDED.song_title, {merged('video_ids')}, {merged('isrcs')})
+    """
+
+
+class SongMediaSummaryOperator(BaseOperator):
+    """
+    Mart ``song_media_summary`` per code: set video YouTube dan ISRC unik dari media_warehouse_raw,
+    beserta jumlahnya (kolom generated), supaya dashboard tidak perlu group by atas cross product warehouse.
+
+    Run incremental hanya memproses code yang disentuh load warehouse terakhir (baris dengan updated_at
+    melewati watermark). Rebuild penuh dijalankan di run pertama, setiap ``full_refresh_interval``, dan saat
+    seluruh warehouse baru dimuat ulang (partition swap), sehingga code yang hilang dari warehouse ikut dihapus.
+    """
+
+    def __init__(
+            self,
+            *,
+            postgres_conn_id: str,
+            warehouse_table: str = 'demo_music.media_warehouse_raw',
+            summary_table: str = 'demo_music.song_media_summary',
+            watermark_table: str = 'demo_music.etl_watermarks',
+            full_refresh_interval: Optional[timedelta] = None,
+            run_stats_table: str = None,  # Tabel metrik per run (pipeline_run_stats)
+            **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.postgres_conn_id = postgres_conn_id
+        self.warehouse_table = warehouse_table
+        self.summary_table = summary_table
+        self.watermark_table = watermark_table
+        self.full_refresh_interval = full_refresh_interval
+        self.run_stats_table = run_stats_table
+
+    def plan_incremental(self, stored: Optional[tuple], oldest_row) -> Optional[datetime]:
+        """
+        Watermark to run incrementally from, or None when a full rebuild is due: first run,
+        ``full_refresh_interval`` elapsed, or no warehouse row older than the watermark (the warehouse was
+        reloaded as a whole, rows may have disappeared).
+        """
+        if stored is None or stored[0] is None:
+            return None
+        watermark, last_full_refresh = stored
+        if self.full_refresh_interval and (
+            last_full_refresh is None or datetime.now() - last_full_refresh >= self.full_refresh_interval
+        ):
+            return None
+        if oldest_row is not None and oldest_row > watermark:
+            return None
+        return watermark
+
+    @record_run_stats('postgres_conn_id')
+    def execute(self, context):
+        start_time = time.time()
+        postgres_hook = PostgresHook(self.postgres_conn_id, log_sql=False)
+        watermark_store = WatermarkStore(
+            postgres_hook, f"{self.dag_id}.{self.task_id}", self.watermark_table, log=self.log
+        )
+        stored = watermark_store.load().get(self.warehouse_table)
+        # Dibaca sebelum merge, baris yang masuk selama merge diproses di run berikutnya
+        oldest_row, newest_row = postgres_hook.get_first(
+            f"SELECT min(updated_at), max(updated_at) FROM {self.warehouse_table}"
+        )
+        watermark = self.plan_incremental(stored, oldest_row)
+        if watermark is None:
+            self.log.info("Rebuilding the whole summary.")
+        else:
+            self.log.info(f"Merging warehouse rows updated after {watermark}.")
+
+        conn = postgres_hook.get_conn()
+        cursor = conn.cursor()
+        try:
+            with self.run_stats.phase('write'):
+                cursor.execute(
+                    build_summary_sql(self.warehouse_table, self.summary_table, incremental=watermark is not None),
+                    {'watermark': watermark},
+                )
+                row_count = cursor.rowcount
+                deleted = 0
+                if watermark is None:
+                    # Code yang sudah tidak punya baris di warehouse
+                    cursor.execute(
+                        f"""
+                        DELETE FROM {self.summary_table} summary
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM {self.warehouse_table} warehouse WHERE warehouse.code = summary.code
+                        )
+                        """
+                    )
+                    deleted = cursor.rowcount
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        self.run_stats.add(rows_written=row_count + deleted)
+
+        # Warehouse kosong tetap memakai watermark sebelumnya
+        new_watermark = newest_row if newest_row is not None else (stored or (None,))[0]
+        watermark_store.save({self.warehouse_table: new_watermark}, full_refresh=watermark is None)
+        self.log.info(
+            f"Updated {row_count} and deleted {deleted} songs in {self.summary_table}"
+            f" in {time.time() - start_time:.2f} seconds."
+        )
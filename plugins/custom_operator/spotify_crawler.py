@@ -1,143 +1,566 @@
-import pandas as pd
-from airflow.hooks.postgres_hook import PostgresHook
+from airflow.providers.postgres.hooks.postgres import PostgresHook
 from airflow.models import BaseOperator
-from spotipy.oauth2 import SpotifyClientCredentials
-import spotipy
-import re  # Untuk pembersihan regex
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import math
+
+from plugins.custom_operator.code_shard_planner import apply_code_shard
+from plugins.custom_operator.crawl_checkpoint import CrawlCheckpoint, TimeBudget, crawl_checkpoint_key
+from plugins.custom_operator.crawl_state import CrawlState, batch_result_counts
+from plugins.custom_operator.postgres_bulk_writer import bulk_upsert
+from plugins.custom_operator.raw_landing_zone import (
+    RawResponseWriter,
+    landed_files,
+    landing_file_prefix,
+    read_landed_responses,
+)
+from plugins.custom_operator.response_cache import ResponseCache
+from plugins.custom_operator.run_stats import record_run_stats
+from plugins.custom_operator.streaming_pipeline import StreamingPipeline
+from plugins.custom_operator.text_normalization import (
+    clean_input,
+    clean_input_column,
+    match_key,
+    match_key_column,
+    release_date_column,
+)
+
 
 class SpotifyMetadataExtractorOperator(BaseOperator):
-    def __init__(self, postgres_conn_id, source_query, target_table, client_id, client_secret, **kwargs):
+    template_fields = ('replay_from', 'replay_to')
+
+    # Spotify search mengembalikan maksimal 50 item per halaman dan tidak bisa melewati offset 1000
+    SEARCH_PAGE_SIZE = 50
+    SEARCH_MAX_RESULTS = 1000
+    # Endpoint tracks menerima maksimal 50 id per request
+    TRACKS_BATCH_SIZE = 50
+    # Hasil search di response cache dipakai ulang selama ini
+    RESPONSE_CACHE_TTL = timedelta(days=7)
+
+    def __init__(
+            self,
+            postgres_conn_id,
+            source_query,
+            target_table,
+            client_id,
+            client_secret,
+            max_workers: int = 8,  # Jumlah pencarian Spotify yang berjalan bersamaan
+            token_cache_key: str = 'spotify_client_credentials_token',  # Airflow Variable untuk cache token
+            identifier: list = ('isrc', 'spotify_track_id'),  # Kolom unique constraint untuk upsert
+            shard: dict = None,  # Range code dari CodeShardPlannerOperator, source_query harus memuat kolom code
+            checkpoint_table: str = None,  # Progress per lagu, dilanjutkan retry/run berikutnya; query memuat code
+            checkpoint_every: int = 200,  # Hasil di-upsert dan di-checkpoint per micro-batch sekian lagu
+            queue_size: int = None,  # Maksimal hasil lagu yang menunggu di-transform, default 2 x checkpoint_every
+            # Hanya cari lagu baru, lagu yang judul/artisnya berubah, atau yang crawl terakhirnya > recrawl_after
+            incremental: bool = False,
+            recrawl_after: timedelta = None,  # Dengan incremental, lagu di-crawl ulang setelah durasi ini
+            crawl_state_table: str = 'demo_music.crawl_state',  # Status crawl per lagu, dicatat di setiap run
+            time_budget: timedelta = None,  # Berhenti dengan rapi (progress tersimpan) setelah durasi ini
+            page_workers: int = 4,  # Jumlah halaman hasil search yang diambil bersamaan
+            max_pages: int = None,  # Batas halaman hasil search per lagu, None berarti semua halaman
+            relevance_cutoff: bool = False,  # Berhenti di halaman tanpa track yang artisnya cocok dengan lagu
+            # 'search' mencari lagu dari source_query, 'refresh' memperbarui track yang sudah ada,
+            # 'replay' membangun ulang target_table dari landing zone tanpa memanggil API
+            mode: str = 'search',
+            refresh_limit: int = 5000,  # Jumlah track paling lama tidak di-refresh yang diperbarui per run
+            run_stats_table: str = None,  # Tabel metrik per run (pipeline_run_stats)
+            landing_zone_path: str = None,  # Response API mentah juga disimpan sebagai Parquet di sini
+            replay_from: str = None,  # Run date (YYYY-MM-DD) pertama yang di-replay, None berarti semua
+            replay_to: str = None,  # Run date terakhir yang di-replay
+            response_cache_path: str = None,  # File SQLite cache hasil search, dipakai bersama oleh crawler lain
+            response_cache_ttl: timedelta = None,  # Default RESPONSE_CACHE_TTL
+            response_cache_max_entries: int = 200_000,  # Entry yang paling lama tidak dipakai dihapus di atas batas ini
+            **kwargs
+    ):
         super().__init__(**kwargs)
+        if mode not in ('search', 'refresh', 'replay'):
+            raise ValueError(f"Unknown mode {mode!r}, expected 'search', 'refresh' or 'replay'")
+        if mode == 'replay' and not landing_zone_path:
+            raise ValueError("mode='replay' needs a landing_zone_path")
         self.postgres_conn_id = postgres_conn_id
         self.source_query = source_query
         self.target_table = target_table
         self.client_id = client_id
         self.client_secret = client_secret
+        self.max_workers = max_workers
+        self.token_cache_key = token_cache_key
+        self.identifier = list(identifier)
+        self.shard = shard
+        self.checkpoint_table = checkpoint_table
+        self.checkpoint_every = checkpoint_every
+        self.queue_size = queue_size
+        self.incremental = incremental
+        self.recrawl_after = recrawl_after
+        self.crawl_state_table = crawl_state_table
+        self.time_budget = time_budget
+        self.page_workers = page_workers
+        self.max_pages = max_pages
+        self.relevance_cutoff = relevance_cutoff
+        self.mode = mode
+        self.refresh_limit = refresh_limit
+        self.run_stats_table = run_stats_table
+        self.landing_zone_path = landing_zone_path
+        self.replay_from = replay_from
+        self.replay_to = replay_to
+        self.response_cache_path = response_cache_path
+        self.response_cache_ttl = response_cache_ttl or self.RESPONSE_CACHE_TTL
+        self.response_cache_max_entries = response_cache_max_entries
+
+        # Satu client Spotify per task, dibuat saat pertama kali dipakai
+        self._spotify = None
+        self._http_session = None
+        # Thread pool untuk halaman search lanjutan, dipakai bersama oleh semua lagu selama execute
+        self._page_executor = None
+        # Penulis landing zone untuk run ini, hanya jika landing_zone_path diisi
+        self._landing = None
+        # Response cache search, hanya jika response_cache_path diisi
+        self._cache = None
+
+    def get_spotify_client(self):
+        """Return the task-wide Spotify client, creating it on first use."""
+        if self._spotify is None:
+            # Import di sini supaya parsing DAG tidak ikut memuat spotipy
+            import spotipy
+            from spotipy.cache_handler import MemoryCacheHandler
+            from spotipy.oauth2 import SpotifyClientCredentials
+            from plugins.custom_operator.http_transport import build_http_session
+            from plugins.custom_operator.spotify_token_cache import AirflowVariableCacheHandler
+
+            # Satu session (connection pool, timeout, retry 429/5xx dengan Retry-After) untuk semua thread.
+            # requests_timeout=None supaya timeout default session yang dipakai
+            self._http_session = build_http_session(pool_maxsize=max(1, self.max_workers) + max(1, self.page_workers))
+            # Tanpa token_cache_key token hanya disimpan di memori, bukan file .cache di working directory
+            cache_handler = (
+                AirflowVariableCacheHandler(self.token_cache_key) if self.token_cache_key else MemoryCacheHandler()
+            )
+            auth_manager = SpotifyClientCredentials(
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+                cache_handler=cache_handler,
+                requests_session=self._http_session,
+                requests_timeout=None,
+            )
+            self._spotify = spotipy.Spotify(
+                auth_manager=auth_manager, requests_session=self._http_session, requests_timeout=None
+            )
+            # Token diambil sekali di sini, supaya worker thread tidak meminta token bersamaan
+            auth_manager.get_access_token(as_dict=False)
+        return self._spotify
 
-    import re  # Untuk pembersihan regex
+    def search_page(self, query, page):
+        """Return one page of search results (``items`` and ``total``)."""
+        results = self.get_spotify_client().search(
+            q=query, type="track", limit=self.SEARCH_PAGE_SIZE, offset=page * self.SEARCH_PAGE_SIZE
+        )
+        return results["tracks"]
 
-    def clean_input(self, text):
-        """Clean and standardize input text (e.g., song title and artist name)."""
-        # Hapus karakter-karakter yang tidak diinginkan dengan regex
-        cleaned_text = re.sub(r'[^\w\s]', '', text)  # Menghapus titik, koma, kutip, dll
-        cleaned_text = re.sub(r'[/\\()\-_\t]', '',
-                              cleaned_text)  # Menghapus backslash, garis miring, kurung, tab, dan tanda minus
-        return cleaned_text.strip().lower()  # Menghapus spasi ekstra dan mengubah ke huruf kecil
+    def fetch_pages(self, query, pages):
+        """Fetch ``pages`` concurrently on the shared page pool, in page order."""
+        if self._page_executor is None:
+            return [self.search_page(query, page) for page in pages]
+        return list(self._page_executor.map(lambda page: self.search_page(query, page), pages))
+
+    @staticmethod
+    def track_metadata(track):
+        """Ambil field yang disimpan dari satu objek track Spotify."""
+        return {
+            "track_name": track["name"],
+            "artist_name": ", ".join([artist["name"] for artist in track["artists"]]),
+            "album_name": track["album"]["name"],
+            "release_date": track["album"]["release_date"],  # This is already in the correct format
+            "isrc": track["external_ids"].get("isrc", "N/A"),
+            "spotify_track_id": track["id"],
+        }
+
+    def landed_tracks(self, endpoint, request, response):
+        """
+        Objek track dari satu response mentah endpoint tracks, atau dari semua halaman search satu lagu.
+        Halaman search dipilih ulang dengan max_pages dan relevance_cutoff operator ini.
+        """
+        if endpoint == 'tracks':
+            return [track for track in response["tracks"] if track]
+        artist_key = match_key(request["q"].rsplit(" artist:", 1)[-1])
+        pages = [page["items"] for page in response["pages"]][:self.max_pages or None]
+        kept, _ = self.kept_pages(pages, artist_key)
+        return [track for items in kept for track in items]
+
+    def kept_pages(self, pages, artist_key):
+        """
+        Halaman (urut) yang dipakai: berhenti sebelum halaman kosong, atau setelah halaman tanpa artis lagu
+        jika relevance_cutoff. Returns ``(kept, stopped)``.
+        """
+        kept = []
+        for items in pages:
+            if not items:
+                return kept, True
+            kept.append(items)
+            if self.relevance_cutoff and not self.is_relevant_page(items, artist_key):
+                return kept, True
+        return kept, False
+
+    @staticmethod
+    def is_relevant_page(items, artist_key):
+        """True jika ada track yang artist key-nya termuat di artist key lagu (syarat join media_warehouse_raw)."""
+        for track in items:
+            track_artist_key = match_key(clean_input(", ".join(artist["name"] for artist in track["artists"])))
+            if track_artist_key and track_artist_key in artist_key:
+                return True
+        return False
 
     def get_all_spotify_metadata(self, song_title, artist_name):
         """Fetch metadata from Spotify for a given song title and artist name."""
-        # Set up Spotify client
-        auth_manager = SpotifyClientCredentials(client_id=self.client_id, client_secret=self.client_secret)
-        sp = spotipy.Spotify(auth_manager=auth_manager)
-
         # Clean input
-        song_title = self.clean_input(song_title)
-        artist_name = self.clean_input(artist_name)
+        song_title = clean_input(song_title)
+        artist_name = clean_input(artist_name)
+        artist_key = match_key(artist_name)
 
         # Create search query for track
         query = f"track:{song_title} artist:{artist_name}"
+        request = {'q': query, 'type': 'track', 'limit': self.SEARCH_PAGE_SIZE}
 
-        # Initialize variables for pagination
-        offset = 0
-        limit = 50
-        all_tracks = []
+        if self._cache:
+            # Lagu dengan judul dan artis yang sama setelah dinormalisasi memakai hasil pencarian yang sama
+            response = self._cache.get_or_fetch(
+                f"search?max_pages={self.max_pages}&relevance_cutoff={self.relevance_cutoff}",
+                f"{match_key(song_title)}|{artist_key}",
+                lambda: self.search_all_pages(request, artist_key),
+            )
+        else:
+            response = self.search_all_pages(request, artist_key)
 
-        while True:
-            results = sp.search(q=query, type="track", limit=limit, offset=offset)
-            items = results["tracks"]["items"]
-            if not items:
+        # Collect track metadata
+        return [self.track_metadata(track) for track in self.landed_tracks('search', request, response)]
+
+    def search_all_pages(self, request, artist_key):
+        """Semua halaman search yang diambil untuk satu lagu, sebagai ``{'pages': [...]}``."""
+        query = request['q']
+
+        # Halaman pertama memberi total hasil, sisa halaman diambil bersamaan
+        first_page = self.search_page(query, 0)
+        fetched = [first_page]
+        total = min(first_page.get("total") or 0, self.SEARCH_MAX_RESULTS)
+        page_count = math.ceil(total / self.SEARCH_PAGE_SIZE) if first_page["items"] else 0
+        if self.max_pages:
+            page_count = min(page_count, self.max_pages)
+        if self.relevance_cutoff and not self.is_relevant_page(first_page["items"], artist_key):
+            page_count = 1
+
+        next_page = 1
+        while next_page < page_count:
+            # Dengan relevance cutoff halaman diambil per gelombang, supaya bisa berhenti lebih awal
+            wave_size = max(1, self.page_workers) if self.relevance_cutoff else page_count
+            wave = range(next_page, min(page_count, next_page + wave_size))
+            next_page = wave.stop
+
+            wave_pages = self.fetch_pages(query, wave)
+            fetched.extend(wave_pages)
+            _, stop = self.kept_pages([page["items"] for page in wave_pages], artist_key)
+            if stop:
                 break
 
-            # Collect track metadata
-            for track in items:
-                all_tracks.append({
-                    "track_name": track["name"],
-                    "artist_name": ", ".join([artist["name"] for artist in track["artists"]]),
-                    "album_name": track["album"]["name"],
-                    "release_date": track["album"]["release_date"],  # This is already in the correct format
-                    "isrc": track["external_ids"].get("isrc", "N/A"),
-                    "spotify_track_id": track["id"],
-                })
-
-            # Increment offset for pagination
-            offset += limit
-        self.log.info(f"example tracks: {all_tracks}")
-        return all_tracks
+        # Semua halaman yang diambil disimpan sebagai satu response; halaman yang dipakai dipilih oleh landed_tracks
+        response = {'pages': fetched}
+        if self._landing:
+            self._landing.add('search', request, response)
+        self.log.info(f"Fetched {len(fetched)} of {math.ceil(total / self.SEARCH_PAGE_SIZE)} pages for {query!r}.")
+        return response
+
+    def search_record(self, record):
+        """Search Spotify for a single source record, returning None when it must be skipped."""
+        self.log.info(f"Processing record: {record}")
+        try:
+            song_title = record[0]  # Song title
+            artist_name = record[1]  # Artist name
+        except IndexError:
+            self.log.error(f"Error accessing record: {record}. Skipping this record.")
+            return None
+
+        if not (song_title and artist_name):
+            self.log.info(f"Skipping song with missing title or artist: {record}")
+            return None
+
+        return self.get_all_spotify_metadata(song_title, artist_name)
+
+    def write_tracks(self, postgres_hook, results) -> int:
+        """Bersihkan hasil pencarian satu batch lagu dan upsert ke target_table. Returns the number of tracks."""
+        return self.upsert_tracks(postgres_hook, self.transform_tracks(results))
+
+    def transform_tracks(self, results):
+        import pandas as pd
+
+        with self.run_stats.phase('transform'):
+            return self.clean_tracks(pd, results)
+
+    def upsert_tracks(self, postgres_hook, df) -> int:
+        """Upsert track yang sudah dibersihkan (hasil transform_tracks) ke target_table."""
+        # Response mentah disimpan dulu, supaya semua yang masuk ke tabel juga bisa di-replay
+        if self._landing:
+            self._landing.flush()
+        if df is None:
+            return 0
 
+        # Upsert semua baris sekaligus (COPY ke staging lalu merge), added_at diisi default kolom dan tidak ditimpa.
+        # updated_at diisi jam database dan hanya berubah jika metadata track berubah, dipakai sebagai
+        # watermark load warehouse
+        compare_fields = [
+            'spotify_track_raw_id', 'track_name', 'artist_name', 'album_name', 'release_date',
+            'match_artist', 'match_title',
+        ]
+        with self.run_stats.phase('write'):
+            return bulk_upsert(
+                postgres_hook,
+                self.target_table,
+                df.columns.tolist(),
+                df.itertuples(index=False, name=None),
+                identifier=self.identifier,
+                update_fields=compare_fields,
+                compare_fields=compare_fields,
+                updated_at_column='updated_at',
+                log=self.log,
+                run_stats=self.run_stats,
+            )
+
+    def clean_tracks(self, pd, results):
+        """DataFrame track yang sudah dibersihkan dan siap di-upsert, atau None jika tidak ada track."""
+        # Metadata mentah, dibersihkan per kolom
+        all_data = [
+            [
+                track['isrc'], track['spotify_track_id'], track['spotify_track_id'], track['track_name'],
+                track['artist_name'], track['album_name'], track['release_date'],
+            ]
+            for metadata in results if metadata is not None
+            for track in metadata
+        ]
+        if not all_data:
+            return None
+
+        df = pd.DataFrame(all_data, columns=[
+            'isrc', 'spotify_track_id', 'spotify_track_raw_id', 'track_name', 'artist_name', 'album_name',
+            'release_date',
+        ])
+
+        # Bersihkan dan ubah semua kolom menjadi huruf kecil, pastikan release_date valid.
+        # spotify_track_raw_id tetap asli karena id Spotify case-sensitive, dipakai untuk mode refresh
+        for column in ['isrc', 'spotify_track_id', 'track_name', 'artist_name', 'album_name']:
+            df[column] = clean_input_column(df[column])
+        df['release_date'] = release_date_column(df['release_date'])
+        df['match_artist'] = match_key_column(df['artist_name'])
+        df['match_title'] = match_key_column(df['track_name'])
+
+        # Hapus duplikat berdasarkan kombinasi isrc dan spotify_track_id
+        deduplicated = df.drop_duplicates(subset=self.identifier,
+                                          keep='first')  # Keep 'first' to keep the first occurrence
+        self.run_stats.add(rows_skipped=len(df) - len(deduplicated))
+        return deduplicated
+
+    def fetch_tracks(self, track_ids):
+        """Ambil metadata track berdasarkan id lewat endpoint tracks, 50 id per request, bersamaan."""
+        batches = [
+            track_ids[start:start + self.TRACKS_BATCH_SIZE]
+            for start in range(0, len(track_ids), self.TRACKS_BATCH_SIZE)
+        ]
+        spotify = self.get_spotify_client()
+
+        def fetch_batch(batch):
+            response = spotify.tracks(batch)
+            if self._landing:
+                self._landing.add('tracks', {'ids': batch}, response)
+            return response["tracks"]
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            responses = list(executor.map(fetch_batch, batches))
+        # Track yang sudah tidak tersedia dikembalikan sebagai None
+        return [self.track_metadata(track) for tracks in responses for track in tracks if track]
+
+    def refresh_tracks(self, postgres_hook) -> int:
+        """
+        Perbarui track yang sudah ada di target_table, mulai dari yang paling lama tidak di-refresh.
+
+        ``refreshed_at`` selalu diisi untuk semua id yang diminta, sedangkan ``updated_at`` hanya berubah
+        jika metadata berubah, sehingga run berikutnya melanjutkan ke track lain.
+        """
+        # Query dalam membaca index (refreshed_at NULLS FIRST, updated_at) sampai LIMIT baris,
+        # baru setelah itu id yang muncul di beberapa baris (beberapa ISRC) digabung
+        records = postgres_hook.get_records(
+            f"""
+            SELECT spotify_track_raw_id
+            FROM (
+                SELECT spotify_track_raw_id, refreshed_at, updated_at
+                FROM {self.target_table}
+                WHERE spotify_track_raw_id IS NOT NULL
+                ORDER BY refreshed_at ASC NULLS FIRST, updated_at ASC
+                LIMIT %s
+            ) AS oldest
+            GROUP BY spotify_track_raw_id
+            ORDER BY min(refreshed_at) ASC NULLS FIRST, min(updated_at) ASC
+            """,
+            parameters=(self.refresh_limit,),
+        )
+        track_ids = [record[0] for record in records]
+        self.log.info(f"Refreshing {len(track_ids)} Spotify tracks.")
+        self.run_stats.add(rows_read=len(track_ids))
+        if not track_ids:
+            return 0
+
+        with self.run_stats.phase('fetch'):
+            tracks = self.fetch_tracks(track_ids)
+        self.log.info(f"{len(track_ids) - len(tracks)} tracks are no longer available on Spotify.")
+        self.run_stats.add(rows_skipped=len(track_ids) - len(tracks))
+        track_count = self.write_tracks(postgres_hook, [tracks])
+
+        with self.run_stats.phase('write'):
+            postgres_hook.run(
+                f"UPDATE {self.target_table} SET refreshed_at = now() WHERE spotify_track_raw_id = ANY(%s)",
+                parameters=(track_ids,),
+            )
+        return track_count
+
+    def replay_tracks(self, postgres_hook) -> int:
+        """
+        Bangun ulang target_table dari response mentah di landing zone tanpa satu pun panggilan API.
+
+        File dibaca lewat memory map, urut dari response terlama, sehingga versi terbaru sebuah track
+        yang terakhir di-upsert.
+        """
+        files = landed_files(self.landing_zone_path, 'spotify', self.replay_from, self.replay_to)
+        self.log.info(f"Replaying {len(files)} landed Spotify files.")
+        track_count = 0
+        for path in files:
+            for responses in self.run_stats.timed(read_landed_responses(path), 'fetch'):
+                self.run_stats.add(rows_read=len(responses))
+                # Dalam satu batch duplikat pertama yang dipakai, jadi response terbaru didahulukan
+                tracks = [
+                    self.track_metadata(track)
+                    for endpoint, request, response in reversed(responses)
+                    for track in self.landed_tracks(endpoint, request, response)
+                ]
+                track_count += self.write_tracks(postgres_hook, [tracks])
+        return track_count
+
+    def close_response_cache(self):
+        self._cache.close()
+        self._cache.log_summary(self.log)
+        self.run_stats.add(cache_hits=self._cache.hits + self._cache.coalesced, cache_misses=self._cache.misses)
+        self._cache = None
+
+    def log_http_stats(self):
+        if self._http_session is not None:
+            self._http_session.call_stats.log_summary(self.log)
+
+    @record_run_stats('postgres_conn_id')
     def execute(self, context):
         postgres_hook = PostgresHook(postgres_conn_id=self.postgres_conn_id)
+        if self.mode == 'replay':
+            track_count = self.replay_tracks(postgres_hook)
+            self.log.info(f"Replayed {track_count} Spotify tracks from the landing zone.")
+            return
+
+        if self.landing_zone_path:
+            self._landing = RawResponseWriter(
+                self.landing_zone_path,
+                'spotify',
+                context.get('ds') or date.today().isoformat(),
+                landing_file_prefix(self, context, self.shard),
+                log=self.log,
+            )
+        if self.mode == 'refresh':
+            track_count = self.refresh_tracks(postgres_hook)
+            self.log.info(f"Refreshed {track_count} Spotify tracks.")
+            self.log_http_stats()
+            return
+
+        time_budget = TimeBudget(self.time_budget)
 
-        # Step 1: Fetch songs from the source query
-        records = postgres_hook.get_records(self.source_query)
+        # Step 1: Fetch songs from the source query (hanya range code milik shard ini jika di-shard).
+        # Mode incremental hanya mengambil lagu baru, yang berubah, atau yang sudah waktunya di-crawl ulang.
+        # Crawl state dicatat di setiap run, supaya run incremental berikutnya tidak mengulang lagu yang
+        # baru saja di-crawl oleh run penuh.
+        source_query = apply_code_shard(self.source_query, self.shard)
+        crawl_state = None
+        if self.crawl_state_table:
+            crawl_state = CrawlState(postgres_hook, 'spotify', self.crawl_state_table, log=self.log)
+            records = crawl_state.select_songs(
+                source_query, incremental=self.incremental, recrawl_after=self.recrawl_after
+            )
+        else:
+            records = postgres_hook.get_records(source_query)
         self.log.info(f"Fetched {len(records)} songs.")
+        self.run_stats.add(rows_read=len(records))
+
+        # Retry melewati lagu yang sudah diproses percobaan sebelumnya
+        checkpoint = None
+        if self.checkpoint_table:
+            checkpoint = CrawlCheckpoint(
+                postgres_hook, 'spotify', crawl_checkpoint_key(self, self.shard), self.checkpoint_table, log=self.log
+            )
+            processed = checkpoint.processed_codes()
+            if processed:
+                remaining = [record for record in records if record[2] not in processed]
+                self.run_stats.add(rows_skipped=len(records) - len(remaining))
+                records = remaining
+                self.log.info(f"Resuming: {len(processed)} songs already processed, {len(records)} left.")
+
+        # Step 2: Pencarian, pembersihan dan upsert berjalan bersamaan lewat antrean berukuran tetap:
+        # max_workers thread mencari lagu, hasilnya dibersihkan per micro-batch checkpoint_every lagu,
+        # lalu di-upsert (dan di-checkpoint) sementara pencarian berikutnya tetap berjalan.
+        # Client dibuat sebelum thread dimulai supaya semua worker memakai client yang sama.
+        self.get_spotify_client()
+
+        def search(record):
+            with self.run_stats.phase('fetch'):
+                return self.search_record(record)
+
+        def transform(batch):
+            # Lagu tanpa judul/artis tidak dicari
+            self.run_stats.add(rows_skipped=sum(metadata is None for record, metadata in batch))
+            return self.transform_tracks([metadata for record, metadata in batch])
+
+        def write(batch, df):
+            # Step 3: Upsert hasil micro-batch ini, lalu catat lagu-lagunya sebagai sudah di-crawl dan diproses
+            track_count = self.upsert_tracks(postgres_hook, df)
+            with self.run_stats.phase('write'):
+                # Lagu tanpa judul/artis ikut dicatat, supaya crawl incremental tidak memilihnya terus
+                result_counts = batch_result_counts(batch)
+                if crawl_state:
+                    crawl_state.mark_crawled(result_counts)
+                if checkpoint:
+                    checkpoint.mark_processed(result_counts)
+            return track_count
+
+        pipeline = StreamingPipeline(
+            search,
+            transform,
+            write,
+            workers=self.max_workers,
+            batch_size=self.checkpoint_every,
+            queue_size=self.queue_size,
+            should_stop=time_budget.exhausted,
+            log=self.log,
+        )
+        if self.response_cache_path:
+            self._cache = ResponseCache(
+                self.response_cache_path,
+                'spotify',
+                self.response_cache_ttl,
+                max_entries=self.response_cache_max_entries,
+                log=self.log,
+            )
+        # Halaman search lanjutan dari semua lagu diambil di pool terpisah yang dipakai bersama
+        self._page_executor = ThreadPoolExecutor(max_workers=max(1, self.page_workers))
+        try:
+            track_count, completed = pipeline.run(records)
+        finally:
+            self._page_executor.shutdown()
+            self._page_executor = None
+            if self._cache:
+                self.close_response_cache()
+            # Response dari batch yang gagal tetap disimpan
+            if self._landing:
+                self._landing.flush()
+        if not completed:
+            self.log.warning("Time budget spent, stopping. The remaining songs are left for the next run.")
 
-        # DataFrame untuk menampung metadata yang akan dimasukkan ke DB
-        all_data = []
-
-        # Step 2: Process each record and retrieve metadata
-        for record in records:
-            self.log.info(f"Processing record: {record}")
-            try:
-                song_title = record[0]  # Song title
-                artist_name = record[1]  # Artist name
-
-                if song_title and artist_name:
-                    metadata = self.get_all_spotify_metadata(song_title, artist_name)
-                    for track in metadata:
-                        # Pastikan release_date valid
-                        release_date = pd.to_datetime(track['release_date'], errors='coerce').date() if track[
-                            'release_date'] else None
-
-                        # Bersihkan dan ubah semua kolom menjadi huruf kecil
-                        row = [
-                            self.clean_input(track['isrc']),
-                            self.clean_input(track['spotify_track_id']),
-                            self.clean_input(track['track_name']),
-                            self.clean_input(track['artist_name']),
-                            self.clean_input(track['album_name']),
-                            release_date,
-                            pd.to_datetime('now'),
-                            pd.to_datetime('now')
-                        ]
-
-                        # Menambahkan row ke DataFrame
-                        all_data.append(row)
-
-                else:
-                    self.log.info(f"Skipping song with missing title or artist: {record}")
-
-            except IndexError:
-                self.log.error(f"Error accessing record: {record}. Skipping this record.")
-                continue
-
-        # Setelah semua data terkumpul, konversikan ke DataFrame
-        if all_data:
-            df = pd.DataFrame(all_data, columns=[
-                'isrc', 'spotify_track_id', 'track_name', 'artist_name', 'album_name', 'release_date', 'added_at',
-                'updated_at'
-            ])
-
-            # Step 3: Hapus duplikat berdasarkan kombinasi isrc dan spotify_track_id
-            df = df.drop_duplicates(subset=['isrc', 'spotify_track_id'],
-                                    keep='first')  # Keep 'first' to keep the first occurrence
-
-            # Step 4: Siapkan query upsert
-            for index, row in df.iterrows():
-                upsert_query = f"""
-                INSERT INTO {self.target_table} (isrc, spotify_track_id, track_name, artist_name, album_name, release_date, added_at, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (isrc, spotify_track_id) 
-                DO UPDATE 
-                    SET track_name = EXCLUDED.track_name,
-                        artist_name = EXCLUDED.artist_name,
-                        album_name = EXCLUDED.album_name,
-                        release_date = EXCLUDED.release_date,
-                        updated_at = EXCLUDED.updated_at;
-                """
-
-                try:
-                    # Execute upsert query for each row
-                    postgres_hook.run(upsert_query, parameters=tuple(row))
-                    self.log.info(f"Upserted track: {row['track_name']}")
-                except Exception as e:
-                    self.log.error(f"Failed to upsert track {row['track_name']}: {e}")
+        self.log.info(f"Upserted {track_count} Spotify tracks.")
+        self.log_http_stats()
+        if checkpoint and completed:
+            checkpoint.clear()
@@ -0,0 +1,18 @@
+from airflow.models import Variable
+from spotipy.cache_handler import CacheHandler
+
+
+class AirflowVariableCacheHandler(CacheHandler):
+    """
+    Menyimpan access token Spotify di Airflow Variable, sehingga token yang sama
+    dipakai ulang oleh retry maupun task lain selama belum expired.
+    """
+
+    def __init__(self, key):
+        self.key = key
+
+    def get_cached_token(self):
+        return Variable.get(self.key, default_var=None, deserialize_json=True)
+
+    def save_token_to_cache(self, token_info):
+        Variable.set(self.key, token_info, serialize_json=True)
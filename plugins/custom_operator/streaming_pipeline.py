@@ -0,0 +1,185 @@
+from queue import Empty, Full, Queue
+import threading
+import time
+
+# Penanda akhir stream di antrean
+_DONE = object()
+# Penanda item yang fetch-nya dihentikan StopStreaming, supaya urutan tetap berlanjut tanpa item itu
+_SKIPPED = object()
+# Interval polling antrean, supaya setiap stage cepat berhenti saat stage lain gagal
+_POLL_SECONDS = 0.1
+
+
+class StopStreaming(Exception):
+    """Raised by ``fetch``: take no new items, but still transform and write everything fetched so far."""
+
+
+class StreamingPipeline:
+    """
+    Fetch, transform dan write yang berjalan bersamaan, dihubungkan antrean berukuran tetap.
+
+    ``workers`` thread memanggil ``fetch(item)`` untuk setiap item. Satu thread transform mengumpulkan hasilnya
+    menjadi micro-batch ``[(item, result), ...]`` (``batch_size`` item, atau lebih sedikit setelah ``flush_seconds``)
+    dan memanggil ``transform(batch)``. Thread pemanggil ``run`` menulis setiap batch dengan
+    ``write(batch, transformed)``, yang mengembalikan jumlah baris yang ditulis.
+
+    Batch selalu berisi item dalam urutan input, seperti hasil yang dikumpulkan berurutan sebelum ada pipeline,
+    sehingga aturan "baris pertama menang" (drop_duplicates, DISTINCT ON) tetap deterministik. Hasil worker
+    yang selesai lebih dulu menunggu di reorder buffer sampai item sebelumnya selesai.
+
+    Antrean yang penuh menahan stage sebelumnya (backpressure), sehingga memori tetap datar: paling banyak
+    ``queue_size`` item yang sedang di-fetch atau menunggu urutannya, satu batch yang sedang di-transform dan dua
+    batch yang menunggu ditulis. Error di stage mana pun menghentikan semua stage dan di-raise ulang oleh ``run``.
+    """
+
+    def __init__(self, fetch, transform, write, workers: int = 4, batch_size: int = 50, queue_size: int = None,
+                 flush_seconds: float = 5.0, should_stop=None, log=None):
+        self.fetch = fetch
+        self.transform = transform
+        self.write = write
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.queue_size = queue_size or 2 * self.batch_size
+        self.flush_seconds = flush_seconds
+        self.should_stop = should_stop  # Dicek sebelum setiap item diambil, misalnya TimeBudget.exhausted
+        self.log = log
+
+    def run(self, items) -> tuple:
+        """Stream ``items`` through the three stages. Returns ``(rows_written, completed)``."""
+        fetched = Queue()  # Paling banyak queue_size entri, dibatasi oleh window
+        transformed = Queue(maxsize=2)
+        # Slot untuk item yang sedang di-fetch atau menunggu urutannya, dilepas saat item masuk batch
+        window = threading.Semaphore(self.queue_size)
+        abort = threading.Event()  # Ada stage yang gagal
+        stopping = threading.Event()  # Tidak ada item baru yang diambil
+        errors = []
+        iterator = enumerate(items)
+        iterator_lock = threading.Lock()
+
+        def next_item():
+            """``(index, item)`` of the next input item, or _DONE."""
+            while not window.acquire(timeout=_POLL_SECONDS):
+                if abort.is_set():
+                    return _DONE
+            with iterator_lock:
+                if abort.is_set() or stopping.is_set():
+                    entry = _DONE
+                elif self.should_stop and self.should_stop():
+                    stopping.set()
+                    entry = _DONE
+                else:
+                    entry = next(iterator, _DONE)
+            if entry is _DONE:
+                window.release()
+            return entry
+
+        def put(queue, value) -> bool:
+            # Menunggu selama antrean penuh (backpressure), menyerah jika pipeline dibatalkan
+            while not abort.is_set():
+                try:
+                    queue.put(value, timeout=_POLL_SECONDS)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def fail(error):
+            errors.append(error)
+            abort.set()
+
+        def fetcher():
+            try:
+                while True:
+                    entry = next_item()
+                    if entry is _DONE:
+                        break
+                    index, item = entry
+                    try:
+                        result = self.fetch(item)
+                    except StopStreaming:
+                        stopping.set()
+                        fetched.put((index, item, _SKIPPED))
+                        break
+                    fetched.put((index, item, result))
+            except BaseException as e:
+                fail(e)
+            finally:
+                fetched.put(_DONE)
+
+        def transformer():
+            try:
+                finished_workers = 0
+                pending = {}  # Reorder buffer: index -> (item, result)
+                next_index = 0
+                batch = []
+                batch_started = None
+                while finished_workers < self.workers or next_index in pending:
+                    entry = None
+                    if next_index not in pending:
+                        try:
+                            entry = fetched.get(timeout=_POLL_SECONDS)
+                        except Empty:
+                            pass
+                    if abort.is_set():
+                        return
+                    if entry is _DONE:
+                        finished_workers += 1
+                    elif entry is not None:
+                        index, item, result = entry
+                        pending[index] = (item, result)
+                    while next_index in pending and len(batch) < self.batch_size:
+                        item, result = pending.pop(next_index)
+                        next_index += 1
+                        window.release()
+                        if result is not _SKIPPED:
+                            batch.append((item, result))
+                            batch_started = batch_started or time.monotonic()
+
+                    if batch and (
+                        len(batch) >= self.batch_size
+                        or (finished_workers == self.workers and next_index not in pending)
+                        or time.monotonic() - batch_started >= self.flush_seconds
+                    ):
+                        if not put(transformed, (batch, self.transform(batch))):
+                            return
+                        batch, batch_started = [], None
+            except BaseException as e:
+                fail(e)
+            finally:
+                put(transformed, _DONE)
+
+        threads = [threading.Thread(target=fetcher, name=f'pipeline-fetch-{index}', daemon=True)
+                   for index in range(self.workers)]
+        threads.append(threading.Thread(target=transformer, name='pipeline-transform', daemon=True))
+        for thread in threads:
+            thread.start()
+
+        rows_written = 0
+        batches = 0
+        try:
+            while True:
+                try:
+                    entry = transformed.get(timeout=_POLL_SECONDS)
+                except Empty:
+                    if abort.is_set():
+                        break
+                    continue
+                if entry is _DONE:
+                    break
+                rows_written += self.write(*entry)
+                batches += 1
+        except BaseException:
+            abort.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+
+        if self.log:
+            self.log.info(
+                f"Streamed {rows_written} rows in {batches} batches"
+                + (", stopped before the end of the input." if stopping.is_set() else ".")
+            )
+        return rows_written, not stopping.is_set()
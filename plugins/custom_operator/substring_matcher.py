@@ -0,0 +1,112 @@
+from collections import defaultdict, deque
+
+# Urutan kolom hasil, sama dengan SELECT di dags/sql/load_media_warehouse_raw.sql
+MEDIA_WAREHOUSE_COLUMNS = [
+    'code', 'video_id', 'channel_id', 'video_title', 'channel_title', 'isrc', 'spotify_track_id',
+    'spotify_track_name', 'spotify_album', 'spotify_release_date', 'original_artist', 'song_title',
+]
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring matcher.
+
+    ``find(text)`` returns every pattern that occurs anywhere in ``text`` in a single pass over the text,
+    no matter how many patterns the automaton holds.
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._matches = [()]
+
+        for pattern in set(patterns):
+            if pattern:
+                self._add(pattern)
+        self._build()
+
+    def _add(self, pattern):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._matches.append(())
+            state = next_state
+        self._matches[state] = (pattern,)
+
+    def _build(self):
+        # BFS: failure link tiap state menunjuk ke suffix terpanjang yang juga prefix sebuah pattern
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                # Pattern yang berakhir di state ini ditambah semua pattern milik failure state-nya
+                self._matches[next_state] += self._matches[self._fail[next_state]]
+                queue.append(next_state)
+
+    def find(self, text) -> set:
+        """Return the set of patterns contained in ``text``."""
+        found = set()
+        state = 0
+        goto, fail, matches = self._goto, self._fail, self._matches
+        for char in text or '':
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if matches[state]:
+                found.update(matches[state])
+        return found
+
+
+def match_media_warehouse(songs, tracks, videos):
+    """
+    Produce the rows of the media_warehouse_raw join in one pass over the catalog texts.
+
+    ``songs``: (code, original_artist, song_title, match_artist, match_title)
+    ``tracks``: (isrc, spotify_track_id, track_name, album_name, release_date, match_artist, match_title)
+    ``videos``: (video_id, channel_id, video_title, channel_title, match_title)
+
+    A song, track and video are joined when the track's artist key is a substring of the song's artist key,
+    and the track's title key is a substring of both the song's title key and the video's title key,
+    exactly like the ``LIKE '%' || key || '%'`` conditions of the SQL engine.
+    """
+    tracks_by_title = defaultdict(list)
+    artist_keys = set()
+    for track in tracks:
+        track_artist, track_title = track[5], track[6]
+        if track_artist and track_title:
+            tracks_by_title[track_title].append(track)
+            artist_keys.add(track_artist)
+
+    automaton = AhoCorasick(list(tracks_by_title) + list(artist_keys))
+
+    # Setiap judul video cukup di-scan sekali
+    videos_by_title = defaultdict(list)
+    for video in videos:
+        for title in automaton.find(video[4]) & tracks_by_title.keys():
+            videos_by_title[title].append(video)
+
+    for code, original_artist, song_title, song_artist_key, song_title_key in songs:
+        artists_in_song = automaton.find(song_artist_key)
+        if not artists_in_song:
+            continue
+        for title in automaton.find(song_title_key):
+            matched_videos = videos_by_title.get(title)
+            if not matched_videos:
+                continue
+            for isrc, track_id, track_name, album_name, release_date, track_artist, _ in tracks_by_title[title]:
+                if track_artist not in artists_in_song:
+                    continue
+                for video_id, channel_id, video_title, channel_title, _ in matched_videos:
+                    yield (
+                        code, video_id, channel_id, video_title, channel_title, isrc, track_id,
+                        track_name, album_name, release_date, original_artist, song_title,
+                    )
@@ -0,0 +1,100 @@
+from functools import lru_cache
+import re
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Semua karakter selain huruf/angka/spasi, termasuk underscore (wildcard LIKE)
+_NON_WORD = re.compile(r'[^\w\s]|_')
+_WHITESPACE = re.compile(r'\s+')
+# Tanda baca, underscore dan tab yang dibuang clean_input
+_CLEAN_INPUT = re.compile(r'[^\w\s]|[_\t]')
+
+# Jumlah string berbeda yang diingat per fungsi (nama artis, judul, dll banyak yang berulang)
+_CACHE_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def clean_input(text):
+    """Clean and standardize input text (e.g., song title and artist name)."""
+    # Menghapus titik, koma, kutip, backslash, garis miring, kurung, tab, minus dan underscore,
+    # lalu menghapus spasi di ujung dan mengubah ke huruf kecil
+    return _CLEAN_INPUT.sub('', text).strip().lower()
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def match_key(text):
+    """
+    Normalized key used to join m_songs, library_music_spotify and library_music_youtube.
+
+    Lowercase, punctuation removed and whitespace collapsed to single spaces. The result never
+    contains LIKE wildcards, so it can be used directly in ``LIKE '%' || key || '%'`` patterns.
+    """
+    if text is None:
+        return None
+    text = _NON_WORD.sub('', str(text).lower())
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def parse_release_date(value):
+    """Release date Spotify ('2020', '2020-05' atau '2020-05-17') sebagai date, NaT jika tidak valid."""
+    import pandas as pd
+
+    return pd.to_datetime(value, errors='coerce').date() if value else None
+
+
+def map_unique(values: 'pd.Series', func) -> 'pd.Series':
+    """
+    Apply ``func`` once per distinct value of ``values`` instead of once per row.
+
+    Nilai null tetap diteruskan ke ``func`` satu per satu, sehingga hasilnya sama persis dengan ``values.map(func)``.
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values)
+    # Slot terakhir untuk kode -1 (null), diisi ulang di bawah
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    mapped[:-1] = [func(value) for value in uniques]
+    result = pd.Series(mapped[codes], index=values.index, dtype=object)
+
+    missing = codes == -1
+    if missing.any():
+        result[missing] = [func(value) for value in values[missing]]
+    return result
+
+
+def clean_input_column(values: 'pd.Series') -> 'pd.Series':
+    """``clean_input`` for a whole column."""
+    return map_unique(values, clean_input)
+
+
+def match_key_column(values: 'pd.Series') -> 'pd.Series':
+    """``match_key`` for a whole column."""
+    return map_unique(values, match_key)
+
+
+def release_date_column(values: 'pd.Series') -> 'pd.Series':
+    """``parse_release_date`` for a whole column."""
+    return map_unique(values, parse_release_date)
+
+
+def clean_sheet_column(values: 'pd.Series') -> 'pd.Series':
+    """
+    Pembersihan kolom Google Sheet: nilai kosong (NaN atau '') menjadi 'unknown' dan string menjadi lowercase.
+    Nilai non-string (angka) tidak diubah.
+    """
+    import pandas as pd
+
+    missing = values.isna() | (values == "")
+    if missing.any():
+        values = values.astype(object).where(~missing, 'unknown')
+
+    if values.dtype == object:
+        if pd.api.types.infer_dtype(values) == 'string':
+            values = map_unique(values, str.lower)
+        else:
+            values = values.map(lambda x: x.lower() if isinstance(x, str) else x)
+    return values
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from plugins.custom_operator.postgres_bulk_writer import bulk_upsert
+
+
+class WatermarkStore:
+    """
+    Menyimpan watermark (nilai ``updated_at`` terakhir yang sudah diproses) per tabel sumber
+    untuk satu pipeline, dipakai load incremental agar hanya membaca baris yang berubah.
+    """
+
+    def __init__(self, postgres_hook, pipeline: str, watermark_table: str = 'demo_music.etl_watermarks', log=None):
+        self.postgres_hook = postgres_hook
+        self.pipeline = pipeline
+        self.watermark_table = watermark_table
+        self.log = log
+
+    def load(self) -> dict:
+        """Return ``{source_table: (watermark, last_full_refresh_at)}`` stored for this pipeline."""
+        records = self.postgres_hook.get_records(
+            f"SELECT source_table, watermark, last_full_refresh_at FROM {self.watermark_table} WHERE pipeline = %s",
+            parameters=(self.pipeline,),
+        )
+        return {
+            source_table: (watermark, last_full_refresh_at)
+            for source_table, watermark, last_full_refresh_at in records
+        }
+
+    def save(self, watermarks: dict, full_refresh: bool) -> None:
+        """Store the new watermark of each source table; ``last_full_refresh_at`` only moves after a full refresh."""
+        now = datetime.now()
+        update_fields = ['watermark', 'updated_at']
+        if full_refresh:
+            update_fields.append('last_full_refresh_at')
+        bulk_upsert(
+            self.postgres_hook,
+            self.watermark_table,
+            ['pipeline', 'source_table', 'watermark', 'last_full_refresh_at', 'updated_at'],
+            [
+                (self.pipeline, source_table, watermark, now if full_refresh else None, now)
+                for source_table, watermark in watermarks.items()
+            ],
+            identifier=['pipeline', 'source_table'],
+            update_fields=update_fields,
+            log=self.log,
+        )
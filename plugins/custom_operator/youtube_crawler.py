@@ -1,101 +1,562 @@
 from airflow.models import BaseOperator
-from googleapiclient.discovery import build
-from airflow.hooks.postgres_hook import PostgresHook
-import re
-import pandas as pd
+from airflow.providers.postgres.hooks.postgres import PostgresHook
+from datetime import date, timedelta
+import threading
+
+from plugins.custom_operator.code_shard_planner import apply_code_shard
+from plugins.custom_operator.crawl_checkpoint import (
+    CrawlCheckpoint,
+    TimeBudget,
+    crawl_checkpoint_key,
+    crawl_run_id,
+)
+from plugins.custom_operator.crawl_state import CrawlState, batch_result_counts
+from plugins.custom_operator.postgres_bulk_writer import bulk_upsert
+from plugins.custom_operator.quota_scheduler import QuotaBudgetScheduler
+from plugins.custom_operator.raw_landing_zone import (
+    RawResponseWriter,
+    landed_files,
+    landing_file_prefix,
+    read_landed_responses,
+)
+from plugins.custom_operator.response_cache import ResponseCache
+from plugins.custom_operator.run_stats import record_run_stats
+from plugins.custom_operator.streaming_pipeline import StopStreaming, StreamingPipeline
+from plugins.custom_operator.text_normalization import clean_input_column, match_key, match_key_column
 
 class YouTubeMetadataExtractorOperator(BaseOperator):
-    def __init__(self, postgres_conn_id, source_query, target_table, api_key, **kwargs):
+    template_fields = ('replay_from', 'replay_to')
+
+    # Biaya kuota YouTube Data API untuk satu panggilan search().list
+    SEARCH_COST_UNITS = 100
+    # videos().list costs 1 unit per call and accepts up to 50 ids
+    VIDEOS_LIST_COST_UNITS = 1
+    VIDEOS_LIST_BATCH_SIZE = 50
+    # Search results in the response cache are reused this long, quota is scarcer than freshness
+    RESPONSE_CACHE_TTL = timedelta(days=30)
+
+    def __init__(self, postgres_conn_id, source_query, target_table, api_key,
+                 identifier: list = ('video_id', 'channel_id'),
+                 daily_quota_units: int = None,  # Daily unit budget; source_query must then also select `code`
+                 quota_usage_table: str = 'demo_music.api_quota_usage',
+                 crawl_state_table: str = 'demo_music.crawl_state',
+                 # Only search songs that are new, whose title/artist changed, or last crawled before recrawl_after
+                 incremental: bool = False,
+                 recrawl_after: timedelta = None,  # With incremental, recrawl songs whose last crawl is older
+                 shard: dict = None,  # Code range from CodeShardPlannerOperator; source_query must select `code`
+                 checkpoint_table: str = None,  # Per-song progress resumed by a retry or the next run; needs `code`
+                 checkpoint_every: int = 50,  # Upsert results and checkpoint per micro-batch of this many songs
+                 max_workers: int = 2,  # Concurrent search() calls
+                 queue_size: int = None,  # Most song results waiting to be cleaned, default 2 x checkpoint_every
+                 time_budget: timedelta = None,  # Stop gracefully, keeping the progress, after this long
+                 # 'search' discovers videos for source_query, 'refresh' updates known videos,
+                 # 'replay' rebuilds target_table from the landing zone without any API call
+                 mode: str = 'search',
+                 refresh_limit: int = 5000,  # Number of least recently refreshed videos updated per run
+                 run_stats_table: str = None,  # Per-run metrics table (pipeline_run_stats)
+                 landing_zone_path: str = None,  # Also keep the raw API responses as Parquet files here
+                 replay_from: str = None,  # First run date (YYYY-MM-DD) to replay, None replays everything
+                 replay_to: str = None,  # Last run date to replay
+                 response_cache_path: str = None,  # SQLite cache of search responses, shared with the other crawlers
+                 response_cache_ttl: timedelta = None,  # Defaults to RESPONSE_CACHE_TTL
+                 response_cache_max_entries: int = 200_000,  # Least recently used entries above this are evicted
+                 **kwargs):
         super().__init__(**kwargs)
+        if mode not in ('search', 'refresh', 'replay'):
+            raise ValueError(f"Unknown mode {mode!r}, expected 'search', 'refresh' or 'replay'")
+        if mode == 'replay' and not landing_zone_path:
+            raise ValueError("mode='replay' needs a landing_zone_path")
         self.postgres_conn_id = postgres_conn_id
         self.source_query = source_query
         self.target_table = target_table
         self.api_key = api_key
+        self.identifier = list(identifier)  # Unique constraint columns used for the upsert
+        self.daily_quota_units = daily_quota_units
+        self.quota_usage_table = quota_usage_table
+        self.crawl_state_table = crawl_state_table
+        self.incremental = incremental
+        self.recrawl_after = recrawl_after
+        self.shard = shard
+        self.checkpoint_table = checkpoint_table
+        self.checkpoint_every = checkpoint_every
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.time_budget = time_budget
+        self.mode = mode
+        self.refresh_limit = refresh_limit
+        self.run_stats_table = run_stats_table
+        self.landing_zone_path = landing_zone_path
+        self.replay_from = replay_from
+        self.replay_to = replay_to
+        self.response_cache_path = response_cache_path
+        self.response_cache_ttl = response_cache_ttl or self.RESPONSE_CACHE_TTL
+        self.response_cache_max_entries = response_cache_max_entries
+
+        # The YouTube API client is built on first use in execute, never while the DAG file is parsed
+        self._youtube = None
+        self._http_session = None
+        # Landing zone writer of this run, only when landing_zone_path is set
+        self._landing = None
+        # Search response cache, only when response_cache_path is set
+        self._cache = None
+
+    @property
+    def youtube(self):
+        """Return the YouTube API client, building it from the bundled discovery document on first use."""
+        if self._youtube is None:
+            from googleapiclient.discovery import build
+            from plugins.custom_operator.http_transport import RequestsHttp, build_http_session
+
+            # Requests go through a pooled session with timeouts and Retry-After aware backoff on 429/5xx
+            self._http_session = build_http_session()
+            self._youtube = build(
+                "youtube", "v3", developerKey=self.api_key, static_discovery=True, cache_discovery=False,
+                http=RequestsHttp(self._http_session),
+            )
+        return self._youtube
 
-        # Setup YouTube API client
-        self.youtube = build("youtube", "v3", developerKey=self.api_key)
+    def close_response_cache(self):
+        self._cache.close()
+        self._cache.log_summary(self.log)
+        self.run_stats.add(cache_hits=self._cache.hits + self._cache.coalesced, cache_misses=self._cache.misses)
+        self._cache = None
 
-    def clean_input(self, text):
-        """Clean and standardize input text (e.g., song title and artist name)."""
-        cleaned_text = re.sub(r'[^\w\s]', '', text)  # Remove special characters
-        cleaned_text = re.sub(r'[/\\()\-_\t]', '', cleaned_text)  # Remove unwanted symbols
-        return cleaned_text.strip().lower()  # Remove extra spaces and convert to lowercase
+    def log_http_stats(self):
+        if self._http_session is not None:
+            self._http_session.call_stats.log_summary(self.log)
 
     def get_youtube_metadata(self, query):
         """Fetch YouTube video metadata based on a search query."""
-        search_response = self.youtube.search().list(
-            q=query,
-            part="snippet",  # The metadata part we want
-            maxResults=1,    # Retrieve a maximum of 5 videos
-            type="video",    # Only search for videos
-        ).execute()
-
-        results = []
-        for item in search_response.get("items", []):
-            results.append({
-                "video_id": item["id"]["videoId"],
+        return self.landed_videos('search', self.search_videos(query))
+
+    def search_videos(self, query):
+        """The raw search().list response for ``query``."""
+        request = {
+            'q': query,
+            'part': "snippet",  # The metadata part we want
+            'maxResults': 1,    # Retrieve a maximum of 5 videos
+            'type': "video",    # Only search for videos
+        }
+        search_response = self.youtube.search().list(**request).execute()
+        if self._landing:
+            self._landing.add('search', request, search_response)
+        return search_response
+
+    def get_videos_metadata(self, video_ids):
+        """Fetch the current metadata of up to 50 known videos. Videos that no longer exist are not returned."""
+        request = {
+            'id': ",".join(video_ids),
+            'part': "snippet",
+            'fields': "items(id,snippet(channelId,title,channelTitle))",  # Only the fields we store
+            'maxResults': self.VIDEOS_LIST_BATCH_SIZE,
+        }
+        response = self.youtube.videos().list(**request).execute()
+        if self._landing:
+            self._landing.add('videos', request, response)
+        return self.landed_videos('videos', response)
+
+    @staticmethod
+    def landed_videos(endpoint, response):
+        """The video fields we store, from one raw search().list or videos().list response."""
+        return [
+            {
+                # search() nests the id, videos() returns it as a plain string
+                "video_id": item["id"]["videoId"] if endpoint == 'search' else item["id"],
                 "channel_id": item["snippet"]["channelId"],
                 "video_title": item["snippet"]["title"],
                 "channel_title": item["snippet"]["channelTitle"],
-            })
-        return results
+            }
+            for item in response.get("items", [])
+        ]
+
+    @staticmethod
+    def is_quota_exceeded(error) -> bool:
+        return error.resp.status == 403 and 'quotaExceeded' in error.content.decode('utf-8', 'ignore')
+
+    def write_videos(self, postgres_hook, all_data) -> int:
+        """Clean the raw video rows of one batch and upsert them into target_table. Returns the number of rows."""
+        return self.upsert_videos(postgres_hook, self.transform_videos(all_data))
+
+    def transform_videos(self, all_data):
+        """The cleaned DataFrame of raw video rows, or None when there are none."""
+        import pandas as pd
+
+        if not all_data:
+            return None
+        with self.run_stats.phase('transform'):
+            return self.clean_videos(pd, all_data)
+
+    def upsert_videos(self, postgres_hook, df) -> int:
+        """Upsert the cleaned videos of transform_videos into target_table."""
+        # Land the raw responses first, so everything written to the table can be replayed
+        if self._landing:
+            self._landing.flush()
+        if df is None:
+            return 0
+
+        # Upsert data into database (COPY into staging, then one merge), added_at comes from the column default.
+        # updated_at is stamped by the database and only moves when the video metadata changed,
+        # the warehouse load uses it as watermark
+        compare_fields = ['video_raw_id', 'video_title', 'channel_title', 'match_title', 'is_available']
+        with self.run_stats.phase('write'):
+            return bulk_upsert(
+                postgres_hook,
+                self.target_table,
+                df.columns.tolist(),
+                df.itertuples(index=False, name=None),
+                identifier=self.identifier,
+                update_fields=compare_fields,
+                compare_fields=compare_fields,
+                updated_at_column='updated_at',
+                log=self.log,
+                run_stats=self.run_stats,
+            )
+
+    def clean_videos(self, pd, all_data):
+        """DataFrame of the cleaned, deduplicated video rows."""
+        df = pd.DataFrame(all_data, columns=['video_id', 'channel_id', 'video_title', 'channel_title'])
+        # video_id is stored cleaned (lowercase, without - and _), refresh mode needs the original id
+        df['video_raw_id'] = df['video_id']
+        df['is_available'] = True
+
+        # Clean and standardize data
+        for column in ['video_id', 'channel_id', 'video_title', 'channel_title']:
+            df[column] = clean_input_column(df[column])
+        df['match_title'] = match_key_column(df['video_title'])
+
+        # Remove duplicates based on video_id and channel_id
+        deduplicated = df.drop_duplicates(subset=self.identifier, keep='first')
+        self.run_stats.add(rows_skipped=len(df) - len(deduplicated))
+        return deduplicated
+
+    def flush(self, postgres_hook, df, result_counts, crawl_state=None, checkpoint=None) -> int:
+        """Write the cleaned videos of one micro-batch, then record their songs as crawled and processed."""
+        row_count = self.upsert_videos(postgres_hook, df)
+        # Remember which songs were crawled so the next run continues with the rest of the catalog
+        with self.run_stats.phase('write'):
+            if crawl_state:
+                crawl_state.mark_crawled(result_counts)
+            if checkpoint:
+                checkpoint.mark_processed(result_counts)
+        return row_count
+
+    def refresh_videos(self, context, postgres_hook) -> int:
+        """
+        Update the known videos in target_table, least recently refreshed first, 50 ids per videos().list call.
+
+        Videos the API no longer returns are flagged with ``is_available = false``. ``refreshed_at`` is set for
+        every requested id, while ``updated_at`` only moves when the metadata changed.
+        """
+        from googleapiclient.errors import HttpError
+
+        # The inner query reads the (refreshed_at NULLS FIRST, updated_at) index up to LIMIT rows,
+        # only then are ids stored on several rows (several channels) merged
+        records = postgres_hook.get_records(
+            f"""
+            SELECT video_raw_id
+            FROM (
+                SELECT video_raw_id, refreshed_at, updated_at
+                FROM {self.target_table}
+                WHERE video_raw_id IS NOT NULL
+                ORDER BY refreshed_at ASC NULLS FIRST, updated_at ASC
+                LIMIT %s
+            ) AS oldest
+            GROUP BY video_raw_id
+            ORDER BY min(refreshed_at) ASC NULLS FIRST, min(updated_at) ASC
+            """,
+            parameters=(self.refresh_limit,),
+        )
+        video_ids = [record[0] for record in records]
+        self.run_stats.add(rows_read=len(video_ids))
+        batches = [
+            video_ids[start:start + self.VIDEOS_LIST_BATCH_SIZE]
+            for start in range(0, len(video_ids), self.VIDEOS_LIST_BATCH_SIZE)
+        ]
+
+        # With a daily budget, only refresh as many batches as the reserved units pay for
+        scheduler = None
+        if self.daily_quota_units:
+            scheduler = QuotaBudgetScheduler(
+                postgres_hook,
+                source='youtube',
+                daily_budget_units=self.daily_quota_units,
+                usage_table=self.quota_usage_table,
+                log=self.log,
+            )
+            quota_run_id = crawl_run_id(self, context)
+            reserved_units = scheduler.reserve(quota_run_id, len(batches) * self.VIDEOS_LIST_COST_UNITS)
+            batches = batches[:reserved_units // self.VIDEOS_LIST_COST_UNITS]
+        self.log.info(f"Refreshing {sum(len(batch) for batch in batches)} of {len(video_ids)} YouTube videos.")
 
+        all_data = []
+        refreshed_ids = []
+        units_spent = 0
+        try:
+            for batch in batches:
+                units_spent += self.VIDEOS_LIST_COST_UNITS
+                try:
+                    with self.run_stats.phase('fetch'):
+                        metadata = self.get_videos_metadata(batch)
+                except HttpError as e:
+                    if self.is_quota_exceeded(e):
+                        self.log.warning("YouTube quota exceeded. Stopping and keeping the partial results.")
+                        break
+                    raise
+                all_data.extend(
+                    [video['video_id'], video['channel_id'], video['video_title'], video['channel_title']]
+                    for video in metadata
+                )
+                refreshed_ids.extend(batch)
+        finally:
+            self.run_stats.add(quota_units=units_spent)
+            if scheduler:
+                scheduler.settle(quota_run_id, reserved_units, units_spent)
+            # Responses already paid for are kept, even when the run fails
+            if self._landing:
+                self._landing.flush()
+
+        row_count = self.write_videos(postgres_hook, all_data)
+        if not refreshed_ids:
+            return row_count
+
+        # Requested but not returned: the video was deleted or made private
+        available_ids = [row[0] for row in all_data]
+        self.run_stats.add(rows_skipped=len(set(refreshed_ids) - set(available_ids)))
+        with self.run_stats.phase('write'):
+            postgres_hook.run(
+            f"""
+                UPDATE {self.target_table}
+                SET is_available = video_raw_id = ANY(%(available_ids)s),
+                    refreshed_at = now()
+                WHERE video_raw_id = ANY(%(refreshed_ids)s)
+                """,
+                parameters={'available_ids': available_ids, 'refreshed_ids': refreshed_ids},
+            )
+        self.log.info(f"{len(set(refreshed_ids) - set(available_ids))} refreshed videos are no longer available.")
+        return row_count
+
+    def replay_videos(self, postgres_hook) -> int:
+        """
+        Rebuild target_table from the raw responses in the landing zone, without a single API call.
+
+        Files are read through a memory map, oldest responses first, so the latest version of a video is
+        upserted last. Ids a videos().list response did not return are flagged unavailable again.
+        """
+        files = landed_files(self.landing_zone_path, 'youtube', self.replay_from, self.replay_to)
+        self.log.info(f"Replaying {len(files)} landed YouTube files.")
+        row_count = 0
+        for path in files:
+            for responses in self.run_stats.timed(read_landed_responses(path), 'fetch'):
+                self.run_stats.add(rows_read=len(responses))
+                # Within one batch the first duplicate wins, so the latest response goes first
+                all_data = [
+                    [video['video_id'], video['channel_id'], video['video_title'], video['channel_title']]
+                    for endpoint, request, response in reversed(responses)
+                    for video in self.landed_videos(endpoint, response)
+                ]
+                row_count += self.write_videos(postgres_hook, all_data)
+
+                # Availability follows the responses in order, a later response can bring a video back
+                availability = {}
+                for endpoint, request, response in responses:
+                    if endpoint == 'videos':
+                        returned = {video['video_id'] for video in self.landed_videos(endpoint, response)}
+                        availability.update((video_id, video_id in returned) for video_id in request['id'].split(','))
+                if availability:
+                    available_ids = [video_id for video_id, available in availability.items() if available]
+                    with self.run_stats.phase('write'):
+                        postgres_hook.run(
+                            f"""
+                            UPDATE {self.target_table}
+                            SET is_available = video_raw_id = ANY(%(available_ids)s)
+                            WHERE video_raw_id = ANY(%(requested_ids)s)
+                            """,
+                            parameters={
+                                'available_ids': available_ids,
+                                'requested_ids': list(availability),
+                            },
+                        )
+        return row_count
+
+    @record_run_stats('postgres_conn_id')
     def execute(self, context):
+        from googleapiclient.errors import HttpError
+
         postgres_hook = PostgresHook(postgres_conn_id=self.postgres_conn_id)
+        if self.mode == 'replay':
+            row_count = self.replay_videos(postgres_hook)
+            self.log.info(f"Replayed {row_count} YouTube videos from the landing zone.")
+            return
+
+        if self.landing_zone_path:
+            self._landing = RawResponseWriter(
+                self.landing_zone_path,
+                'youtube',
+                context.get('ds') or date.today().isoformat(),
+                landing_file_prefix(self, context, self.shard),
+                log=self.log,
+            )
+        if self.mode == 'refresh':
+            row_count = self.refresh_videos(context, postgres_hook)
+            self.log.info(f"Successfully refreshed {row_count} YouTube videos.")
+            self.log_http_stats()
+            return
+
+        time_budget = TimeBudget(self.time_budget)
+
+        # A retry skips the songs that an earlier try already processed
+        checkpoint = None
+        processed = set()
+        if self.checkpoint_table:
+            checkpoint = CrawlCheckpoint(
+                postgres_hook, 'youtube', crawl_checkpoint_key(self, self.shard), self.checkpoint_table, log=self.log
+            )
+            processed = checkpoint.processed_codes()
 
-        # Step 1: Fetch songs from the source query
-        records = postgres_hook.get_records(self.source_query)
+        # Step 1: Fetch songs from the source query.
+        # With a daily budget, only take as many songs as the remaining quota can pay for,
+        # never-crawled songs first and then the stalest ones.
+        # Incremental runs only take the songs that are new, changed or due for a recrawl.
+        # When sharded, only the code range of this shard is read.
+        source_query = apply_code_shard(self.source_query, self.shard)
+        scheduler = None
+        crawl_state = None
+        # The crawl state is recorded on every run, so the next incremental run skips songs a full run just crawled
+        if self.crawl_state_table:
+            crawl_state = CrawlState(postgres_hook, 'youtube', self.crawl_state_table, log=self.log)
+        if self.daily_quota_units:
+            scheduler = QuotaBudgetScheduler(
+                postgres_hook,
+                source='youtube',
+                daily_budget_units=self.daily_quota_units,
+                usage_table=self.quota_usage_table,
+                log=self.log,
+            )
+            # Every shard keeps its own reservation row, all shards share the same daily budget
+            quota_run_id = crawl_run_id(self, context, self.shard)
+            records = crawl_state.select_songs(
+                source_query,
+                scheduler.remaining_units() // self.SEARCH_COST_UNITS,
+                incremental=self.incremental,
+                recrawl_after=self.recrawl_after,
+            )
+            records = [record for record in records if record[2] not in processed]
+            reserved_units = scheduler.reserve(quota_run_id, len(records) * self.SEARCH_COST_UNITS)
+            records = records[:reserved_units // self.SEARCH_COST_UNITS]
+        elif crawl_state:
+            records = crawl_state.select_songs(
+                source_query, incremental=self.incremental, recrawl_after=self.recrawl_after
+            )
+            records = [record for record in records if record[2] not in processed]
+        else:
+            records = postgres_hook.get_records(source_query)
+            if processed:
+                records = [record for record in records if record[2] not in processed]
+        if processed:
+            self.log.info(f"Resuming: {len(processed)} songs already processed.")
         self.log.info(f"Fetched {len(records)} songs.")
+        self.run_stats.add(rows_read=len(records))
 
-        # DataFrame to store the YouTube metadata to be inserted into the DB
-        all_data = []
+        track_codes = bool(crawl_state or checkpoint)
+        units_spent = 0
+        units_lock = threading.Lock()
 
-        # Step 2: Process each record and retrieve YouTube metadata
-        for record in records:
+        # Step 2: Search, clean and upsert run at the same time, connected by bounded queues:
+        # max_workers threads search songs, their videos are cleaned per micro-batch of checkpoint_every songs
+        # and upserted (and checkpointed) while the next searches are already running.
+        def search(record):
+            """Videos found for one song, None when it is skipped without a search."""
+            nonlocal units_spent
             self.log.info(f"Processing record: {record}")
             try:
                 song_title = record[0]  # Song title
                 artist_name = record[1]  # Artist name
+            except IndexError:
+                self.log.error(f"Error accessing record: {record}. Skipping this record.")
+                self.run_stats.add(rows_skipped=1)
+                return None
+            if not (song_title and artist_name):
+                self.run_stats.add(rows_skipped=1)
+                self.log.info(f"Skipping song with missing title or artist: {record}")
+                return None
 
-                if song_title and artist_name:
-                    query = f"{song_title} {artist_name} official"
-                    metadata = self.get_youtube_metadata(query)
-                    for video in metadata:
-                        # Clean and standardize data
-                        row = [
-                            self.clean_input(video['video_id']),
-                            self.clean_input(video['channel_id']),
-                            self.clean_input(video['video_title']),
-                            self.clean_input(video['channel_title']),
-                            pd.to_datetime('now'),  # added_at
-                            pd.to_datetime('now')   # updated_at
-                        ]
-                        # Add row to the list
-                        all_data.append(row)
+            query = f"{song_title} {artist_name} official"
 
+            def call_api():
+                nonlocal units_spent
+                with units_lock:
+                    units_spent += self.SEARCH_COST_UNITS  # A failed call is still charged
+                with self.run_stats.phase('fetch'):
+                    return self.search_videos(query)
+
+            try:
+                if self._cache:
+                    # Songs with the same normalized title and artist share one search, and one quota charge
+                    response = self._cache.get_or_fetch(
+                        'search?maxResults=1', f"{match_key(song_title)}|{match_key(artist_name)}", call_api
+                    )
                 else:
-                    self.log.info(f"Skipping song with missing title or artist: {record}")
+                    response = call_api()
+                return self.landed_videos('search', response)
+            except HttpError as e:
+                if self.is_quota_exceeded(e):
+                    self.log.warning("YouTube quota exceeded. Stopping and keeping the partial results.")
+                    raise StopStreaming()
+                raise
 
-            except IndexError:
-                self.log.error(f"Error accessing record: {record}. Skipping this record.")
-                continue
+        def budget_spent():
+            if time_budget.exhausted():
+                self.log.warning("Time budget spent. Stopping and keeping the partial results.")
+                return True
+            return False
 
-        # After gathering all data, convert it into a DataFrame
-        if all_data:
-            df = pd.DataFrame(all_data, columns=[
-                'video_id', 'channel_id', 'video_title', 'channel_title', 'added_at', 'updated_at'
+        def transform(batch):
+            # Raw values, cleaned column by column for the whole micro-batch
+            return self.transform_videos([
+                [video['video_id'], video['channel_id'], video['video_title'], video['channel_title']]
+                for record, metadata in batch
+                for video in metadata or []
             ])
 
-            # Step 3: Remove duplicates based on video_id and channel_id
-            df = df.drop_duplicates(subset=['video_id', 'channel_id'], keep='first')
+        def write(batch, df):
+            # Step 3: Upsert the micro-batch, then record its songs as crawled and processed
+            # code -> number of videos found, for the crawl state and checkpoint tables.
+            # Skipped songs are recorded too, so an incremental crawl does not select them again and again
+            result_counts = batch_result_counts(batch) if track_codes else {}
+            return self.flush(postgres_hook, df, result_counts, crawl_state, checkpoint)
 
-            # Step 4: Insert data into database
-            try:
-                postgres_hook.insert_rows(
-                    self.target_table,
-                    df.values.tolist(),  # Convert DataFrame to list format
-                    target_fields=df.columns.tolist()  # Columns for insertion
-                )
-                self.log.info("Successfully inserted all YouTube videos.")
-            except Exception as e:
-                self.log.error(f"Failed to insert YouTube videos: {e}")
+        pipeline = StreamingPipeline(
+            search,
+            transform,
+            write,
+            workers=self.max_workers,
+            batch_size=self.checkpoint_every,
+            queue_size=self.queue_size,
+            should_stop=budget_spent,
+            log=self.log,
+        )
+        if self.response_cache_path:
+            self._cache = ResponseCache(
+                self.response_cache_path,
+                'youtube',
+                self.response_cache_ttl,
+                max_entries=self.response_cache_max_entries,
+                log=self.log,
+            )
+        try:
+            row_count, completed = pipeline.run(records)
+        finally:
+            if self._cache:
+                self.close_response_cache()
+            self.run_stats.add(quota_units=units_spent)
+            if scheduler:
+                scheduler.settle(quota_run_id, reserved_units, units_spent)
+            # Responses already paid for are kept, even when the run fails
+            if self._landing:
+                self._landing.flush()
+
+        self.log.info(f"Successfully upserted {row_count} YouTube videos.")
+        self.log_http_stats()
+
+        if checkpoint and completed:
+            checkpoint.clear()
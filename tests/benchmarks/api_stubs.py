@@ -0,0 +1,255 @@
+"""
+Local stand-ins for the Spotify, YouTube Data and Google Sheets endpoints the operators call.
+
+One threaded HTTP/1.1 server answers every route, with a configurable per-request latency and a rate of
+``429 Too Many Requests`` responses (with ``Retry-After``). Search results are derived from the query text,
+so any catalog size works without preloading, and every track/video handed out is remembered so the
+refresh endpoints (``/v1/tracks``, ``/youtube/v3/videos``) can answer for it later.
+"""
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+
+# Host yang dialihkan ke stub oleh StubRedirectAdapter
+STUBBED_HOSTS = (
+    'api.spotify.com',
+    'accounts.spotify.com',
+    'youtube.googleapis.com',
+    'www.googleapis.com',
+    'docs.google.com',
+)
+
+
+def stable_id(text: str, length: int, base62: bool = False) -> str:
+    """Case-sensitive id derived from ``text``: base62 like Spotify ids, or with ``-`` and ``_`` like YouTube ids."""
+    encoded = base64.urlsafe_b64encode(hashlib.sha1(text.encode('utf-8')).digest()).decode()
+    if base62:
+        encoded = encoded.replace('-', 'x').replace('_', 'Y')
+    return encoded[:length]
+
+
+class ApiStubServer:
+    def __init__(self, catalog=None, latency: float = 0.0, throttle_rate: float = 0.0, retry_after: int = 1,
+                 search_results: int = 120, relevant_results: int = 20, change_rate: float = 0.05,
+                 gone_rate: float = 0.02, seed: int = 42):
+        self.catalog = catalog
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.search_results = search_results  # ``total`` hasil search Spotify per lagu
+        self.relevant_results = relevant_results  # Hasil awal yang artisnya cocok, sisanya artis lain
+        self.change_rate = change_rate  # Bagian track/video yang judulnya berubah saat di-refresh
+        self.gone_rate = gone_rate  # Bagian track/video yang hilang saat di-refresh
+        self.rng = random.Random(seed)
+
+        self.calls = Counter()  # path -> jumlah request
+        self.throttled = Counter()  # path -> jumlah response 429
+        self.tracks = {}
+        self.videos = {}
+        self._lock = threading.Lock()
+        self._sheet_csv = None
+        self._server = None
+
+    # -- lifecycle ---------------------------------------------------------------------------------------------
+
+    def start(self) -> 'ApiStubServer':
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, supaya connection pooling di client ikut terukur
+
+            def do_GET(self):
+                stub.handle(self, 'GET')
+
+            def do_POST(self):
+                stub.handle(self, 'POST')
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'calls': dict(self.calls), 'throttled': dict(self.throttled)}
+
+    # -- request handling --------------------------------------------------------------------------------------
+
+    def handle(self, request, method):
+        parts = urlsplit(request.path)
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        if method == 'POST':
+            # Body token request Spotify dibaca supaya koneksi keep-alive tetap bersih
+            request.rfile.read(int(request.headers.get('Content-Length') or 0))
+
+        with self._lock:
+            self.calls[parts.path] += 1
+            throttle = self.rng.random() < self.throttle_rate
+            if throttle:
+                self.throttled[parts.path] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttle:
+            return self.respond(request, 429, {'error': {'status': 429, 'message': 'rate limited'}},
+                                headers={'Retry-After': str(self.retry_after)})
+
+        route = self.route(parts.path.rstrip('/'))
+        if route is None:
+            return self.respond(request, 404, {'error': {'status': 404, 'message': parts.path}})
+        status, body, content_type = route(parts.path, params)
+        return self.respond(request, status, body, content_type=content_type)
+
+    def route(self, path):
+        if path == '/api/token':
+            return self.spotify_token
+        if path == '/v1/search':
+            return self.spotify_search
+        if path == '/v1/tracks':
+            return self.spotify_tracks
+        if path.endswith('/youtube/v3/search'):
+            return self.youtube_search
+        if path.endswith('/youtube/v3/videos'):
+            return self.youtube_videos
+        if re.match(r'^/spreadsheets/d/[^/]+/gviz/tq$', path):
+            return self.sheet_export
+        return None
+
+    @staticmethod
+    def respond(request, status, body, content_type='application/json', headers=None):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(payload)
+
+    # -- Spotify -----------------------------------------------------------------------------------------------
+
+    def spotify_token(self, path, params):
+        return 200, {'access_token': 'stub-token', 'token_type': 'Bearer', 'expires_in': 3600}, 'application/json'
+
+    def make_track(self, title, artist, query, index):
+        vocabulary = self.catalog.albums if self.catalog else ['album']
+        pick = int(hashlib.md5(f"{query}|{index}".encode('utf-8')).hexdigest(), 16)
+        if index >= self.relevant_results:
+            artist = f"other artist {pick % 997}"
+        name = title if index % 3 == 0 else f"{title} ({vocabulary[pick % len(vocabulary)]})"
+        track_id = stable_id(f"{query}|{index}", 22, base62=True)
+        return {
+            'id': track_id,
+            'name': name,
+            'artists': [{'name': artist}],
+            'album': {'name': vocabulary[pick % len(vocabulary)], 'release_date': f"{1990 + pick % 35}-01-01"},
+            'external_ids': {'isrc': f"ID{stable_id(track_id, 10).upper()}"},
+        }
+
+    def spotify_search(self, path, params):
+        query = params.get('q', '')
+        match = re.match(r'track:(.*) artist:(.*)', query)
+        title, artist = (match.group(1), match.group(2)) if match else (query, '')
+        limit, offset = int(params.get('limit', 10)), int(params.get('offset', 0))
+
+        items = [self.make_track(title, artist, query, index)
+                 for index in range(offset, min(offset + limit, self.search_results))]
+        with self._lock:
+            self.tracks.update((track['id'], track) for track in items)
+        return 200, {'tracks': {'items': items, 'total': self.search_results, 'limit': limit, 'offset': offset}}, \
+            'application/json'
+
+    def refreshed(self, item, rename):
+        """None if the item disappeared, otherwise the item, renamed for ``change_rate`` of the ids."""
+        pick = int(hashlib.md5(item['id'].encode('utf-8')).hexdigest(), 16) % 10000 / 10000
+        if pick < self.gone_rate:
+            return None
+        if pick < self.gone_rate + self.change_rate:
+            return rename(item)
+        return item
+
+    def spotify_tracks(self, path, params):
+        with self._lock:
+            tracks = [self.tracks.get(track_id) for track_id in params.get('ids', '').split(',') if track_id]
+        rename = lambda track: {**track, 'name': f"{track['name']} (remastered)"}
+        return 200, {'tracks': [self.refreshed(track, rename) if track else None for track in tracks]}, \
+            'application/json'
+
+    # -- YouTube -----------------------------------------------------------------------------------------------
+
+    def youtube_search(self, path, params):
+        query = params.get('q', '')
+        channels = self.catalog.channels if self.catalog else ['channel']
+        count = int(params.get('maxResults', 5))
+        items = []
+        for index in range(count):
+            video_id = stable_id(f"{query}|{index}", 11)
+            channel = channels[int(hashlib.md5(video_id.encode('utf-8')).hexdigest(), 16) % len(channels)]
+            items.append({
+                'kind': 'youtube#searchResult',
+                'id': {'kind': 'youtube#video', 'videoId': video_id},
+                'snippet': {
+                    'channelId': 'UC' + stable_id(channel, 22),
+                    'title': f"{query.removesuffix(' official')} (official music video)",
+                    'channelTitle': channel,
+                },
+            })
+        with self._lock:
+            self.videos.update((item['id']['videoId'], item) for item in items)
+        return 200, {'kind': 'youtube#searchListResponse', 'items': items}, 'application/json'
+
+    def youtube_videos(self, path, params):
+        with self._lock:
+            found = [self.videos.get(video_id) for video_id in params.get('id', '').split(',') if video_id]
+        rename = lambda item: {**item, 'snippet': {**item['snippet'], 'title': item['snippet']['title'] + ' (4k)'}}
+        items = []
+        for item in found:
+            item = self.refreshed({**item, 'id': item['id']['videoId']}, rename) if item else None
+            if item:
+                items.append(item)
+        return 200, {'kind': 'youtube#videoListResponse', 'items': items}, 'application/json'
+
+    # -- Google Sheets -----------------------------------------------------------------------------------------
+
+    def sheet_export(self, path, params):
+        if self._sheet_csv is None:
+            self._sheet_csv = self.catalog.sheet_csv()
+        return 200, self._sheet_csv, 'text/csv; charset=utf-8'
+
+
+class StubRedirectAdapter(HTTPAdapter):
+    """Send requests for the real API hosts to the stub server, keeping the wrapped adapter's retry and timeout."""
+
+    def __init__(self, stub_url: str, adapter: HTTPAdapter):
+        super().__init__()
+        self.stub_url = stub_url
+        self.adapter = adapter
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        if parts.hostname in STUBBED_HOSTS:
+            request.url = f"{self.stub_url}{parts.path}" + (f"?{parts.query}" if parts.query else '')
+        return self.adapter.send(request, **kwargs)
+
+    def close(self):
+        self.adapter.close()
@@ -0,0 +1,75 @@
+"""
+Synthetic song catalog for the benchmarks, seeded from the SQL dumps in the repository root.
+
+The real ``m_songs.sql`` rows come first. Beyond that, songs are generated by pairing seed artists with seed
+titles and a variant word, so a catalog of any size keeps the same character mix (non-Latin titles,
+punctuation, 'unknown' artists) as production data.
+"""
+
+from io import StringIO
+from pathlib import Path
+import csv
+import random
+import re
+import sqlite3
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+SEED_TABLES = {
+    'm_songs': 'code, original_artist, song_title',
+    'library_music_spotify': 'isrc, spotify_track_id, track_name, artist_name, album_name, release_date, '
+                             'added_at, updated_at',
+    'library_music_youtube': 'video_id, channel_id, video_title, channel_title, added_at, updated_at',
+}
+
+
+def load_seed_tables(repo_root: Path = REPO_ROOT) -> sqlite3.Connection:
+    """Load the ``INSERT`` dumps into an in-memory SQLite database, without the ``demo_music`` schema."""
+    conn = sqlite3.connect(':memory:')
+    for table, columns in SEED_TABLES.items():
+        conn.execute(f"CREATE TABLE {table} ({columns})")
+        dump = (repo_root / f'{table}.sql').read_text(encoding='utf-8')
+        conn.executescript(dump.replace('demo_music.', ''))
+    return conn
+
+
+class SyntheticCatalog:
+    """Deterministic catalog of ``song_count`` songs plus the vocabulary the API stand-ins answer with."""
+
+    def __init__(self, song_count: int, seed: int = 42, repo_root: Path = REPO_ROOT):
+        self.song_count = song_count
+        self.seed = seed
+
+        conn = load_seed_tables(repo_root)
+        self.seed_songs = conn.execute(
+            "SELECT code, original_artist, song_title FROM m_songs ORDER BY code"
+        ).fetchall()
+        self.artists = sorted({row[1] for row in self.seed_songs if row[1] != 'unknown'})
+        self.titles = sorted({row[2] for row in self.seed_songs})
+        self.albums = [row[0] for row in conn.execute("SELECT DISTINCT album_name FROM library_music_spotify")]
+        self.channels = [row[0] for row in conn.execute("SELECT DISTINCT channel_title FROM library_music_youtube")]
+        self.unknown_ratio = sum(row[1] == 'unknown' for row in self.seed_songs) / len(self.seed_songs)
+        # Kata variasi diambil dari nama album di dump Spotify
+        self.variant_words = sorted({
+            word for album in self.albums for word in re.findall(r'\w+', album) if len(word) > 2
+        }) or ['live']
+
+    def songs(self):
+        """Yield ``(code, original_artist, song_title)``; the seed songs first, then generated ones."""
+        rng = random.Random(self.seed)
+        for code, artist, title in self.seed_songs[:self.song_count]:
+            yield code, artist, title
+
+        next_code = max(row[0] for row in self.seed_songs) + 1
+        for offset in range(self.song_count - len(self.seed_songs)):
+            artist = 'unknown' if rng.random() < self.unknown_ratio else rng.choice(self.artists)
+            title = f"{rng.choice(self.titles)} {rng.choice(self.variant_words)}"
+            yield next_code + offset, artist, title
+
+    def sheet_csv(self) -> bytes:
+        """The catalog as the CSV export of the master song sheet."""
+        buffer = StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        writer.writerow(['CODE', 'ORIGINAL ARTIST', 'SONG TITLE'])
+        writer.writerows(self.songs())
+        return buffer.getvalue().encode('utf-8')
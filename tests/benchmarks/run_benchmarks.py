@@ -0,0 +1,285 @@
+"""
+End-to-end benchmark of the custom operators against a local Postgres and the API stand-ins.
+
+Every case runs the real operator in a forked child process, so its peak RSS is measured on its own,
+and appends one JSON line to the results file:
+
+    python -m tests.benchmarks.run_benchmarks --conn-id benchmark_postgres --songs 100000 --reset
+
+``--conn-id`` must point at a throwaway database (e.g. ``AIRFLOW_CONN_BENCHMARK_POSTGRES``): with ``--reset``
+the ``demo_music`` schema is dropped and recreated from ``DDL.txt``.
+"""
+
+from datetime import datetime, timezone
+import argparse
+import json
+import logging
+import multiprocessing
+import resource
+import subprocess
+import sys
+import time
+
+from tests.benchmarks.api_stubs import ApiStubServer, StubRedirectAdapter
+from tests.benchmarks.catalog import REPO_ROOT, SyntheticCatalog
+
+CASES = (
+    'sheet',
+    'spotify_search',
+    'spotify_refresh',
+    'youtube_search',
+    'youtube_refresh',
+    'warehouse_sql',
+    'warehouse_partition_swap',
+    'warehouse_aho_corasick',
+    'song_media_summary',
+)
+
+
+def crawl_query(args) -> str:
+    return (
+        "SELECT song_title, original_artist, code FROM demo_music.m_songs "
+        f"WHERE original_artist != 'unknown' ORDER BY code LIMIT {int(args.crawl_songs)}"
+    )
+
+
+def build_case(case: str, args):
+    """Return ``(operator, target_table)`` configured like the production DAG."""
+    from plugins.custom_operator.google_sheet_to_postgresql import GoogleSheetToPostgresOperator
+    from plugins.custom_operator.media_warehouse_matcher import MediaWarehouseMatcherOperator
+    from plugins.custom_operator.mysql_to_postgres import MySqlToPostgresOperator
+    from plugins.custom_operator.song_media_summary import SongMediaSummaryOperator
+    from plugins.custom_operator.spotify_crawler import SpotifyMetadataExtractorOperator
+    from plugins.custom_operator.youtube_crawler import YouTubeMetadataExtractorOperator
+
+    if case == 'sheet':
+        return GoogleSheetToPostgresOperator(
+            task_id='benchmark_sheet',
+            google_sheet_id='benchmark',
+            sheet_name='DATA',
+            postgres_conn_id=args.conn_id,
+            target_table='demo_music.m_songs',
+            column_mapping={'CODE': 'code', 'ORIGINAL ARTIST': 'original_artist', 'SONG TITLE': 'song_title'},
+            identifier=['code'],
+            updated_at_column='updated_at',
+            content_hash_column='content_hash',
+            sync_state_table='demo_music.sheet_sync_state',
+            match_key_columns={'match_artist': 'original_artist', 'match_title': 'song_title'},
+        ), 'demo_music.m_songs'
+
+    if case.startswith('spotify_'):
+        return SpotifyMetadataExtractorOperator(
+            task_id=f'benchmark_{case}',
+            postgres_conn_id=args.conn_id,
+            source_query=crawl_query(args),
+            target_table='demo_music.library_music_spotify',
+            client_id='benchmark',
+            client_secret='benchmark',
+            token_cache_key=None,
+            max_workers=8,
+            page_workers=4,
+            max_pages=5,
+            relevance_cutoff=True,
+            mode='refresh' if case == 'spotify_refresh' else 'search',
+            refresh_limit=args.refresh_limit,
+            response_cache_path=args.response_cache,
+            incremental=args.incremental,
+        ), 'demo_music.library_music_spotify'
+
+    if case.startswith('youtube_'):
+        return YouTubeMetadataExtractorOperator(
+            task_id=f'benchmark_{case}',
+            postgres_conn_id=args.conn_id,
+            source_query=crawl_query(args),
+            target_table='demo_music.library_music_youtube',
+            api_key='benchmark',
+            mode='refresh' if case == 'youtube_refresh' else 'search',
+            refresh_limit=args.refresh_limit,
+            response_cache_path=args.response_cache,
+            incremental=args.incremental,
+        ), 'demo_music.library_music_youtube'
+
+    if case in ('warehouse_sql', 'warehouse_partition_swap'):
+        return MySqlToPostgresOperator(
+            task_id=f'benchmark_{case}',
+            query=(REPO_ROOT / 'dags' / 'sql' / 'load_media_warehouse_raw.sql').read_text(),
+            postgres_conn_target=args.conn_id,
+            postgres_conn=args.conn_id,
+            db_query_from='postgres',
+            target_table='demo_music.media_warehouse_raw',
+            identifier=['code', 'video_id', 'spotify_track_id'],
+            replace=True,
+            updated_at_column='updated_at',
+            added_at_column='added_at',
+            batch_size=10000,
+            partition_swap=case == 'warehouse_partition_swap',
+        ), 'demo_music.media_warehouse_raw'
+
+    if case == 'warehouse_aho_corasick':
+        return MediaWarehouseMatcherOperator(
+            task_id='benchmark_warehouse_aho_corasick',
+            postgres_conn_id=args.conn_id,
+            partition_swap=True,
+            added_at_column='added_at',
+        ), 'demo_music.media_warehouse_raw'
+
+    if case == 'song_media_summary':
+        return SongMediaSummaryOperator(
+            task_id='benchmark_song_media_summary',
+            postgres_conn_id=args.conn_id,
+        ), 'demo_music.song_media_summary'
+
+    raise ValueError(f"Unknown benchmark case {case!r}")
+
+
+def redirect_sessions_to(stub_url: str) -> None:
+    """Make every session built by the operators send the real API hosts to the stub server."""
+    from plugins.custom_operator import http_transport
+
+    build_http_session = http_transport.build_http_session
+
+    def build_stubbed_session(*args, **kwargs):
+        session = build_http_session(*args, **kwargs)
+        session.mount('https://', StubRedirectAdapter(stub_url, session.get_adapter('https://')))
+        return session
+
+    http_transport.build_http_session = build_stubbed_session
+
+
+def rows_written_since(postgres_hook, table: str, start_xid: int) -> int:
+    """Rows of ``table`` inserted or updated by transactions that started after ``start_xid``."""
+    conn = postgres_hook.get_conn()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT txid_current()")
+        current_xid = cursor.fetchone()[0]
+        # age(xmin) dihitung dari transaksi ini, baris lama (dan yang sudah di-freeze) punya age lebih besar
+        cursor.execute(f"SELECT count(*) FROM {table} WHERE age(xmin) <= %s", (current_xid - start_xid,))
+        return cursor.fetchone()[0]
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def run_case(case: str, args, stub_url: str, results) -> None:
+    """Child process body: run one operator and send its measurements back."""
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+
+    redirect_sessions_to(stub_url)
+    postgres_hook = PostgresHook(args.conn_id)
+    operator, table = build_case(case, args)
+    if table == 'demo_music.media_warehouse_raw':
+        # Kedua engine warehouse diukur dari tabel kosong
+        postgres_hook.run(f"TRUNCATE {table}")
+
+    start_xid = postgres_hook.get_first("SELECT txid_current()")[0]
+    rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    operator.execute({'run_id': f'benchmark_{case}'})
+    wall_seconds = time.perf_counter() - started
+
+    results.send({
+        'wall_seconds': wall_seconds,
+        'rows_written': rows_written_since(postgres_hook, table, start_xid),
+        'table_rows': postgres_hook.get_first(f"SELECT count(*) FROM {table}")[0],
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'rss_start_mb': rss_start / 1024,
+    })
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def reset_schema(conn_id: str) -> None:
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+
+    ddl = (REPO_ROOT / 'DDL.txt').read_text()
+    PostgresHook(conn_id).run(f"DROP SCHEMA IF EXISTS demo_music CASCADE; CREATE SCHEMA demo_music;\n{ddl}")
+
+
+def benchmark(args) -> list:
+    if not args.verbose:
+        # Termasuk warning "execute cannot be called outside TaskInstance"
+        logging.disable(logging.WARNING)
+    catalog = SyntheticCatalog(args.songs, seed=args.seed)
+    stub = ApiStubServer(catalog, latency=args.latency, throttle_rate=args.throttle_rate, seed=args.seed).start()
+    if args.reset:
+        reset_schema(args.conn_id)
+
+    context = multiprocessing.get_context('fork')
+    reports = []
+    try:
+        for case in args.cases:
+            calls_before = stub.snapshot()
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=run_case, args=(case, args, stub.url, sender))
+            process.start()
+            sender.close()
+            measurement = receiver.recv() if receiver.poll(args.timeout) else None
+            process.join()
+            if measurement is None or process.exitcode != 0:
+                raise RuntimeError(f"Benchmark case {case!r} failed (exit code {process.exitcode})")
+
+            calls_after = stub.snapshot()
+            api_calls = {
+                path: count - calls_before['calls'].get(path, 0)
+                for path, count in calls_after['calls'].items() if count != calls_before['calls'].get(path, 0)
+            }
+            throttled = sum(calls_after['throttled'].values()) - sum(calls_before['throttled'].values())
+            report = {
+                'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'git_commit': git_commit(),
+                'case': case,
+                'songs': args.songs,
+                'crawl_songs': args.crawl_songs,
+                'latency': args.latency,
+                'throttle_rate': args.throttle_rate,
+                'response_cache': bool(args.response_cache),
+                'incremental': args.incremental,
+                **measurement,
+                'rows_per_second': measurement['rows_written'] / measurement['wall_seconds'],
+                'api_calls': api_calls,
+                'api_throttled': throttled,
+            }
+            reports.append(report)
+            print(
+                f"{case:<24} {report['wall_seconds']:8.2f}s {report['rows_written']:>9} rows "
+                f"{report['rows_per_second']:>10.0f} rows/s {sum(api_calls.values()):>7} calls "
+                f"{throttled:>5} throttled {report['peak_rss_mb']:8.0f} MB peak RSS",
+                flush=True,
+            )
+            with open(args.output, 'a', encoding='utf-8') as output:
+                output.write(json.dumps(report, default=str) + '\n')
+    finally:
+        stub.stop()
+    return reports
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conn-id', default='benchmark_postgres', help='Airflow connection of the benchmark database')
+    parser.add_argument('--songs', type=int, default=10000, help='Catalog size (10k to 1M)')
+    parser.add_argument('--crawl-songs', type=int, default=1000, help='Songs the crawler cases search for')
+    parser.add_argument('--refresh-limit', type=int, default=5000, help='Tracks/videos per refresh case')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds added to every stub API response')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of stub API calls answered with 429')
+    parser.add_argument('--cases', type=lambda value: value.split(','), default=list(CASES),
+                        help=f"Comma separated subset of: {','.join(CASES)}")
+    parser.add_argument('--response-cache', help='SQLite response cache of the crawler cases, off by default')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Crawler cases only search songs that are new or changed since their last crawl')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--timeout', type=float, default=3600, help='Seconds before a case is considered hung')
+    parser.add_argument('--output', default=str(REPO_ROOT / 'tests' / 'benchmarks' / 'results.jsonl'))
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate the demo_music schema first')
+    parser.add_argument('--verbose', action='store_true', help='Keep the operator logs')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    benchmark(parse_args())
+    sys.exit(0)
@@ -0,0 +1,58 @@
+"""Smoke test of the benchmark stand-ins: catalog generation and the stubbed Spotify/YouTube round trips."""
+
+import csv
+import io
+
+import pytest
+
+from plugins.custom_operator.http_transport import build_http_session
+from tests.benchmarks.api_stubs import ApiStubServer, StubRedirectAdapter
+from tests.benchmarks.catalog import SyntheticCatalog
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    return SyntheticCatalog(1500)
+
+
+@pytest.fixture
+def session(catalog):
+    stub = ApiStubServer(catalog, change_rate=0.0, gone_rate=0.0).start()
+    session = build_http_session(backoff_factor=0.01)
+    session.mount('https://', StubRedirectAdapter(stub.url, session.get_adapter('https://')))
+    yield session, stub
+    stub.stop()
+
+
+def test_catalog_scales_past_the_seed_songs(catalog):
+    songs = list(catalog.songs())
+    assert len(songs) == 1500
+    assert len({song[0] for song in songs}) == 1500
+    assert songs == list(SyntheticCatalog(1500).songs())
+
+    rows = list(csv.reader(io.StringIO(catalog.sheet_csv().decode('utf-8'))))
+    assert rows[0] == ['CODE', 'ORIGINAL ARTIST', 'SONG TITLE']
+    assert len(rows) == 1501
+
+
+def test_search_results_can_be_refreshed(session):
+    session, stub = session
+    page = session.get('https://api.spotify.com/v1/search', params={
+        'q': 'track:lagu wanita artist:naif', 'type': 'track', 'limit': 50, 'offset': 100,
+    }).json()['tracks']
+    assert (page['total'], len(page['items'])) == (120, 20)
+
+    track_ids = [track['id'] for track in page['items']]
+    tracks = session.get('https://api.spotify.com/v1/tracks/', params={'ids': ','.join(track_ids)}).json()['tracks']
+    assert [track['id'] for track in tracks] == track_ids
+
+    video = session.get('https://youtube.googleapis.com/youtube/v3/search', params={
+        'q': 'lagu wanita naif official', 'maxResults': 1,
+    }).json()['items'][0]
+    videos = session.get('https://youtube.googleapis.com/youtube/v3/videos', params={
+        'id': video['id']['videoId'] + ',unknownId',
+    }).json()['items']
+    assert [item['id'] for item in videos] == [video['id']['videoId']]
+    assert stub.snapshot()['calls'] == {
+        '/v1/search': 1, '/v1/tracks/': 1, '/youtube/v3/search': 1, '/youtube/v3/videos': 1,
+    }
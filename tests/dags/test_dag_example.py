@@ -1,5 +1,6 @@
 """Example DAGs test. This test ensures that all Dags have tags, retries set to two, and no import errors. This is an example pytest and may not be fit the context of your DAGs. Feel free to add and remove tests."""
 
+import copy
 import os
 import logging
 from contextlib import contextmanager
@@ -81,3 +82,15 @@ def test_dag_retries(dag_id, dag, fileloc):
     assert (
         dag.default_args.get("retries", None) >= 2
     ), f"{dag_id} in {fileloc} must have task retries >= 2."
+
+
+@pytest.mark.parametrize(
+    "dag_id,dag,fileloc", get_dags(), ids=[x[2] for x in get_dags()]
+)
+def test_dag_tasks_can_be_copied(dag_id, dag, fileloc):
+    """
+    test if every task can be deep copied, as Clear with upstream/downstream and `airflow tasks clear` do
+    """
+    for task in dag.tasks:
+        copy.deepcopy(task)
+    dag.partial_subset(task_ids_or_regex=[task.task_id for task in dag.tasks], include_upstream=True)
@@ -0,0 +1,31 @@
+"""Check that code shards split a source query into disjoint ranges that cover every song."""
+
+import sqlite3
+
+from plugins.custom_operator.code_shard_planner import apply_code_shard
+
+SOURCE_QUERY = "SELECT song_title, original_artist, code FROM m_songs WHERE original_artist != 'unknown'; "
+
+SHARDS = [
+    {"index": 0, "code_from": None, "code_to": 10},
+    {"index": 1, "code_from": 10, "code_to": 20},
+    {"index": 2, "code_from": 20, "code_to": None},
+]
+
+
+def test_shards_cover_every_code_exactly_once():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE m_songs (code int, original_artist text, song_title text)")
+    conn.executemany(
+        "INSERT INTO m_songs VALUES (?, ?, ?)",
+        [(code, "unknown" if code % 7 == 0 else f"artist {code}", f"song {code}") for code in range(-5, 30)],
+    )
+
+    expected = sorted(row[2] for row in conn.execute(SOURCE_QUERY))
+    sharded = sorted(row[2] for shard in SHARDS for row in conn.execute(apply_code_shard(SOURCE_QUERY, shard)))
+    assert sharded == expected
+
+
+def test_without_shard_the_query_is_unchanged():
+    assert apply_code_shard(SOURCE_QUERY, None) == SOURCE_QUERY
+    assert apply_code_shard(SOURCE_QUERY, {"index": 0, "code_from": None, "code_to": None}) == SOURCE_QUERY
@@ -0,0 +1,36 @@
+"""Check that a crawl checkpoint survives into the next DAG run and that old checkpoints expire."""
+
+from types import SimpleNamespace
+
+from plugins.custom_operator.crawl_checkpoint import CrawlCheckpoint, crawl_checkpoint_key, crawl_run_id
+
+
+class FakeHook:
+    def __init__(self):
+        self.statements = []
+
+    def run(self, sql, parameters=None):
+        self.statements.append((' '.join(sql.split()), parameters))
+
+    def get_records(self, sql, parameters=None):
+        self.statements.append((' '.join(sql.split()), parameters))
+        return [(1,), (2,)]
+
+
+def test_checkpoint_key_does_not_depend_on_the_dag_run():
+    task = SimpleNamespace(dag_id='etl_music', task_id='get_music_from_spotify_api_raw')
+    shard = {'index': 3}
+    assert crawl_checkpoint_key(task, shard) == 'etl_music.get_music_from_spotify_api_raw.shard3'
+    # Kuota tetap dicatat per DAG run
+    assert crawl_run_id(task, {'run_id': 'scheduled__1'}, shard) != crawl_run_id(task, {'run_id': 'manual__2'}, shard)
+
+
+def test_old_checkpoints_are_expired_before_resuming():
+    hook = FakeHook()
+    checkpoint = CrawlCheckpoint(hook, 'spotify', 'etl_music.get_music_from_spotify_api_raw')
+
+    assert checkpoint.processed_codes() == {1, 2}
+    (expire, expire_parameters), (select, parameters) = hook.statements
+    assert expire.startswith('DELETE FROM demo_music.crawl_checkpoint WHERE source = %s AND processed_at <')
+    assert expire_parameters == ('spotify', checkpoint.max_age)
+    assert parameters == ('spotify', 'etl_music.get_music_from_spotify_api_raw')
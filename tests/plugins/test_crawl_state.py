@@ -0,0 +1,65 @@
+"""Check which songs an incremental crawl selects and what it records about them afterwards."""
+
+from datetime import timedelta
+
+from plugins.custom_operator import crawl_state
+from plugins.custom_operator.crawl_state import CrawlState, batch_result_counts
+
+
+class FakeHook:
+    def __init__(self, records):
+        self.records = records
+        self.queries = []
+
+    def get_records(self, sql, parameters=None):
+        self.queries.append((sql, parameters))
+        return self.records
+
+
+def test_only_due_songs_are_selected_and_hashes_are_not_returned():
+    hook = FakeHook([('Lagu Wanita', 'Naif', 1, -46925), ('Kangen', 'Dewa 19', 2, 31794)])
+    state = CrawlState(hook, 'spotify', 'demo_music.crawl_state')
+
+    records = state.select_songs(
+        'SELECT song_title, original_artist, code FROM m;', incremental=True, recrawl_after=timedelta(days=30)
+    )
+    assert records == [('Lagu Wanita', 'Naif', 1), ('Kangen', 'Dewa 19', 2)]
+    sql, parameters = hook.queries[0]
+    assert 'cs.code IS NULL' in sql and 'cs.content_hash <>' in sql and '%(stale_before)s' in sql
+    assert 'LIMIT' not in sql and parameters['source'] == 'spotify'
+
+    # Tanpa incremental semua lagu diambil, hanya diurutkan (dan dibatasi) untuk kuota
+    state.select_songs('SELECT song_title, original_artist, code FROM m', limit=10)
+    sql, parameters = hook.queries[1]
+    assert 'WHERE' not in sql and parameters['limit'] == 10
+    assert state.select_songs('SELECT 1', limit=0) == [] and len(hook.queries) == 2
+
+
+def test_crawled_songs_keep_the_hash_they_were_selected_with(monkeypatch):
+    upserts = []
+    monkeypatch.setattr(crawl_state, 'bulk_upsert', lambda hook, table, fields, rows, **kwargs: upserts.append(
+        [dict(zip(fields, row)) for row in rows]
+    ))
+    state = CrawlState(FakeHook([('Lagu Wanita', 'Naif', 1, -46925)]), 'youtube')
+    state.select_songs('SELECT song_title, original_artist, code FROM m', incremental=True)
+    state.mark_crawled({1: 3})
+    state.mark_crawled({})
+
+    row, = upserts[0]
+    assert (row['source'], row['code'], row['result_count'], row['content_hash']) == ('youtube', 1, 3, -46925)
+    assert len(upserts) == 1
+
+
+def test_skipped_songs_are_recorded_without_a_result_count():
+    batch = [(('Lagu Wanita', 'Naif', 1), [{}, {}]), ((None, 'Naif', 2), None), (('Kangen',), None)]
+    assert batch_result_counts(batch) == {1: 2, 2: None}
+
+
+def test_literal_percent_in_the_source_query_is_escaped():
+    hook = FakeHook([])
+    CrawlState(hook, 'spotify').select_songs("SELECT song_title, original_artist, code FROM m WHERE code LIKE 'a%'")
+
+    sql, parameters = hook.queries[0]
+    assert "LIKE 'a%%'" in sql
+    # psycopg2 mengembalikan %% menjadi % saat parameter diisi
+    assert "LIKE 'a%'" in sql % {key: '' for key in parameters}
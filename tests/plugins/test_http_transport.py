@@ -0,0 +1,76 @@
+"""Check retries with Retry-After, per-endpoint counters and the googleapiclient adapter against a local server."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+import pytest
+
+from plugins.custom_operator.http_transport import RequestsHttp, build_http_session
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Path -> jumlah response 429 sebelum berhasil
+    throttle = {}
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if self.throttle.get(path, 0) > 0:
+            self.throttle[path] -= 1
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        if path.endswith('/gone'):
+            body = json.dumps({'error': {'code': 403, 'message': 'quotaExceeded', 'errors': []}}).encode()
+            self.send_response(403)
+        else:
+            body = json.dumps({'items': [{'id': 'aB_1-x'}]}).encode()
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_retries_throttled_requests_and_counts_them(server):
+    Handler.throttle = {'/v1/search': 2}
+    session = build_http_session(backoff_factor=0.01)
+
+    response = session.get(f"{server}/v1/search?q=naif")
+
+    assert response.status_code == 200
+    counters = session.call_stats.endpoints['127.0.0.1/v1/search']
+    assert (counters['requests'], counters['retries'], counters['throttled']) == (1, 2, 2)
+
+
+def test_gives_up_with_the_last_response(server):
+    Handler.throttle = {'/v1/search': 10}
+    session = build_http_session(retries=1, backoff_factor=0.01)
+
+    assert session.get(f"{server}/v1/search").status_code == 429
+
+
+def test_requests_http_adapter(server):
+    Handler.throttle = {'/youtube/v3/videos': 1}
+    http = RequestsHttp(build_http_session(backoff_factor=0.01))
+
+    response, content = http.request(f"{server}/youtube/v3/videos?id=aB_1-x")
+    assert response.status == 200
+    assert json.loads(content) == {'items': [{'id': 'aB_1-x'}]}
+
+    response, content = http.request(f"{server}/youtube/v3/gone")
+    assert response.status == 403
+    assert b'quotaExceeded' in content
@@ -0,0 +1,99 @@
+"""Check that a rerun of the Aho-Corasick warehouse engine updates and removes rows, against Postgres."""
+
+import os
+
+import pytest
+
+from plugins.custom_operator.media_warehouse_matcher import MediaWarehouseMatcherOperator
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("AIRFLOW_CONN_BENCHMARK_POSTGRES"), reason="needs the benchmark Postgres database"
+)
+
+TABLES = """
+DROP SCHEMA IF EXISTS test_matcher CASCADE;
+CREATE SCHEMA test_matcher;
+CREATE TABLE test_matcher.m_songs (
+    code int4, original_artist text, song_title text, match_artist text, match_title text
+);
+CREATE TABLE test_matcher.library_music_spotify (
+    isrc text, spotify_track_id text, track_name text, album_name text, release_date date,
+    match_artist text, match_title text
+);
+CREATE TABLE test_matcher.library_music_youtube (
+    video_id text, channel_id text, video_title text, channel_title text, match_title text
+);
+CREATE TABLE test_matcher.media_warehouse_raw (
+    code int4 NOT NULL, video_id text NOT NULL, channel_id text, video_title text, channel_title text, isrc text,
+    spotify_track_id text NOT NULL, spotify_track_name text, spotify_album text, spotify_release_date date,
+    original_artist text, song_title text,
+    added_at timestamp DEFAULT CURRENT_TIMESTAMP, updated_at timestamp DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (code, video_id, spotify_track_id)
+) PARTITION BY HASH (code);
+CREATE TABLE test_matcher.media_warehouse_raw_p0 PARTITION OF test_matcher.media_warehouse_raw
+    FOR VALUES WITH (modulus 2, remainder 0);
+CREATE TABLE test_matcher.media_warehouse_raw_p1 PARTITION OF test_matcher.media_warehouse_raw
+    FOR VALUES WITH (modulus 2, remainder 1);
+INSERT INTO test_matcher.m_songs VALUES (1, 'naif', 'lagu wanita', 'naif', 'lagu wanita'),
+    (2, 'dewa 19', 'kangen', 'dewa 19', 'kangen');
+INSERT INTO test_matcher.library_music_spotify VALUES
+    ('id1', 't1', 'lagu wanita', 'album', NULL, 'naif', 'lagu wanita'),
+    ('id2', 't2', 'kangen', 'album', NULL, 'dewa 19', 'kangen');
+INSERT INTO test_matcher.library_music_youtube VALUES
+    ('v1', 'c1', 'naif lagu wanita official', 'naif', 'naif lagu wanita official'),
+    ('v2', 'c2', 'dewa 19 kangen official', 'dewa', 'dewa 19 kangen official');
+"""
+
+
+@pytest.fixture
+def hook():
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+
+    hook = PostgresHook("benchmark_postgres")
+    hook.run(TABLES)
+    yield hook
+    hook.run("DROP SCHEMA test_matcher CASCADE")
+
+
+def run_matcher(**kwargs):
+    operator = MediaWarehouseMatcherOperator(
+        task_id="load_to_media_warehouse",
+        postgres_conn_id="benchmark_postgres",
+        target_table="test_matcher.media_warehouse_raw",
+        songs_table="test_matcher.m_songs",
+        spotify_table="test_matcher.library_music_spotify",
+        youtube_table="test_matcher.library_music_youtube",
+        **kwargs,
+    )
+    operator.execute({})
+
+
+def warehouse(hook):
+    return {
+        code: (video_title, added_at, updated_at) for code, video_title, added_at, updated_at in hook.get_records(
+            "SELECT code, video_title, added_at, updated_at FROM test_matcher.media_warehouse_raw"
+        )
+    }
+
+
+def test_upsert_updates_changed_rows_only(hook):
+    run_matcher(replace=True, updated_at_column="updated_at")
+    first = warehouse(hook)
+    hook.run(
+        "UPDATE test_matcher.library_music_youtube SET video_title = 'naif lagu wanita (live)' WHERE video_id = 'v1'"
+    )
+    run_matcher(replace=True, updated_at_column="updated_at")
+
+    rows = warehouse(hook)
+    assert rows[1][0] == "naif lagu wanita (live)" and rows[1][2] > first[1][2]
+    assert rows[2] == first[2]
+
+
+def test_partition_swap_removes_stale_rows_and_keeps_added_at(hook):
+    run_matcher(partition_swap=True, added_at_column="added_at")
+    first = warehouse(hook)
+    hook.run("DELETE FROM test_matcher.m_songs WHERE code = 2")
+    run_matcher(partition_swap=True, added_at_column="added_at")
+
+    rows = warehouse(hook)
+    assert list(rows) == [1] and rows[1][1] == first[1][1]
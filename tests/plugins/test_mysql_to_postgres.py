@@ -0,0 +1,135 @@
+"""Check when MySqlToPostgresOperator runs its incremental query and with which watermarks."""
+
+from datetime import datetime, timedelta
+import os
+
+import pytest
+
+from plugins.custom_operator.mysql_to_postgres import MySqlToPostgresOperator
+
+TABLES = ["demo_music.m_songs", "demo_music.library_music_spotify"]
+
+
+def make_operator(**kwargs):
+    return MySqlToPostgresOperator(
+        task_id="load_to_media_warehouse",
+        query="SELECT 1",
+        incremental_query="SELECT 1 WHERE %(m_songs)s < %(library_music_spotify)s",
+        watermark_tables=TABLES,
+        **kwargs,
+    )
+
+
+def test_first_run_is_a_full_refresh():
+    assert make_operator().plan_incremental({}) is None
+    assert make_operator().plan_incremental({TABLES[0]: (datetime(2024, 1, 1), datetime.now())}) is None
+
+
+def test_incremental_parameters_come_from_stored_watermarks():
+    stored = {
+        TABLES[0]: (datetime(2024, 1, 1), datetime.now()),
+        TABLES[1]: (None, datetime.now()),  # tabel masih kosong saat run sebelumnya
+    }
+    assert make_operator().plan_incremental(stored) == {
+        "m_songs": datetime(2024, 1, 1),
+        "library_music_spotify": datetime.min,
+    }
+
+
+def test_full_refresh_interval_forces_a_full_refresh():
+    operator = make_operator(full_refresh_interval=timedelta(days=7))
+    recent = {table: (datetime(2024, 1, 1), datetime.now() - timedelta(days=1)) for table in TABLES}
+    stale = {table: (datetime(2024, 1, 1), datetime.now() - timedelta(days=8)) for table in TABLES}
+    assert operator.plan_incremental(recent) is not None
+    assert operator.plan_incremental(stale) is None
+
+
+@pytest.mark.skipif(
+    not os.environ.get("AIRFLOW_CONN_BENCHMARK_POSTGRES"), reason="needs the benchmark Postgres database"
+)
+@pytest.mark.parametrize("pushdown", [True, False])
+def test_updated_source_row_changes_the_warehouse_row(pushdown):
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+
+    hook = PostgresHook("benchmark_postgres")
+    hook.run(
+        """
+        DROP SCHEMA IF EXISTS test_mysql_to_postgres CASCADE;
+        CREATE SCHEMA test_mysql_to_postgres;
+        CREATE TABLE test_mysql_to_postgres.songs (code int4 PRIMARY KEY, song_title text);
+        CREATE TABLE test_mysql_to_postgres.warehouse (
+            code int4 PRIMARY KEY, song_title text, updated_at timestamp DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT INTO test_mysql_to_postgres.songs VALUES (1, 'lagu wanita'), (2, 'kangen');
+        """
+    )
+    operator = MySqlToPostgresOperator(
+        task_id="load_to_media_warehouse",
+        query="SELECT code, song_title FROM test_mysql_to_postgres.songs",
+        postgres_conn="benchmark_postgres",
+        db_query_from="postgres",
+        target_table="test_mysql_to_postgres.warehouse",
+        identifier=["code"],
+        replace=True,
+        updated_at_column="updated_at",
+        pushdown=pushdown,
+        batch_size=None if pushdown else 1,
+    )
+    try:
+        operator.execute({})
+        first = dict(hook.get_records("SELECT code, updated_at FROM test_mysql_to_postgres.warehouse"))
+        hook.run("UPDATE test_mysql_to_postgres.songs SET song_title = 'kangen (live)' WHERE code = 2")
+        operator.execute({})
+
+        rows = {code: (title, updated_at) for code, title, updated_at in hook.get_records(
+            "SELECT code, song_title, updated_at FROM test_mysql_to_postgres.warehouse"
+        )}
+        assert rows[2][0] == "kangen (live)" and rows[2][1] > first[2]
+        # Baris yang tidak berubah tidak ditulis ulang
+        assert rows[1] == ("lagu wanita", first[1])
+    finally:
+        hook.run("DROP SCHEMA test_mysql_to_postgres CASCADE")
+
+
+@pytest.mark.skipif(
+    not os.environ.get("AIRFLOW_CONN_BENCHMARK_POSTGRES"), reason="needs the benchmark Postgres database"
+)
+@pytest.mark.parametrize("pushdown", [True, False])
+def test_partition_swap_keeps_added_at_of_existing_rows(pushdown):
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+
+    hook = PostgresHook("benchmark_postgres")
+    hook.run(
+        """
+        DROP SCHEMA IF EXISTS test_mysql_to_postgres CASCADE;
+        CREATE SCHEMA test_mysql_to_postgres;
+        CREATE TABLE test_mysql_to_postgres.songs (code int4 PRIMARY KEY, song_title text);
+        CREATE TABLE test_mysql_to_postgres.warehouse (
+            code int4 PRIMARY KEY, song_title text, added_at timestamp DEFAULT CURRENT_TIMESTAMP
+        ) PARTITION BY HASH (code);
+        CREATE TABLE test_mysql_to_postgres.warehouse_p0 PARTITION OF test_mysql_to_postgres.warehouse
+            FOR VALUES WITH (modulus 2, remainder 0);
+        CREATE TABLE test_mysql_to_postgres.warehouse_p1 PARTITION OF test_mysql_to_postgres.warehouse
+            FOR VALUES WITH (modulus 2, remainder 1);
+        INSERT INTO test_mysql_to_postgres.songs VALUES (1, 'lagu wanita'), (2, 'kangen');
+        INSERT INTO test_mysql_to_postgres.warehouse VALUES (1, 'lagu wanita', '2026-01-01');
+        """
+    )
+    operator = MySqlToPostgresOperator(
+        task_id="load_to_media_warehouse",
+        query="SELECT code, song_title FROM test_mysql_to_postgres.songs",
+        postgres_conn="benchmark_postgres",
+        db_query_from="postgres",
+        target_table="test_mysql_to_postgres.warehouse",
+        identifier=["code"],
+        partition_swap=True,
+        added_at_column="added_at",
+        pushdown=pushdown,
+    )
+    try:
+        operator.execute({})
+        added_at = dict(hook.get_records("SELECT code, added_at FROM test_mysql_to_postgres.warehouse"))
+        assert added_at[1] == datetime(2026, 1, 1)
+        assert added_at[2] > datetime(2026, 1, 1)
+    finally:
+        hook.run("DROP SCHEMA test_mysql_to_postgres CASCADE")
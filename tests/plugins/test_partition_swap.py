@@ -0,0 +1,121 @@
+"""Check the order of the statements a partition swap runs: load and index first, touch the live table last."""
+
+import pytest
+
+from plugins.custom_operator.partition_swap import PartitionSwap
+
+PARTITIONS = [
+    ('w_p0', 'FOR VALUES WITH (modulus 2, remainder 0)', "satisfies_hash_partition('1'::oid, 2, 0, code)"),
+    ('w_p1', 'FOR VALUES WITH (modulus 2, remainder 1)', "satisfies_hash_partition('1'::oid, 2, 1, code)"),
+]
+INDEXES = [
+    ('w_p0', 'CREATE UNIQUE INDEX w_pkey ON ONLY demo_music.w USING btree (code, video_id)', 'p', 'w_p0_pkey'),
+    ('w_p1', 'CREATE UNIQUE INDEX w_pkey ON ONLY demo_music.w USING btree (code, video_id)', 'p', 'w_p1_pkey'),
+]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = conn.rowcount
+
+    def execute(self, sql, parameters=None):
+        self.conn.statements.append(' '.join(sql.split()))
+        if 'pg_attrdef' in sql:
+            self.result = [('added_at', 'CURRENT_TIMESTAMP')]
+        elif 'EXISTS' in sql:
+            self.result = [(True,)]
+        else:
+            self.result = [(self.conn.partition_key,)] if 'pg_get_partkeydef' in sql else (
+                PARTITIONS if 'pg_get_partition_constraintdef' in sql else INDEXES
+            )
+
+    def copy_expert(self, sql, stream):
+        self.conn.statements.append(sql)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, partition_key='HASH (code)', rowcount=3):
+        self.partition_key = partition_key
+        self.rowcount = rowcount
+        self.statements = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def test_live_partitions_are_only_replaced_after_the_new_ones_are_indexed():
+    conn = FakeConnection()
+    swap = PartitionSwap(conn, 'demo_music.w', ['code', 'video_id'], identifier=['code', 'video_id'])
+    swap.prepare()
+    assert swap.load('(SELECT 1 AS code, 2 AS video_id) AS src') == 3
+    swap.swap()
+
+    statements = [sql for sql in conn.statements if not sql.startswith('SELECT')]
+    assert 'CREATE TABLE demo_music.w_p1_swap PARTITION OF demo_music.w_swap FOR VALUES WITH (modulus 2, remainder 1)' \
+        in statements
+    assert ('INSERT INTO demo_music.w_swap (code, video_id) SELECT DISTINCT ON (src.code, src.video_id) src.code,'
+            ' src.video_id FROM (SELECT 1 AS code, 2 AS video_id) AS src ORDER BY src.code, src.video_id') in statements
+    first_live = statements.index('ALTER TABLE demo_music.w DETACH PARTITION demo_music.w_p0')
+    assert statements.index(
+        'CREATE UNIQUE INDEX w_p1_pkey_swap ON demo_music.w_p1_swap USING btree (code, video_id)'
+    ) < first_live
+    assert statements.index(
+        "ALTER TABLE demo_music.w_p1_swap ADD CONSTRAINT w_p1_swap_bound"
+        " CHECK (satisfies_hash_partition('1'::oid, 2, 1, code))"
+    ) < first_live
+    assert statements[first_live:first_live + 5] == [
+        'ALTER TABLE demo_music.w DETACH PARTITION demo_music.w_p0',
+        'DROP TABLE demo_music.w_p0',
+        'ALTER TABLE demo_music.w_p0_swap RENAME TO w_p0',
+        'ALTER TABLE demo_music.w ATTACH PARTITION demo_music.w_p0 FOR VALUES WITH (modulus 2, remainder 0)',
+        'ALTER TABLE demo_music.w_p0 DROP CONSTRAINT w_p0_swap_bound',
+    ]
+    assert statements[-1] == 'ALTER INDEX demo_music.w_p1_pkey_swap RENAME TO w_p1_pkey'
+
+
+def test_kept_columns_come_from_the_live_row():
+    conn = FakeConnection()
+    swap = PartitionSwap(conn, 'demo_music.w', ['code', 'video_id'], identifier=['code', 'video_id'],
+                         keep_columns=['added_at'])
+    swap.prepare()
+    swap.copy([(1, 'a')])
+    swap.load()
+
+    assert conn.statements[-2] == (
+        'INSERT INTO demo_music.w_swap (code, video_id, added_at)'
+        ' SELECT DISTINCT ON (src.code, src.video_id) src.code, src.video_id,'
+        ' coalesce(live.added_at, CURRENT_TIMESTAMP) FROM _stg_w_swap AS src'
+        ' LEFT JOIN demo_music.w AS live ON live.code = src.code AND live.video_id = src.video_id'
+        ' ORDER BY src.code, src.video_id'
+    )
+
+
+def test_empty_load_does_not_wipe_the_live_table():
+    conn = FakeConnection(rowcount=0)
+    swap = PartitionSwap(conn, 'demo_music.w', ['code', 'video_id'], identifier=['code', 'video_id'])
+    swap.prepare()
+    assert swap.load('(SELECT 1 AS code, 2 AS video_id WHERE false) AS src') == 0
+    with pytest.raises(ValueError, match='empty load'):
+        swap.swap()
+    assert not [sql for sql in conn.statements if 'DETACH' in sql or 'DROP TABLE demo_music.w_p' in sql]
+
+    allowed = PartitionSwap(FakeConnection(rowcount=0), 'demo_music.w', ['code'], ['code'], allow_empty=True)
+    allowed.prepare()
+    allowed.load()
+    allowed.swap()
+
+
+def test_unpartitioned_table_is_refused():
+    swap = PartitionSwap(FakeConnection(partition_key=None), 'demo_music.w', ['code'])
+    with pytest.raises(ValueError, match='not a partitioned table'):
+        swap.prepare()
@@ -0,0 +1,31 @@
+"""Check the COPY text and the merge statement PostgresBulkWriter runs after COPY."""
+
+import pandas as pd
+
+from plugins.custom_operator.postgres_bulk_writer import _CopyStream, build_merge_sql
+
+
+def test_updated_at_is_stamped_by_the_database_and_only_moves_on_a_change():
+    sql = build_merge_sql(
+        'demo_music.w', ['code', 'video_id', 'video_title'], '_stg_w', identifier=['code', 'video_id'],
+        compare_fields=['video_title'], updated_at_column='updated_at',
+    )
+    assert ' '.join(sql.split()) == (
+        'INSERT INTO demo_music.w AS tgt (code, video_id, video_title, updated_at)'
+        ' SELECT DISTINCT ON (code, video_id) code, video_id, video_title, LOCALTIMESTAMP FROM _stg_w'
+        ' ORDER BY code, video_id'
+        ' ON CONFLICT (code, video_id) DO UPDATE SET video_title = EXCLUDED.video_title,'
+        ' updated_at = EXCLUDED.updated_at'
+        ' WHERE (tgt.video_title) IS DISTINCT FROM (EXCLUDED.video_title)'
+    )
+
+
+def test_every_pandas_null_is_copied_as_null():
+    df = pd.DataFrame({
+        'code': pd.array([1, None], dtype='Int64'),
+        'song_title': pd.array(['kangen', None], dtype='string'),
+        'score': [0.5, float('nan')],
+        'release_date': [pd.Timestamp('1992-01-01'), pd.NaT],
+    })
+    stream = _CopyStream(df.itertuples(index=False, name=None))
+    assert stream.read() == '1\tkangen\t0.5\t1992-01-01T00:00:00\n\\N\t\\N\t\\N\t\\N\n'
@@ -0,0 +1,57 @@
+"""Land raw Spotify responses as Parquet, then replay them without touching the API or the database."""
+
+import os
+
+from plugins.custom_operator.raw_landing_zone import RawResponseWriter, landed_files, read_landed_responses
+from plugins.custom_operator.spotify_crawler import SpotifyMetadataExtractorOperator
+from tests.plugins.test_spotify_crawler import FakeSpotify, make_operator
+
+
+def test_writer_partitions_by_source_and_run_date(tmp_path):
+    for run_date in ['2026-10-16', '2026-10-17', '2026-10-18']:
+        writer = RawResponseWriter(str(tmp_path), 'youtube', run_date, 'crawl.try1', flush_rows=2)
+        for index in range(3):
+            writer.add('search', {'q': f"{run_date} {index}"}, {'items': []})
+        writer.flush()
+        # flush_rows=2: satu file saat response kedua, satu file lagi untuk sisanya
+        assert [os.path.basename(path) for path in writer.files] == [
+            'crawl.try1-00001.parquet', 'crawl.try1-00002.parquet',
+        ]
+
+    files = landed_files(str(tmp_path), 'youtube', '2026-10-17', None)
+    assert [os.path.relpath(path, tmp_path) for path in files] == [
+        'source=youtube/run_date=2026-10-17/crawl.try1-00001.parquet',
+        'source=youtube/run_date=2026-10-17/crawl.try1-00002.parquet',
+        'source=youtube/run_date=2026-10-18/crawl.try1-00001.parquet',
+        'source=youtube/run_date=2026-10-18/crawl.try1-00002.parquet',
+    ]
+    assert landed_files(str(tmp_path), 'spotify') == []
+    assert [request['q'] for batch in read_landed_responses(files[0]) for _, request, _ in batch] == [
+        '2026-10-17 0', '2026-10-17 1',
+    ]
+
+
+def test_replay_rebuilds_the_same_tracks_without_api_calls(tmp_path, monkeypatch):
+    written = []
+    monkeypatch.setattr(
+        SpotifyMetadataExtractorOperator, 'write_tracks',
+        lambda self, postgres_hook, results: written.append([track for tracks in results for track in tracks]) or 0,
+    )
+
+    # Halaman 4 ikut diambil dalam satu gelombang tapi dibuang oleh relevance cutoff, replay juga membuangnya
+    crawler = make_operator(relevance_cutoff=True, page_workers=4, landing_zone_path=str(tmp_path))
+    crawler._landing = RawResponseWriter(str(tmp_path), 'spotify', '2026-10-18', 'crawl.try1')
+    crawled = crawler.get_all_spotify_metadata("Lagu Wanita", "Naif")
+    crawled += crawler.fetch_tracks(["abc", "gone1"])
+    crawler._landing.flush()
+
+    replay = make_operator(mode='replay', relevance_cutoff=True, landing_zone_path=str(tmp_path))
+    replay._spotify = None
+    replay.replay_tracks(postgres_hook=None)
+
+    replayed, = written
+    key = lambda track: track['spotify_track_id']
+    assert sorted(replayed, key=key) == sorted(crawled, key=key)
+    assert replay._spotify is None and replay.run_stats.counters['rows_read'] == 2
+    assert isinstance(crawler._spotify, FakeSpotify) and len(crawler._spotify.offsets) == 5
+    assert len(crawled) == 4 * 50 + 1
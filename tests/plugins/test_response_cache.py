@@ -0,0 +1,70 @@
+"""Check the response cache: hits across instances, TTL per source, LRU eviction and single-flight."""
+
+from datetime import timedelta
+import threading
+import time
+
+import pytest
+
+from plugins.custom_operator import response_cache
+from plugins.custom_operator.response_cache import ResponseCache
+
+
+def test_hits_survive_the_task_and_expire_per_source(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    first = ResponseCache(path, 'spotify', timedelta(days=7))
+    assert first.get_or_fetch('search', 'lagu wanita|naif', lambda: {'pages': [1]}) == {'pages': [1]}
+    first.close()
+
+    # Run berikutnya memakai file yang sama, fetch tidak dipanggil lagi
+    second = ResponseCache(path, 'spotify', timedelta(days=7))
+    assert second.get_or_fetch('search', 'lagu wanita|naif', lambda: pytest.fail('cached')) == {'pages': [1]}
+    assert (second.hits, second.misses) == (1, 0)
+
+    # Source lain dengan TTL 0 tidak melihat entry spotify dan entry-nya sendiri langsung kedaluwarsa
+    youtube = ResponseCache(path, 'youtube', timedelta(0))
+    assert youtube.get_or_fetch('search', 'lagu wanita|naif', lambda: {'items': []}) == {'items': []}
+    assert youtube.get_or_fetch('search', 'lagu wanita|naif', lambda: {'items': [2]}) == {'items': [2]}
+    assert (youtube.hits, youtube.misses) == (0, 2)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, 'EVICT_EVERY', 4)
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), 'spotify', timedelta(days=7), max_entries=3)
+    for key in 'abc':
+        cache.get_or_fetch('search', key, lambda: key)
+        time.sleep(0.01)
+    cache.get_or_fetch('search', 'a', lambda: pytest.fail('cached'))  # 'a' dipakai lagi, 'b' paling lama
+    cache.get_or_fetch('search', 'd', lambda: 'd')
+
+    assert cache.evicted == 1
+    assert cache.get_or_fetch('search', 'b', lambda: 'fetched again') == 'fetched again'
+    assert cache.get_or_fetch('search', 'a', lambda: pytest.fail('cached')) == 'a'
+
+
+def test_duplicate_queries_in_flight_call_the_api_once(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), 'youtube', timedelta(days=30))
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {'items': ['video']}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_fetch('search', 'same|song', fetch)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    while cache.coalesced < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{'items': ['video']}] * 5
+    assert (cache.hits, cache.coalesced, cache.misses) == (0, 4, 1)
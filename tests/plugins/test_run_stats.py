@@ -0,0 +1,80 @@
+"""Check the per-run counters, phase timings and the execute decorator without a database."""
+
+import json
+import logging
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from plugins.custom_operator.http_transport import HttpCallStats
+from plugins.custom_operator.run_stats import RunStats, record_run_stats
+
+
+def test_counters_phases_and_http_calls_end_up_in_one_row():
+    stats = RunStats('SpotifyMetadataExtractorOperator')
+    stats.add(rows_read=10, rows_skipped=2)
+    stats.add(rows_written=7, quota_units=None)
+    with stats.phase('fetch'):
+        time.sleep(0.02)
+
+    def slow_rows():
+        for row in range(3):
+            time.sleep(0.01)
+            yield row
+
+    assert list(stats.timed(slow_rows(), 'transform')) == [0, 1, 2]
+
+    call_stats = HttpCallStats()
+    call_stats.record('api.spotify.com /v1/search', requests=4, retries=1, throttled=1, wait_seconds=1.5)
+    call_stats.record('api.spotify.com /v1/tracks', requests=2)
+    stats.add_http(call_stats)
+
+    context = {
+        'task': SimpleNamespace(dag_id='etl', task_id='crawl'),
+        'ti': SimpleNamespace(map_index=3, try_number=2),
+        'run_id': 'manual__1',
+    }
+    row = stats.as_row(context, 'success')
+    assert (row['dag_id'], row['task_id'], row['run_id'], row['map_index'], row['try_number']) == \
+        ('etl', 'crawl', 'manual__1', 3, 2)
+    assert (row['rows_read'], row['rows_written'], row['rows_skipped'], row['quota_units']) == (10, 7, 2, 0)
+    assert (row['api_calls'], row['api_retries'], row['api_throttled'], row['throttle_seconds']) == (6, 1, 1, 1.5)
+    assert json.loads(row['api_calls_by_endpoint']) == {
+        'api.spotify.com /v1/search': 4, 'api.spotify.com /v1/tracks': 2,
+    }
+    assert row['fetch_seconds'] >= 0.02
+    assert row['transform_seconds'] >= 0.03
+    assert row['write_seconds'] == 0
+    assert row['total_seconds'] >= 0.05
+
+
+class FakeOperator:
+    run_stats_table = None
+    postgres_conn_id = 'unused'
+    log = logging.getLogger('test_run_stats')
+
+    def __init__(self):
+        self.run_stats = RunStats('FakeOperator')
+
+    @record_run_stats('postgres_conn_id')
+    def execute(self, context):
+        self.run_stats.add(rows_read=5)
+        if context.get('fail'):
+            raise RuntimeError('boom')
+        return 'done'
+
+
+def test_decorator_emits_once_per_run_including_failures(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(RunStats, 'emit', lambda self, context, status, **kwargs: emitted.append(
+        (status, self.counters['rows_read'], kwargs['postgres_hook'])
+    ))
+
+    operator = FakeOperator()
+    assert operator.execute({}) == 'done'
+    with pytest.raises(RuntimeError):
+        operator.execute({'fail': True})
+
+    # Counter dimulai dari nol setiap run, tanpa run_stats_table tidak ada koneksi database
+    assert emitted == [('success', 5, None), ('failed', 5, None)]
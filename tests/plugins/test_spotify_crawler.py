@@ -0,0 +1,99 @@
+"""
+Check the paging of Spotify search results: page count from ``total``, max_pages and the relevance cutoff,
+and the batched track lookups of refresh mode.
+"""
+
+import threading
+
+import pytest
+
+from plugins.custom_operator.run_stats import RunStats
+from plugins.custom_operator.spotify_crawler import SpotifyMetadataExtractorOperator
+
+TOTAL = 800  # 16 pages of 50
+
+
+class FakeSpotify:
+    """Pages 0-2 hold tracks by the searched artist, every later page only holds other artists."""
+
+    def __init__(self):
+        self.offsets = []
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def search(self, q, type, limit, offset):
+        with self.lock:
+            self.offsets.append(offset)
+        page = offset // limit
+        artist = "Naif" if page < 3 else "Someone Else"
+        items = [
+            {
+                "name": f"Lagu Wanita {page}-{index}",
+                "artists": [{"name": artist}],
+                "album": {"name": "Album", "release_date": "2000"},
+                "external_ids": {"isrc": f"ISRC{page:02d}{index:02d}"},
+                "id": f"id{page}-{index}",
+            }
+            for index in range(limit)
+        ] if offset < TOTAL else []
+        return {"tracks": {"items": items, "total": TOTAL}}
+
+    def tracks(self, tracks):
+        with self.lock:
+            self.batches.append(list(tracks))
+        # Id yang diawali "gone" sudah tidak tersedia di Spotify
+        return {"tracks": [
+            None if track_id.startswith("gone") else {
+                "name": f"Track {track_id}",
+                "artists": [{"name": "Naif"}],
+                "album": {"name": "Album", "release_date": "2000"},
+                "external_ids": {"isrc": f"ISRC-{track_id}"},
+                "id": track_id,
+            }
+            for track_id in tracks
+        ]}
+
+
+def make_operator(**kwargs):
+    operator = SpotifyMetadataExtractorOperator(
+        task_id="get_music_from_spotify_api_raw",
+        postgres_conn_id="postgres",
+        source_query="SELECT 1",
+        target_table="demo_music.library_music_spotify",
+        client_id="",
+        client_secret="",
+        **kwargs,
+    )
+    operator._spotify = FakeSpotify()
+    # Di Airflow run_stats dibuat oleh record_run_stats saat execute
+    operator.run_stats = RunStats(type(operator).__name__)
+    return operator
+
+
+@pytest.mark.parametrize(
+    "kwargs, expected_pages",
+    [
+        ({}, 16),  # semua halaman sesuai total, tanpa request halaman kosong
+        ({"max_pages": 2}, 2),
+        ({"relevance_cutoff": True, "page_workers": 4}, 4),  # halaman 3 tidak relevan
+    ],
+)
+def test_pages_fetched(kwargs, expected_pages):
+    operator = make_operator(**kwargs)
+    tracks = operator.get_all_spotify_metadata("Lagu Wanita", "Naif")
+
+    fetched = sorted(operator._spotify.offsets)
+    assert len(tracks) == expected_pages * 50
+    assert [track["spotify_track_id"] for track in tracks][:2] == ["id0-0", "id0-1"]
+    assert fetched[:expected_pages] == [page * 50 for page in range(expected_pages)]
+    # Dengan cutoff, paling banyak satu gelombang page_workers terambil setelah halaman tidak relevan
+    assert len(fetched) <= expected_pages + kwargs.get("page_workers", 0)
+
+
+def test_fetch_tracks_in_batches_of_50():
+    operator = make_operator()
+    track_ids = [f"Id{index}" for index in range(120)] + ["gone1", "gone2"]
+    tracks = operator.fetch_tracks(track_ids)
+
+    assert sorted(len(batch) for batch in operator._spotify.batches) == [22, 50, 50]
+    assert [track["spotify_track_id"] for track in tracks] == track_ids[:120]
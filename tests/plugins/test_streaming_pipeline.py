@@ -0,0 +1,95 @@
+"""Check that the crawler pipeline overlaps its stages, bounds the rows in flight and stops cleanly."""
+
+import threading
+import time
+
+import pytest
+
+from plugins.custom_operator.streaming_pipeline import StopStreaming, StreamingPipeline
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fetched = 0
+        self.written = 0
+        self.max_in_flight = 0
+        self.events = []
+
+    def fetch(self, item):
+        time.sleep(0.001)
+        with self.lock:
+            self.fetched += 1
+            self.max_in_flight = max(self.max_in_flight, self.fetched - self.written)
+            self.events.append('fetch')
+        return item * 10
+
+    def transform(self, batch):
+        return [result for item, result in batch]
+
+    def write(self, batch, rows):
+        time.sleep(0.02)  # Database lebih lambat dari API
+        with self.lock:
+            self.written += len(batch)
+            self.events.append('write')
+        return len(rows)
+
+
+def test_rows_land_while_fetching_with_bounded_memory():
+    recorder = Recorder()
+    pipeline = StreamingPipeline(
+        recorder.fetch, recorder.transform, recorder.write, workers=4, batch_size=10, queue_size=20,
+    )
+
+    assert pipeline.run(range(300)) == (300, True)
+    # Paling banyak queue_size hasil fetch, satu batch di transform, dua batch menunggu write,
+    # satu batch yang sedang ditulis dan satu hasil per worker yang menunggu antrean
+    assert recorder.max_in_flight <= 20 + 4 * 10 + 4
+    # Write pertama terjadi jauh sebelum fetch terakhir
+    assert recorder.events.index('write') < len(recorder.events) // 2
+
+
+def test_batches_keep_the_input_order():
+    written = []
+
+    def fetch(item):
+        time.sleep(0.005 if item % 7 == 0 else 0)  # Sebagian item selesai lebih lambat
+        return item
+
+    pipeline = StreamingPipeline(
+        fetch, lambda batch: batch, lambda batch, rows: written.extend(item for item, result in batch) or len(rows),
+        workers=4, batch_size=10, queue_size=8,
+    )
+    assert pipeline.run(range(200)) == (200, True)
+    assert written == list(range(200))
+
+
+def test_stop_streaming_writes_what_was_fetched():
+    written = []
+
+    def fetch(item):
+        if item == 25:
+            raise StopStreaming()
+        return item
+
+    pipeline = StreamingPipeline(
+        fetch, lambda batch: batch, lambda batch, rows: written.extend(item for item, result in batch) or len(rows),
+        workers=1, batch_size=10,
+    )
+    assert pipeline.run(range(100)) == (25, False)
+    assert written == list(range(25))
+
+
+def test_write_error_stops_every_stage():
+    fetched = []
+
+    def write(batch, rows):
+        raise RuntimeError('database down')
+
+    pipeline = StreamingPipeline(
+        lambda item: fetched.append(item), lambda batch: batch, write, workers=2, batch_size=5, queue_size=5,
+    )
+    with pytest.raises(RuntimeError, match='database down'):
+        pipeline.run(range(10000))
+    assert len(fetched) < 100
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith('pipeline-')]
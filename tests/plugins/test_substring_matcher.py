@@ -0,0 +1,100 @@
+"""Check that the Aho-Corasick engine produces exactly the rows of the SQL warehouse join."""
+
+import os
+import sqlite3
+
+import pytest
+
+from plugins.custom_operator.substring_matcher import AhoCorasick, match_media_warehouse
+from plugins.custom_operator.text_normalization import match_key
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TABLES = """
+CREATE TABLE demo_music.m_songs (
+    code int, original_artist text, song_title text, match_artist text, match_title text
+);
+CREATE TABLE demo_music.library_music_spotify (
+    isrc text, spotify_track_id text, track_name text, artist_name text, album_name text, release_date text,
+    match_artist text, match_title text, added_at text, updated_at text
+);
+CREATE TABLE demo_music.library_music_youtube (
+    video_id text, channel_id text, video_title text, channel_title text, match_title text,
+    added_at text, updated_at text
+);
+CREATE TABLE demo_music.media_warehouse_raw (
+    code int, video_id text, channel_id text, video_title text, channel_title text, isrc text,
+    spotify_track_id text, spotify_track_name text, spotify_album text, spotify_release_date text,
+    original_artist text, song_title text, added_at text, updated_at text
+);
+"""
+
+
+def read_project_file(*path):
+    with open(os.path.join(PROJECT_ROOT, *path), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def sample_db():
+    """The sample dumps loaded into SQLite, with match keys filled the same way the loaders do."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute("ATTACH DATABASE ':memory:' AS demo_music")
+    conn.execute("PRAGMA case_sensitive_like = ON")  # LIKE di PostgreSQL case-sensitive
+    conn.create_function("match_key", 1, match_key)
+    conn.executescript(TABLES)
+    for dump in ["m_songs.sql", "library_music_spotify.sql", "library_music_youtube.sql", "media_warehouse_raw.sql"]:
+        conn.executescript(read_project_file(dump))
+    conn.executescript(
+        """
+        UPDATE demo_music.m_songs SET match_artist = match_key(original_artist), match_title = match_key(song_title);
+        UPDATE demo_music.library_music_spotify
+            SET match_artist = match_key(artist_name), match_title = match_key(track_name);
+        UPDATE demo_music.library_music_youtube SET match_title = match_key(video_title);
+        """
+    )
+    yield conn
+    conn.close()
+
+
+def load_matcher_inputs(conn):
+    """Read songs, tracks and videos with the same columns MediaWarehouseMatcherOperator selects."""
+    songs = conn.execute(
+        "SELECT code, original_artist, song_title, match_artist, match_title FROM demo_music.m_songs"
+    ).fetchall()
+    tracks = conn.execute(
+        """
+        SELECT isrc, spotify_track_id, track_name, album_name, release_date, match_artist, match_title
+        FROM demo_music.library_music_spotify
+        """
+    ).fetchall()
+    videos = conn.execute(
+        "SELECT video_id, channel_id, video_title, channel_title, match_title FROM demo_music.library_music_youtube"
+    ).fetchall()
+    return songs, tracks, videos
+
+
+def test_aho_corasick_finds_every_contained_pattern():
+    automaton = AhoCorasick(["he", "she", "his", "hers", "sh", ""])
+    assert automaton.find("ushers") == {"she", "he", "hers", "sh"}
+    assert automaton.find("hi") == set()
+    assert automaton.find("") == set()
+
+
+def test_matcher_equals_sql_join(sample_db):
+    sql_rows = sample_db.execute(read_project_file("dags", "sql", "load_media_warehouse_raw.sql")).fetchall()
+
+    matcher_rows = list(match_media_warehouse(*load_matcher_inputs(sample_db)))
+
+    assert sql_rows
+    assert sorted(matcher_rows) == sorted(sql_rows)
+
+
+def test_matcher_covers_sample_warehouse(sample_db):
+    """Every (code, video_id, spotify_track_id) in the media_warehouse_raw.sql sample is still produced"""
+    sample_keys = set(
+        sample_db.execute("SELECT code, video_id, spotify_track_id FROM demo_music.media_warehouse_raw").fetchall()
+    )
+    matched_keys = {(row[0], row[1], row[6]) for row in match_media_warehouse(*load_matcher_inputs(sample_db))}
+
+    assert sample_keys <= matched_keys
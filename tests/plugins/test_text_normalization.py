@@ -0,0 +1,51 @@
+"""Check that the column-wise, memoized normalization matches the original row-by-row cleaning exactly."""
+
+import re
+
+import pandas as pd
+
+from plugins.custom_operator.text_normalization import (
+    clean_input,
+    clean_input_column,
+    match_key,
+    match_key_column,
+    release_date_column,
+)
+
+SAMPLES = [
+    "Lagu Wanita",
+    "  Ruth Sahanaya - Jangan Semudah Ini (Live)  ",
+    "Dewa 19, Ahmad Dhani",
+    "AC/DC \\ Back_In_Black\t",
+    "怀念家乡 (Miss My Hometown)",
+    "Beyoncé feat. JAY-Z",
+    "İstanbul Nights",
+    "!!!",
+    "",
+    "Lagu Wanita",
+]
+
+
+def legacy_clean_input(text):
+    """The regex pair the crawlers used to run for every field of every row."""
+    cleaned_text = re.sub(r'[^\w\s]', '', text)
+    cleaned_text = re.sub(r'[/\\()\-_\t]', '', cleaned_text)
+    return cleaned_text.strip().lower()
+
+
+def test_clean_input_matches_legacy_cleaning():
+    for text in SAMPLES:
+        assert clean_input(text) == legacy_clean_input(text)
+    assert clean_input_column(pd.Series(SAMPLES)).tolist() == [legacy_clean_input(text) for text in SAMPLES]
+
+
+def test_match_key_column_matches_row_by_row():
+    values = pd.Series(SAMPLES + [None, float("nan")])
+    assert match_key_column(values).tolist() == [match_key(value) for value in values]
+
+
+def test_release_date_column_matches_row_by_row():
+    values = pd.Series(["2020", "2020-05", "2020-05-17", "", None, "not a date", "2020"])
+    expected = [pd.to_datetime(value, errors="coerce").date() if value else None for value in values]
+    result = release_date_column(values).tolist()
+    assert [str(value) for value in result] == [str(value) for value in expected]
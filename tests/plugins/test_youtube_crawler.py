@@ -0,0 +1,68 @@
+"""Check that refresh mode asks videos().list for 50 known ids per call and only for the stored fields."""
+
+from plugins.custom_operator import youtube_crawler
+from plugins.custom_operator.run_stats import RunStats
+from plugins.custom_operator.youtube_crawler import YouTubeMetadataExtractorOperator
+
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class FakeYouTube:
+    """videos().list returns every requested id except the ones starting with "gone"."""
+
+    def __init__(self):
+        self.calls = []
+
+    def videos(self):
+        return self
+
+    def list(self, **kwargs):
+        self.calls.append(kwargs)
+        return FakeRequest({"items": [
+            {"id": video_id, "snippet": {"channelId": "UC-x", "title": f"Video {video_id}", "channelTitle": "Naif"}}
+            for video_id in kwargs["id"].split(",") if not video_id.startswith("gone")
+        ]})
+
+
+def make_operator():
+    return YouTubeMetadataExtractorOperator(
+        task_id="refresh_youtube_videos",
+        postgres_conn_id="postgres",
+        source_query=None,
+        target_table="demo_music.library_music_youtube",
+        api_key="",
+        mode="refresh",
+    )
+
+
+def test_get_videos_metadata():
+    operator = make_operator()
+    operator._youtube = FakeYouTube()
+
+    videos = operator.get_videos_metadata(["dQw4w9WgXcQ", "gone-1", "a_B-c"])
+
+    call, = operator._youtube.calls
+    assert call["id"] == "dQw4w9WgXcQ,gone-1,a_B-c"
+    assert call["part"] == "snippet"
+    assert [video["video_id"] for video in videos] == ["dQw4w9WgXcQ", "a_B-c"]
+    assert videos[1]["video_title"] == "Video a_B-c"
+
+
+def test_timestamps_are_stamped_by_the_database(monkeypatch):
+    upserts = []
+    monkeypatch.setattr(youtube_crawler, 'bulk_upsert', lambda hook, table, fields, rows, **kwargs: upserts.append(
+        (fields, kwargs)
+    ))
+    operator = make_operator()
+    operator.run_stats = RunStats(type(operator).__name__)
+    operator.write_videos(None, [["dQw4w9WgXcQ", "UC-x", "Video", "Naif"]])
+
+    (fields, kwargs), = upserts
+    assert 'added_at' not in fields and 'updated_at' not in fields
+    assert kwargs['updated_at_column'] == 'updated_at' and 'updated_at' not in kwargs['update_fields']